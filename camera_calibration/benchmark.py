@@ -0,0 +1,233 @@
+import argparse
+import glob
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from calibrate import CHECKERBOARD_SIZE, checkerboard_object_points
+from chessboard import CHESSBOARD_FLAGS, SUBPIX_CRITERIA
+from fisheye_solver import DEFAULT_MAX_VIEW_ERROR, calibrate_with_rejection
+from undistort import build_undistort_maps, is_fisheye, load_calibration, undistort
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_IMAGES = os.path.join(HERE, "calibration_images")
+DEFAULT_REFERENCE = os.path.join(HERE, "camera_calibration.npz")
+
+STAGES = ("decode", "detect", "subpix", "solve", "maps", "remap")
+
+
+def _time(fn, repeat):
+    """Run fn repeat times; returns (median seconds, last result)"""
+    times = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times), result
+
+
+def run_benchmark(image_dir=DEFAULT_IMAGES, reference=DEFAULT_REFERENCE, repeat=3,
+                  max_view_error=DEFAULT_MAX_VIEW_ERROR):
+    """Time every calibrate.py stage on a set of images and compare to a reference.
+
+    Per-image stages (decode, detect, subpix) report the median time per
+    image summed over all images; solve, maps and remap report their median
+    over the repetitions. Returns a JSON-serialisable dict.
+    """
+    paths = sorted(glob.glob(os.path.join(image_dir, "*.jpg")))
+    if not paths:
+        raise FileNotFoundError(f"No images found in {image_dir}")
+
+    stages = dict.fromkeys(STAGES, 0.0)
+    objp = checkerboard_object_points()
+    objpoints, imgpoints = [], []
+    color = None
+    detected = 0
+
+    for path in paths:
+        data = np.fromfile(path, np.uint8)
+        t, img = _time(lambda: cv2.imdecode(data, cv2.IMREAD_COLOR), repeat)
+        stages["decode"] += t
+        color = img if color is None else color
+
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        t, (ret, corners) = _time(
+            lambda: cv2.findChessboardCorners(gray, CHECKERBOARD_SIZE, CHESSBOARD_FLAGS), repeat)
+        stages["detect"] += t
+        if not ret:
+            continue
+        detected += 1
+
+        t, refined = _time(
+            lambda: cv2.cornerSubPix(gray, corners.copy(), (11, 11), (-1, -1), SUBPIX_CRITERIA), repeat)
+        stages["subpix"] += t
+
+        objpoints.append(objp)
+        imgpoints.append(refined.reshape(1, -1, 2))
+
+    img_shape = color.shape[1::-1]
+    t, solution = _time(
+        lambda: calibrate_with_rejection(objpoints, imgpoints, img_shape,
+                                         max_view_error=max_view_error), repeat)
+    stages["solve"] = t
+    rms, K, D, _, _, used, view_errors = solution
+
+    t, (map1, map2) = _time(lambda: build_undistort_maps(K, D, img_shape), repeat)
+    stages["maps"] = t
+
+    dst = np.empty_like(color)
+    t, _ = _time(lambda: undistort(color, map1, map2, dst), max(repeat, 10))
+    stages["remap"] = t
+
+    results = {
+        "environment": {
+            "python": platform.python_version(),
+            "opencv": cv2.__version__,
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+        },
+        "images": len(paths),
+        "detected": detected,
+        "image_size": list(img_shape),
+        "repeat": repeat,
+        "stages_ms": {k: round(v * 1000, 3) for k, v in stages.items()},
+        "total_ms": round(sum(stages.values()) * 1000, 3),
+        "accuracy": {
+            "rms": float(rms),
+            "views_used": len(used),
+            "max_view_error": float(np.nanmax(view_errors)),
+            "K": K.tolist(),
+            "D": D.ravel().tolist(),
+        },
+    }
+
+    if reference and os.path.exists(reference):
+        K_ref, D_ref = load_calibration(reference)
+        k_drift = {
+            "fx": float(abs(K[0, 0] - K_ref[0, 0]) / K_ref[0, 0]),
+            "fy": float(abs(K[1, 1] - K_ref[1, 1]) / K_ref[1, 1]),
+            "cx_px": float(abs(K[0, 2] - K_ref[0, 2])),
+            "cy_px": float(abs(K[1, 2] - K_ref[1, 2])),
+        }
+        drift = {"reference": os.path.basename(reference), "K": k_drift}
+        if is_fisheye(D_ref):
+            drift["D_max_abs"] = float(np.max(np.abs(D.ravel() - D_ref.ravel())))
+        else:
+            # Coefficients of a pinhole model cannot be compared to fisheye ones
+            drift["D_max_abs"] = None
+        results["drift"] = drift
+
+    return results
+
+
+def check_regressions(results, baseline=None, max_slowdown=1.5, max_rms=1.0,
+                      max_focal_drift=0.02, max_center_drift=20.0):
+    """List of human-readable failures; empty if the run passes every gate"""
+    failures = []
+
+    rms = results["accuracy"]["rms"]
+    if rms > max_rms:
+        failures.append(f"RMS {rms:.4f} exceeds {max_rms}")
+
+    drift = results.get("drift")
+    if drift:
+        for key in ("fx", "fy"):
+            if drift["K"][key] > max_focal_drift:
+                failures.append(f"{key} drifted {drift['K'][key]:.2%} from {drift['reference']} "
+                                f"(limit {max_focal_drift:.2%})")
+        for key in ("cx_px", "cy_px"):
+            if drift["K"][key] > max_center_drift:
+                failures.append(f"{key[:2]} drifted {drift['K'][key]:.1f}px from {drift['reference']} "
+                                f"(limit {max_center_drift}px)")
+
+    if baseline:
+        for stage, ms in results["stages_ms"].items():
+            base = baseline.get("stages_ms", {}).get(stage)
+            if base and ms > base * max_slowdown:
+                failures.append(f"{stage} took {ms:.1f}ms, baseline {base:.1f}ms "
+                                f"(limit {max_slowdown}x)")
+    return failures
+
+
+def print_report(results):
+    print(f"{results['detected']}/{results['images']} images, "
+          f"{results['image_size'][0]}x{results['image_size'][1]}, median of {results['repeat']}")
+    print(f"{'stage':<10}{'ms':>12}")
+    for stage, ms in results["stages_ms"].items():
+        print(f"{stage:<10}{ms:>12.2f}")
+    print(f"{'total':<10}{results['total_ms']:>12.2f}")
+
+    accuracy = results["accuracy"]
+    print(f"\nRMS: {accuracy['rms']:.4f} px ({accuracy['views_used']} views, "
+          f"worst view {accuracy['max_view_error']:.4f} px)")
+
+    drift = results.get("drift")
+    if drift:
+        k = drift["K"]
+        print(f"Drift vs {drift['reference']}: fx {k['fx']:.2%}, fy {k['fy']:.2%}, "
+              f"cx {k['cx_px']:.1f}px, cy {k['cy_px']:.1f}px", end="")
+        if drift["D_max_abs"] is None:
+            print(", D not comparable (reference uses the pinhole model)")
+        else:
+            print(f", D max {drift['D_max_abs']:.4f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Speed and accuracy benchmark for the calibration pipeline")
+    parser.add_argument("--images", default=DEFAULT_IMAGES,
+                        help="directory of checkerboard images (default: bundled calibration_images)")
+    parser.add_argument("--reference", default=DEFAULT_REFERENCE,
+                        help="reference calibration npz for drift checks (default: bundled camera_calibration.npz)")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="repetitions per stage, the median is reported (default: 3)")
+    parser.add_argument("--json", metavar="FILE",
+                        help="write the results as JSON to FILE ('-' for stdout)")
+    parser.add_argument("--baseline", metavar="FILE",
+                        help="JSON results of an earlier run to check for speed regressions")
+    parser.add_argument("--max-slowdown", type=float, default=1.5,
+                        help="fail if a stage is this much slower than the baseline (default: 1.5)")
+    parser.add_argument("--max-rms", type=float, default=1.0,
+                        help="fail if the RMS error exceeds this (default: 1.0)")
+    parser.add_argument("--max-focal-drift", type=float, default=0.02,
+                        help="fail if fx/fy differ from the reference by more than this fraction (default: 0.02)")
+    parser.add_argument("--max-center-drift", type=float, default=20.0,
+                        help="fail if cx/cy differ from the reference by more pixels than this (default: 20)")
+    args = parser.parse_args()
+
+    results = run_benchmark(args.images, args.reference, args.repeat)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    failures = check_regressions(results, baseline, args.max_slowdown, args.max_rms,
+                                 args.max_focal_drift, args.max_center_drift)
+    results["failures"] = failures
+
+    if args.json == "-":
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    else:
+        print_report(results)
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump(results, f, indent=2)
+            print(f"\nResults written to {args.json}")
+
+    for failure in failures:
+        print(f"FAIL: {failure}", file=sys.stderr)
+    if failures:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,37 +1,474 @@
-import cv2
-import numpy as np
+import argparse
+import glob
 import os
 import time
+from concurrent.futures import ProcessPoolExecutor
 
-def main():
-    # Initialize camera
-    print("Opening UVC fisheye camera...")
-    cap = cv2.VideoCapture(1)  # Camera ID 1
+import cv2
+import numpy as np
+
+from chessboard import CHESSBOARD_FLAGS, SUBPIX_CRITERIA, ChessboardTracker
+from coverage import DISTANCE_LABELS, TILT_LABELS, CoverageIndex
+from fisheye_solver import DEFAULT_MAX_VIEW_ERROR, CalibrationWorker, calibrate_with_rejection
+from frame_grabber import LatestFrameGrabber
+from mjpeg import MjpegCapture, is_stream_url
+from profiling import FpsMeter, StageProfiler
+from sharpness import METRICS, QUADRANTS, SharpnessMeter
+from undistort import get_undistort_maps, undistort
+
+# Checkerboard inner corners
+CHECKERBOARD_SIZE = (13, 9)
+
+
+def checkerboard_object_points(checkerboard_size=CHECKERBOARD_SIZE):
+    """Object points for the checkerboard (0,0,0), (1,0,0), (2,0,0) ...."""
+    objp = np.zeros((1, checkerboard_size[0]*checkerboard_size[1], 3), np.float32)
+    objp[0,:,:2] = np.mgrid[0:checkerboard_size[0], 0:checkerboard_size[1]].T.reshape(-1, 2)
+    return objp
+
+
+def print_rms_rating(rms):
+    """Interpret the RMS error of a calibration"""
+    if rms < 1.0:
+        print("Excellent calibration! (RMS < 1.0)")
+    elif rms < 2.0:
+        print("Good calibration. (RMS < 2.0)")
+    elif rms < 3.0:
+        print("Acceptable calibration. (RMS < 3.0)")
+    else:
+        print("Poor calibration. Consider recapturing images. (RMS >= 3.0)")
+
+
+def view_status(i, used, view_errors):
+    """Whether view i was used, pruned as an outlier or ill-conditioned"""
+    if i in used:
+        return "used"
+    if np.isnan(view_errors[i]):
+        return "ill-conditioned"
+    return "rejected"
+
+
+def save_calibration(rms, K, D, rvecs, tvecs,
+                     calibration_file="fisheye_calibration.npz",
+                     calibration_txt="fisheye_calibration.txt",
+                     view_errors=None, used=None, names=None):
+    """Save fisheye calibration results as npz and in a human-readable format"""
+    extra = {}
+    if view_errors is not None:
+        extra["per_view_errors"] = view_errors
+        extra["used_views"] = np.asarray(used, dtype=np.int32)
+        if names is not None:
+            extra["view_names"] = np.asarray(names)
+
+    np.savez(calibration_file,
+             camera_matrix=K,
+             dist_coeffs=D,
+             rvecs=rvecs,
+             tvecs=tvecs,
+             **extra)
+
+    with open(calibration_txt, 'w') as f:
+        f.write("# Fisheye Camera Calibration Results\n\n")
+        f.write(f"RMS Error: {rms}\n\n")
+        f.write("Camera Matrix (K):\n")
+        f.write(str(K))
+        f.write("\n\nDistortion Coefficients (D):\n")
+        f.write(str(D))
+
+        if view_errors is not None:
+            f.write("\n\nPer-view RMS Reprojection Error (px):\n")
+            for i, error in enumerate(view_errors):
+                name = names[i] if names is not None else f"view {i}"
+                f.write(f"{name}: {error:.4f} ({view_status(i, used, view_errors)})\n")
+
+
+def print_view_errors(view_errors, used, names=None):
+    """Print the per-view reprojection error report"""
+    print("Per-view RMS reprojection error:")
+    for i, error in enumerate(view_errors):
+        name = names[i] if names is not None else f"view {i}"
+        print(f"  {name}: {error:.4f} px ({view_status(i, used, view_errors)})")
+
+
+def _init_detection_worker():
+    # Each worker handles one image at a time; let the pool provide the
+    # parallelism instead of OpenCV's internal threads competing for cores
+    cv2.setNumThreads(1)
+
+
+def detect_corners_in_file(path, checkerboard_size=CHECKERBOARD_SIZE):
+    """Find and refine checkerboard corners in an image file.
+
+    Returns (path, image_size, corners) where corners is None if the
+    board was not found or the image could not be read.
+    """
+    gray = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+    if gray is None:
+        return path, None, None
+
+    image_size = gray.shape[::-1]
+    ret, corners = cv2.findChessboardCorners(gray, checkerboard_size, CHESSBOARD_FLAGS)
+    if not ret:
+        return path, image_size, None
+
+    corners = cv2.cornerSubPix(gray, corners, (11, 11), (-1, -1), SUBPIX_CRITERIA)
+    return path, image_size, corners
+
+
+def batch_calibrate(image_dir, workers=None, output_prefix="fisheye_calibration",
+                    max_view_error=DEFAULT_MAX_VIEW_ERROR):
+    """Calibrate from a directory of checkerboard images without a camera or UI.
+
+    Corner detection and subpixel refinement run across a process pool,
+    followed by the fisheye solve over all detected views, pruning views
+    whose reprojection error exceeds max_view_error.
+    Returns (rms, K, D, rvecs, tvecs) or None if calibration failed.
+    """
+    paths = sorted(p for ext in ("*.jpg", "*.jpeg", "*.png", "*.bmp")
+                   for p in glob.glob(os.path.join(image_dir, ext)))
+    if not paths:
+        print(f"Error: No images found in {image_dir}")
+        return None
+
+    workers = workers or os.cpu_count() or 1
+    print(f"Detecting checkerboard corners in {len(paths)} images using {workers} workers...")
+
+    start = time.perf_counter()
+    objp = checkerboard_object_points()
+    objpoints = []
+    imgpoints = []
+    names = []
+    img_shape = None
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_detection_worker) as pool:
+        # map keeps the results in path order so the solve is reproducible
+        for path, image_size, corners in pool.map(detect_corners_in_file, paths):
+            name = os.path.basename(path)
+            if image_size is None:
+                print(f"  {name}: could not read image - skipped")
+                continue
+            if img_shape is None:
+                img_shape = image_size
+            elif image_size != img_shape:
+                print(f"  {name}: size {image_size} differs from {img_shape} - skipped")
+                continue
+            if corners is None:
+                print(f"  {name}: no checkerboard detected - skipped")
+                continue
+
+            objpoints.append(objp)
+            imgpoints.append(corners.reshape(1, -1, 2))
+            names.append(name)
+            print(f"  {name}: checkerboard found")
+
+    detect_time = time.perf_counter() - start
+    print(f"Corner detection finished in {detect_time:.2f}s ({len(objpoints)}/{len(paths)} usable)")
+
+    if len(objpoints) < 5:
+        print("Need at least 5 images for calibration. Please capture more.")
+        return None
+
+    print("\nCalculating fisheye camera calibration...")
+    start = time.perf_counter()
+    try:
+        rms, K, D, rvecs, tvecs, used, view_errors = calibrate_with_rejection(
+            objpoints, imgpoints, img_shape, max_view_error=max_view_error)
+    except cv2.error as e:
+        print(f"Calibration error: {e}")
+        return None
+    solve_time = time.perf_counter() - start
+
+    print_view_errors(view_errors, used, names)
+
+    calibration_file = f"{output_prefix}.npz"
+    calibration_txt = f"{output_prefix}.txt"
+    save_calibration(rms, K, D, rvecs, tvecs, calibration_file, calibration_txt,
+                     view_errors, used, names)
+
+    print(f"Fisheye calibration complete in {solve_time:.2f}s! Saved to {calibration_file} and {calibration_txt}")
+    print(f"RMS Error: {rms}")
+    print_rms_rating(rms)
+
+    return rms, K, D, rvecs, tvecs
+
+
+def current_calibration(calibration_worker, view_count):
+    """The background solve's result if it succeeded for all view_count
+    captured views; otherwise prints why and returns None, so a stale
+    solve from fewer views is never saved as if it were current"""
+    error = calibration_worker.error
+    if error is not None:
+        print(f"Calibration error: {error}")
+        return None
+    result = calibration_worker.result
+    if result is None or result.views != view_count:
+        solved = 0 if result is None else result.views
+        print(f"Calibration error: the last solve covers {solved} of {view_count} captured views")
+        return None
+    return result
+
+
+def save_and_preview(result, original, preview=True):
+    """Save a background calibration result and show an undistorted test image"""
+    calibration_file = "fisheye_calibration.npz"
+    calibration_txt = "fisheye_calibration.txt"
+    save_calibration(result.rms, result.K, result.D, result.rvecs, result.tvecs,
+                     calibration_file, calibration_txt,
+                     result.view_errors, result.used)
+    
+    print_view_errors(result.view_errors, result.used)
+    
+    print(f"Fisheye calibration complete! Saved to {calibration_file} and {calibration_txt}")
+    print(f"RMS Error: {result.rms} ({len(result.used)} of {result.views} views, "
+          f"{'warm' if result.warm_start else 'cold'} start, {result.duration:.2f}s)")
+    
+    # Interpret the RMS error
+    print_rms_rating(result.rms)
+    
+    # Undistortion maps are cached next to the calibration file
+    map1, map2 = get_undistort_maps(
+        result.K, result.D, result.img_shape,
+        cache_dir=os.path.dirname(os.path.abspath(calibration_file)))
+    
+    # Undistort a test image to show the results
+    undistorted = undistort(original, map1, map2)
+    
+    # Save undistorted test image
+    cv2.imwrite("fisheye_undistorted_test.jpg", undistorted)
+    print("Saved undistorted test image to 'fisheye_undistorted_test.jpg'")
+    
+    if preview:
+        # Display the undistorted image in a new window
+        cv2.namedWindow("Undistorted Result", cv2.WINDOW_NORMAL)
+        cv2.imshow("Undistorted Result", undistorted)
+
+
+def draw_focus_overlay(display_frame, checkerboard_size, corners, current_sharpness,
+                       quadrant_sharpness, max_sharpness, sharpness_history):
+    """Draw the detected board, sharpness values, focus bar and trend line"""
+    if corners is None:
+        # No checkerboard detected
+        cv2.putText(display_frame, "NO CHECKERBOARD DETECTED", 
+                   (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
+        cv2.putText(display_frame, "Please place the 13x9 checkerboard in view", 
+                   (10, 70), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
+        return
+    
+    # Draw the corners
+    cv2.drawChessboardCorners(display_frame, checkerboard_size, corners, True)
+    
+    # Display metrics
+    cv2.putText(display_frame, f"CURRENT SHARPNESS: {current_sharpness:.2f}", 
+               (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+    cv2.putText(display_frame, f"MAX SHARPNESS: {max_sharpness:.2f}", 
+               (10, 70), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+    
+    # Per-quadrant sharpness; uneven values point to a tilted lens
+    quadrant_text = "  ".join(f"{label}:{quadrant_sharpness[q]:.1f}"
+                              for q, label in zip(QUADRANTS, ("TL", "TR", "BL", "BR")))
+    cv2.putText(display_frame, quadrant_text, 
+               (10, 140), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 1)
+    
+    # Indicate if we're close to max sharpness
+    if current_sharpness > max_sharpness * 0.95:
+        cv2.putText(display_frame, "OPTIMAL FOCUS!", 
+                   (10, 110), cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 255, 255), 2)
+    
+    # Calculate relative sharpness
+    rel_sharpness = current_sharpness / max_sharpness if max_sharpness > 0 else 0
+    
+    # Draw focus quality bar
+    bar_width = 300
+    bar_height = 30
+    bar_x = 10
+    bar_y = display_frame.shape[0] - 60
+    
+    # Background bar
+    cv2.rectangle(display_frame, 
+                 (bar_x, bar_y), 
+                 (bar_x + bar_width, bar_y + bar_height), 
+                 (50, 50, 50), -1)
+    
+    # Fill bar based on relative sharpness
+    fill_width = int(bar_width * rel_sharpness)
+    
+    # Color changes from red to yellow to green as sharpness improves
+    if rel_sharpness < 0.7:
+        color = (0, 0, 255)  # Red
+    elif rel_sharpness < 0.9:
+        color = (0, 255, 255)  # Yellow
+    else:
+        color = (0, 255, 0)  # Green
+        
+    cv2.rectangle(display_frame, 
+                 (bar_x, bar_y), 
+                 (bar_x + fill_width, bar_y + bar_height), 
+                 color, -1)
+    
+    # Draw border
+    cv2.rectangle(display_frame, 
+                 (bar_x, bar_y), 
+                 (bar_x + bar_width, bar_y + bar_height), 
+                 (255, 255, 255), 1)
+    
+    # Draw scale markers
+    for i in range(1, 10):
+        marker_x = bar_x + (bar_width * i) // 10
+        cv2.line(display_frame, 
+                (marker_x, bar_y), 
+                (marker_x, bar_y + 5), 
+                (255, 255, 255), 1)
+    
+    # Draw focus trend line
+    if len(sharpness_history) > 1:
+        trend_x = display_frame.shape[1] - 120
+        trend_y = 150
+        trend_width = 100
+        trend_height = 50
+        
+        # Background
+        cv2.rectangle(display_frame, 
+                     (trend_x, trend_y), 
+                     (trend_x + trend_width, trend_y + trend_height), 
+                     (0, 0, 0), -1)
+        
+        # Normalize values for trend display
+        trend_values = sharpness_history.copy()
+        trend_max = max(trend_values)
+        if trend_max > 0:
+            trend_values = [v / trend_max * trend_height for v in trend_values]
+            
+            # Draw trend line
+            for i in range(1, len(trend_values)):
+                pt1 = (trend_x + (i-1) * trend_width // len(trend_values), 
+                      int(trend_y + trend_height - trend_values[i-1]))
+                pt2 = (trend_x + i * trend_width // len(trend_values), 
+                      int(trend_y + trend_height - trend_values[i]))
+                cv2.line(display_frame, pt1, pt2, (0, 255, 255), 1)
+        
+        # Draw border
+        cv2.rectangle(display_frame, 
+                     (trend_x, trend_y), 
+                     (trend_x + trend_width, trend_y + trend_height), 
+                     (255, 255, 255), 1)
+        
+        cv2.putText(display_frame, "Trend", 
+                   (trend_x, trend_y - 5), 
+                   cv2.FONT_HERSHEY_SIMPLEX, 0.4, (255, 255, 255), 1)
+
+
+def rms_status(calibration_worker):
+    """Text describing the latest background solve, or None before the first one"""
+    result = calibration_worker.result
+    if result is not None:
+        rms_text = f"RMS: {result.rms:.3f} ({len(result.used)}/{result.views} views)"
+        if calibration_worker.busy:
+            rms_text += " - solving..."
+        return rms_text
+    if calibration_worker.busy:
+        return "RMS: solving..."
+    return None
+
+
+def draw_status_overlay(display_frame, image_count, coverage, auto_capture, rms_text,
+                        max_sharpness_time, capture_fps, process_fps):
+    """Draw capture count, coverage, solve status, frame rates and key help"""
+    # Show image count
+    cv2.putText(display_frame, f"CALIBRATION IMAGES: {image_count}", 
+               (10, display_frame.shape[0] - 80), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 0, 255), 2)
+    
+    # Show which parts of the image and which poses are covered
+    coverage.draw(display_frame)
+    if auto_capture:
+        cv2.putText(display_frame, "AUTO-CAPTURE", 
+                   (display_frame.shape[1] - 250, display_frame.shape[0] - 105), 
+                   cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 160, 0), 2)
+    
+    # Show the latest background solve
+    if rms_text:
+        cv2.putText(display_frame, rms_text, 
+                   (10, display_frame.shape[0] - 105), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 0, 255), 2)
+    cv2.putText(display_frame, "FISHEYE CAMERA MODE", 
+               (display_frame.shape[1] - 250, display_frame.shape[0] - 80), 
+               cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 0, 0), 2)
+    
+    # Add time since max sharpness was seen
+    time_since_max = time.time() - max_sharpness_time
+    cv2.putText(display_frame, f"Time since max: {time_since_max:.1f}s", 
+               (display_frame.shape[1] - 200, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+    
+    # Capture and processing rates differ when detection is the bottleneck
+    cv2.putText(display_frame, f"Capture: {capture_fps.fps:.1f} fps", 
+               (display_frame.shape[1] - 200, 55), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+    cv2.putText(display_frame, f"Processing: {process_fps.fps:.1f} fps", 
+               (display_frame.shape[1] - 200, 80), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+    
+    # Add exit instructions
+    cv2.putText(display_frame, "q:quit  r:reset  c:capture  a:auto  k:calibrate", 
+               (10, display_frame.shape[0] - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
+
+
+def log_detection(found, method, current_sharpness, quadrant_sharpness, max_sharpness,
+                  image_count, coverage, rms_text, capture_fps, process_fps):
+    """Headless replacement for the overlay: one status line on stdout"""
+    if found:
+        quadrants = " ".join(f"{label}:{quadrant_sharpness[q]:.1f}"
+                             for q, label in zip(QUADRANTS, ("TL", "TR", "BL", "BR")))
+        line = (f"board ({method}) sharpness {current_sharpness:.2f} max {max_sharpness:.2f} "
+                f"[{quadrants}]")
+    else:
+        line = "no checkerboard"
+    cells, total_cells = coverage.grid_coverage
+    poses, total_poses = coverage.pose_coverage
+    line += (f" | images {image_count} grid {cells}/{total_cells} pose {poses}/{total_poses}"
+             f" | capture {capture_fps.fps:.1f} fps processing {process_fps.fps:.1f} fps")
+    if rms_text:
+        line += f" | {rms_text}"
+    print(line, flush=True)
+
+
+def run_focus_helper(camera_id=1, metric="laplacian", auto_capture=False,
+                     max_view_error=DEFAULT_MAX_VIEW_ERROR, headless=False,
+                     log_interval=1.0, profile_interval=0.0, profile_json=None):
+    # Initialize camera: a local UVC device, or the MJPEG stream of a
+    # camera being focused in place
+    if is_stream_url(camera_id):
+        print(f"Opening MJPEG stream {camera_id}...")
+        cap = MjpegCapture(camera_id)
+    else:
+        print("Opening UVC fisheye camera...")
+        cap = cv2.VideoCapture(camera_id)
     
     # Check if camera opened successfully
     if not cap.isOpened():
         print("Error: Could not open camera.")
         return
         
-    # Updated checkerboard size
-    checkerboard_size = (13, 9)  # Checkerboard inner corners
+    checkerboard_size = CHECKERBOARD_SIZE
 
     # Create window
     window_name = "Fisheye Camera Focus Helper"
-    cv2.namedWindow(window_name, cv2.WINDOW_NORMAL)
+    if not headless:
+        cv2.namedWindow(window_name, cv2.WINDOW_NORMAL)
     
     # Track sharpness values
     max_sharpness = 0
     max_sharpness_time = time.time()
     sharpness_history = []
+    current_sharpness, quadrant_sharpness = 0.0, None
     
     # Arrays to store calibration data
     objpoints = []  # 3D points in real world space
     imgpoints = []  # 2D points in image plane
     
     # Setup object points for checkerboard (0,0,0), (1,0,0), (2,0,0) ....
-    objp = np.zeros((1, checkerboard_size[0]*checkerboard_size[1], 3), np.float32)
-    objp[0,:,:2] = np.mgrid[0:checkerboard_size[0], 0:checkerboard_size[1]].T.reshape(-1, 2)
+    objp = checkerboard_object_points(checkerboard_size)
+    
+    # Reuses the previous detection to avoid full-frame searches
+    tracker = ChessboardTracker(checkerboard_size)
+    
+    # Focus metric over the board's bounding rectangle, with reused buffers
+    sharpness_meter = SharpnessMeter(metric)
     
     # Create directory for calibration images
     if not os.path.exists("fisheye_calibration_images"):
@@ -39,55 +476,81 @@ def main():
     
     print("Fisheye Camera Focus Helper")
     print("---------------------------")
-    print("- Manually adjust your lens while watching the sharpness value")
-    print("- The focus bar will show relative sharpness (higher is better)")
-    print("- Press 'r' to reset maximum sharpness")
-    print("- Press 'c' to capture image for calibration")
-    print("- Press 'k' to calculate FISHEYE calibration (after capturing several images)")
-    print("- Press 'q' or ESC to quit")
+    if headless:
+        print("- Headless: sharpness and detection are logged instead of displayed")
+        print(f"- Auto-capture is {'enabled' if auto_capture else 'disabled'} (--auto-capture)")
+        print("- The calibration is saved on exit if enough images were captured")
+        print("- Press Ctrl-C to quit")
+    else:
+        print("- Manually adjust your lens while watching the sharpness value")
+        print("- The focus bar will show relative sharpness (higher is better)")
+        print("- Press 'r' to reset maximum sharpness")
+        print("- Press 'c' to capture image for calibration")
+        print("- Press 'a' to toggle auto-capture of views that fill an empty coverage bin")
+        print("- Calibration is re-solved in the background after each capture")
+        print("- Press 'k' to save the FISHEYE calibration (after capturing several images)")
+        print("- Press 'q' or ESC to quit")
 
     image_count = 0
     
+    # Image-plane and pose bins already covered by the captured views
+    coverage = None
+    
+    # Fisheye solves run off the UI thread, warm-started from the last result
+    calibration_worker = CalibrationWorker(max_view_error=max_view_error)
+    save_requested = False
+    
+    # Capture runs on its own thread so slow detection never lets the
+    # camera buffer fill with stale frames
+    grabber = LatestFrameGrabber(cap).start()
+    process_fps = FpsMeter()
+    frame_seq = 0
+    
+    # Rolling p50/p99 of every stage of the loop
+    profiler = StageProfiler()
+    last_log = last_profile = time.monotonic()
+    frame = None
+    
     try:
         while True:
-            # Capture frame
-            ret, frame = cap.read()
+            frame_start = time.perf_counter()
+            
+            # Wait for the newest frame
+            with profiler.stage("capture"):
+                ret, latest, frame_seq = grabber.read(frame_seq)
             if not ret:
-                print("Failed to grab frame - exiting")
-                break
+                if grabber.failed:
+                    print("Failed to grab frame - exiting")
+                    break
+                # A stall, e.g. an MJPEG stream reconnecting over Wi-Fi
+                print("No new frame - waiting for the camera", flush=True)
+                if not headless and cv2.waitKey(1) & 0xFF in (ord('q'), 27):
+                    break
+                continue
+            frame = latest
             
-            # Save original frame for calibration
-            original = frame.copy()
+            if coverage is None:
+                coverage = CoverageIndex(checkerboard_size, frame.shape[1::-1])
             
             # Convert to grayscale
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            
-            # Find checkerboard corners
-            ret, corners = cv2.findChessboardCorners(gray, checkerboard_size, 
-                                                    cv2.CALIB_CB_ADAPTIVE_THRESH + 
-                                                    cv2.CALIB_CB_FAST_CHECK + 
-                                                    cv2.CALIB_CB_NORMALIZE_IMAGE)
+            with profiler.stage("convert"):
+                gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
             
-            # Create a copy for visualization
-            display_frame = frame.copy()
+            # Find checkerboard corners: tracked ROI or pyramid search first,
+            # full frame only once the board is lost
+            with profiler.stage("detection"):
+                corners = tracker.locate(gray)
+            ret = corners is not None
             
             if ret:
-                # Refine corner detection
-                criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 30, 0.001)
-                corners2 = cv2.cornerSubPix(gray, corners, (11, 11), (-1, -1), criteria)
-                
-                # Draw the corners
-                cv2.drawChessboardCorners(display_frame, checkerboard_size, corners2, ret)
-                
-                # Create mask around checkerboard
-                mask = np.zeros_like(gray)
-                hull = cv2.convexHull(corners.astype(np.int32))
-                cv2.fillConvexPoly(mask, hull, 255)
+                # Refine at full resolution
+                with profiler.stage("subpix"):
+                    corners = tracker.refine(gray, corners)
                 
-                # Calculate sharpness of checkerboard area
-                masked_gray = cv2.bitwise_and(gray, gray, mask=mask)
-                laplacian = cv2.Laplacian(masked_gray, cv2.CV_64F)
-                current_sharpness = laplacian.var()
+                # Calculate sharpness inside the checkerboard hull only
+                with profiler.stage("sharpness"):
+                    hull = cv2.convexHull(corners.astype(np.int32))
+                    current_sharpness, quadrant_sharpness = sharpness_meter.measure_quadrants(gray, hull)
                 
                 # Keep history for trend line
                 sharpness_history.append(current_sharpness)
@@ -98,128 +561,31 @@ def main():
                 if current_sharpness > max_sharpness:
                     max_sharpness = current_sharpness
                     max_sharpness_time = time.time()
-                    
-                # Display metrics
-                cv2.putText(display_frame, f"CURRENT SHARPNESS: {current_sharpness:.2f}", 
-                           (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-                cv2.putText(display_frame, f"MAX SHARPNESS: {max_sharpness:.2f}", 
-                           (10, 70), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-                
-                # Indicate if we're close to max sharpness
-                if current_sharpness > max_sharpness * 0.95:
-                    cv2.putText(display_frame, "OPTIMAL FOCUS!", 
-                               (10, 110), cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 255, 255), 2)
-                
-                # Calculate relative sharpness
-                rel_sharpness = current_sharpness / max_sharpness if max_sharpness > 0 else 0
-                
-                # Draw focus quality bar
-                bar_width = 300
-                bar_height = 30
-                bar_x = 10
-                bar_y = display_frame.shape[0] - 60
-                
-                # Background bar
-                cv2.rectangle(display_frame, 
-                             (bar_x, bar_y), 
-                             (bar_x + bar_width, bar_y + bar_height), 
-                             (50, 50, 50), -1)
-                
-                # Fill bar based on relative sharpness
-                fill_width = int(bar_width * rel_sharpness)
-                
-                # Color changes from red to yellow to green as sharpness improves
-                if rel_sharpness < 0.7:
-                    color = (0, 0, 255)  # Red
-                elif rel_sharpness < 0.9:
-                    color = (0, 255, 255)  # Yellow
-                else:
-                    color = (0, 255, 0)  # Green
-                    
-                cv2.rectangle(display_frame, 
-                             (bar_x, bar_y), 
-                             (bar_x + fill_width, bar_y + bar_height), 
-                             color, -1)
-                
-                # Draw border
-                cv2.rectangle(display_frame, 
-                             (bar_x, bar_y), 
-                             (bar_x + bar_width, bar_y + bar_height), 
-                             (255, 255, 255), 1)
-                
-                # Draw scale markers
-                for i in range(1, 10):
-                    marker_x = bar_x + (bar_width * i) // 10
-                    cv2.line(display_frame, 
-                            (marker_x, bar_y), 
-                            (marker_x, bar_y + 5), 
-                            (255, 255, 255), 1)
-                
-                # Draw focus trend line
-                if len(sharpness_history) > 1:
-                    trend_x = display_frame.shape[1] - 120
-                    trend_y = 150
-                    trend_width = 100
-                    trend_height = 50
-                    
-                    # Background
-                    cv2.rectangle(display_frame, 
-                                 (trend_x, trend_y), 
-                                 (trend_x + trend_width, trend_y + trend_height), 
-                                 (0, 0, 0), -1)
-                    
-                    # Normalize values for trend display
-                    trend_values = sharpness_history.copy()
-                    trend_max = max(trend_values)
-                    if trend_max > 0:
-                        trend_values = [v / trend_max * trend_height for v in trend_values]
-                        
-                        # Draw trend line
-                        for i in range(1, len(trend_values)):
-                            pt1 = (trend_x + (i-1) * trend_width // len(trend_values), 
-                                  int(trend_y + trend_height - trend_values[i-1]))
-                            pt2 = (trend_x + i * trend_width // len(trend_values), 
-                                  int(trend_y + trend_height - trend_values[i]))
-                            cv2.line(display_frame, pt1, pt2, (0, 255, 255), 1)
-                    
-                    # Draw border
-                    cv2.rectangle(display_frame, 
-                                 (trend_x, trend_y), 
-                                 (trend_x + trend_width, trend_y + trend_height), 
-                                 (255, 255, 255), 1)
-                    
-                    cv2.putText(display_frame, "Trend", 
-                               (trend_x, trend_y - 5), 
-                               cv2.FONT_HERSHEY_SIMPLEX, 0.4, (255, 255, 255), 1)
-                
-            else:
-                # No checkerboard detected
-                cv2.putText(display_frame, "NO CHECKERBOARD DETECTED", 
-                           (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
-                cv2.putText(display_frame, "Please place the 13x9 checkerboard in view", 
-                           (10, 70), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
             
-            # Show image count
-            cv2.putText(display_frame, f"CALIBRATION IMAGES: {image_count}", 
-                       (10, display_frame.shape[0] - 80), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 0, 255), 2)
-            cv2.putText(display_frame, "FISHEYE CAMERA MODE", 
-                       (display_frame.shape[1] - 250, display_frame.shape[0] - 80), 
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 0, 0), 2)
+            process_fps.tick()
+            rms_text = rms_status(calibration_worker)
             
-            # Add time since max sharpness was seen
-            time_since_max = time.time() - max_sharpness_time
-            cv2.putText(display_frame, f"Time since max: {time_since_max:.1f}s", 
-                       (display_frame.shape[1] - 200, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
-            
-            # Add exit instructions
-            cv2.putText(display_frame, "q:quit  r:reset  c:capture  k:calibrate", 
-                       (10, display_frame.shape[0] - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1)
-            
-            # Show the frame
-            cv2.imshow(window_name, display_frame)
-            
-            # Handle key inputs with timeout to avoid blocking
-            key = cv2.waitKey(1) & 0xFF
+            if headless:
+                key = -1
+                now = time.monotonic()
+                if now - last_log >= log_interval:
+                    last_log = now
+                    log_detection(ret, tracker.last_method, current_sharpness, quadrant_sharpness,
+                                  max_sharpness, image_count, coverage, rms_text,
+                                  grabber.capture_fps, process_fps)
+            else:
+                # The frame itself is never drawn on, so it can be saved as is
+                with profiler.stage("overlay"):
+                    display_frame = frame.copy()
+                    draw_focus_overlay(display_frame, checkerboard_size, corners, current_sharpness,
+                                       quadrant_sharpness, max_sharpness, sharpness_history)
+                    draw_status_overlay(display_frame, image_count, coverage, auto_capture, rms_text,
+                                        max_sharpness_time, grabber.capture_fps, process_fps)
+                
+                # Show the frame and handle key inputs with timeout to avoid blocking
+                with profiler.stage("display"):
+                    cv2.imshow(window_name, display_frame)
+                    key = cv2.waitKey(1) & 0xFF
             
             # Multiple exit methods
             if key == ord('q') or key == 27:  # 'q' or ESC key
@@ -231,110 +597,74 @@ def main():
                 max_sharpness_time = time.time()
                 print("Reset maximum sharpness value")
                 
-            elif key == ord('c'):  # Capture calibration image
+            elif key == ord('a'):  # Toggle coverage-driven auto-capture
+                auto_capture = not auto_capture
+                print(f"Auto-capture {'enabled' if auto_capture else 'disabled'}")
+            
+            # Auto-capture only views that fill an empty coverage bin
+            auto_triggered = (auto_capture and ret and key != ord('c') and
+                              coverage.should_capture(corners))
+            
+            if key == ord('c') or auto_triggered:  # Capture calibration image
                 if ret:
                     image_count += 1
                     filename = f"fisheye_calibration_images/calib_{image_count}.jpg"
-                    cv2.imwrite(filename, original)
+                    cv2.imwrite(filename, frame)
                     
                     # Save the object and image points for fisheye calibration
-                    if corners is not None:
-                        objpoints.append(objp)
-                        imgpoints.append(corners2.reshape(1, -1, 2))
-                        
-                        print(f"Captured fisheye calibration image {image_count}")
-                    else:
-                        print("Checkerboard not detected - image saved but not used for calibration")
+                    objpoints.append(objp)
+                    imgpoints.append(corners.reshape(1, -1, 2))
+                    
+                    horizontal, vertical, distance = coverage.pose_bin(corners)
+                    coverage.add(corners)
+                    print(f"{'Auto-captured' if auto_triggered else 'Captured'} fisheye calibration image {image_count} "
+                          f"(tilt {TILT_LABELS[horizontal]}/{TILT_LABELS[vertical]}, {DISTANCE_LABELS[distance]})")
+                    
+                    # Re-solve in the background so the RMS stays current
+                    calibration_worker.submit(objpoints, imgpoints, gray.shape[::-1])
+                else:
+                    print("Checkerboard not detected - nothing captured")
             
-            elif key == ord('k'):  # Calculate fisheye calibration
+            if key == ord('k'):  # Save fisheye calibration
                 # Calculate calibration if we have enough images
                 if len(objpoints) < 5:
                     print("Need at least 5 images for calibration. Please capture more.")
                 else:
-                    print("\nCalculating fisheye camera calibration...")
-                    
-                    # Fisheye calibration needs at least 3 images
-                    # Get image dimensions
-                    img_shape = gray.shape[::-1]
-                    
-                    # Fisheye calibration requires different initialization
-                    K = np.zeros((3, 3))
-                    D = np.zeros((4, 1))
-                    
-                    # Flags for fisheye calibration
-                    calibration_flags = cv2.fisheye.CALIB_RECOMPUTE_EXTRINSIC + \
-                                       cv2.fisheye.CALIB_CHECK_COND + \
-                                       cv2.fisheye.CALIB_FIX_SKEW
-                    
-                    # Perform fisheye calibration
-                    try:
-                        rms, K, D, rvecs, tvecs = cv2.fisheye.calibrate(
-                            objpoints, imgpoints, img_shape, K, D, 
-                            flags=calibration_flags)
-                        
-                        # Save the calibration results
-                        calibration_file = "fisheye_calibration.npz"
-                        np.savez(calibration_file, 
-                                 camera_matrix=K,
-                                 dist_coeffs=D,
-                                 rvecs=rvecs,
-                                 tvecs=tvecs)
-                        
-                        # Also save in a human-readable format
-                        calibration_txt = "fisheye_calibration.txt"
-                        with open(calibration_txt, 'w') as f:
-                            f.write("# Fisheye Camera Calibration Results\n\n")
-                            f.write(f"RMS Error: {rms}\n\n")
-                            f.write("Camera Matrix (K):\n")
-                            f.write(str(K))
-                            f.write("\n\nDistortion Coefficients (D):\n")
-                            f.write(str(D))
-                        
-                        print(f"Fisheye calibration complete! Saved to {calibration_file} and {calibration_txt}")
-                        print(f"RMS Error: {rms}")
-                        
-                        # Interpret the RMS error
-                        if rms < 1.0:
-                            print("Excellent calibration! (RMS < 1.0)")
-                        elif rms < 2.0:
-                            print("Good calibration. (RMS < 2.0)")
-                        elif rms < 3.0:
-                            print("Acceptable calibration. (RMS < 3.0)")
-                        else:
-                            print("Poor calibration. Consider recapturing images. (RMS >= 3.0)")
-                            
-                        # Undistort a test image to show the results
-                        test_img = original.copy()
-                        
-                        # Calculate undistortion maps
-                        map1, map2 = cv2.fisheye.initUndistortRectifyMap(
-                            K, D, np.eye(3), K, img_shape, cv2.CV_16SC2)
-                        
-                        # Apply undistortion
-                        undistorted = cv2.remap(test_img, map1, map2, 
-                                               interpolation=cv2.INTER_LINEAR, 
-                                               borderMode=cv2.BORDER_CONSTANT)
-                        
-                        # Save undistorted test image
-                        cv2.imwrite("fisheye_undistorted_test.jpg", undistorted)
-                        print("Saved undistorted test image to 'fisheye_undistorted_test.jpg'")
-                        
-                        # Display the undistorted image in a new window
-                        cv2.namedWindow("Undistorted Result", cv2.WINDOW_NORMAL)
-                        cv2.imshow("Undistorted Result", undistorted)
-                        
-                    except Exception as e:
-                        print(f"Calibration error: {e}")
-                        print("Tips for fisheye calibration:")
-                        print("- Use more images (10-20 is recommended)")
-                        print("- Ensure the checkerboard fills different parts of the frame")
-                        print("- Hold the checkerboard at different angles")
-                        print("- Avoid having the checkerboard at the extreme edges of the fisheye view")
+                    # The solve runs in the background; save once it is current
+                    result = calibration_worker.result
+                    if not calibration_worker.busy and (result is None or result.views != len(objpoints)):
+                        calibration_worker.submit(objpoints, imgpoints, gray.shape[::-1])
+                    save_requested = True
+                    print("\nSaving fisheye calibration once the background solve is current...")
+            
+            # Save the calibration as soon as the solve covers all captures
+            if save_requested and not calibration_worker.busy:
+                save_requested = False
+                result = current_calibration(calibration_worker, len(objpoints))
+                if result is None:
+                    print("Tips for fisheye calibration:")
+                    print("- Use more images (10-20 is recommended)")
+                    print("- Ensure the checkerboard fills different parts of the frame")
+                    print("- Hold the checkerboard at different angles")
+                    print("- Avoid having the checkerboard at the extreme edges of the fisheye view")
+                else:
+                    save_and_preview(result, frame)
             
             # Check if window was closed
-            if cv2.getWindowProperty(window_name, cv2.WND_PROP_VISIBLE) < 1:
+            if not headless and cv2.getWindowProperty(window_name, cv2.WND_PROP_VISIBLE) < 1:
                 print("Window closed - exiting")
                 break
+            
+            profiler.record("frame", time.perf_counter() - frame_start)
+            
+            # Periodic stage report
+            if profile_interval > 0:
+                now = time.monotonic()
+                if now - last_profile >= profile_interval:
+                    last_profile = now
+                    print(profiler.format(), flush=True)
+                    if profile_json:
+                        profiler.save_json(profile_json, metric=metric, headless=headless)
     
     except KeyboardInterrupt:
         print("Interrupted by user - exiting")
@@ -343,9 +673,71 @@ def main():
     finally:
         # Always clean up resources properly
         print("Cleaning up resources...")
+        grabber.stop()
+        
+        # Without a keyboard the calibration can only be saved on the way out
+        if headless and len(objpoints) >= 5 and frame is not None:
+            print("\nWaiting for the background solve to save the fisheye calibration...")
+            calibration_worker.wait()
+            result = current_calibration(calibration_worker, len(objpoints))
+            if result is not None:
+                save_and_preview(result, frame, preview=False)
+        
+        calibration_worker.stop()
         cap.release()
-        cv2.destroyAllWindows()
+        
+        print("\nStage timings (last frames):")
+        print(profiler.format())
+        if profile_json:
+            profiler.save_json(profile_json, metric=metric, headless=headless)
+            print(f"Stage timings written to {profile_json}")
+        
+        if not headless:
+            cv2.destroyAllWindows()
         print("Exit successful!")
 
+def camera_source(value):
+    """--camera: a local camera index or an http(s) MJPEG stream URL"""
+    if is_stream_url(value):
+        return value
+    try:
+        return int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected a camera ID or an http:// stream URL, got '{value}'")
+
+def main():
+    parser = argparse.ArgumentParser(description="Fisheye camera focus helper and calibration tool")
+    parser.add_argument("--camera", type=camera_source, default=1,
+                        help="camera ID, or MJPEG stream URL such as http://<cam>:8080/?action=stream, "
+                             "for the interactive focus helper (default: 1)")
+    parser.add_argument("--metric", choices=METRICS, default="laplacian",
+                        help="focus metric shown by the focus helper (default: laplacian)")
+    parser.add_argument("--auto-capture", action="store_true",
+                        help="start the focus helper with coverage-driven auto-capture enabled")
+    parser.add_argument("--headless", action="store_true",
+                        help="no window or overlay; log sharpness and detection to stdout (e.g. over SSH)")
+    parser.add_argument("--log-interval", type=float, default=1.0,
+                        help="seconds between headless status lines (default: 1)")
+    parser.add_argument("--profile", type=float, default=0.0, metavar="SECONDS",
+                        help="print per-stage p50/p99 timings every SECONDS (default: only on exit)")
+    parser.add_argument("--profile-json", metavar="FILE",
+                        help="write per-stage timings as JSON to FILE")
+    parser.add_argument("--batch", metavar="DIR",
+                        help="calibrate headless from a directory of checkerboard images")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="processes used for batch corner detection (default: all cores)")
+    parser.add_argument("--max-view-error", type=float, default=DEFAULT_MAX_VIEW_ERROR,
+                        help=f"prune views whose RMS reprojection error exceeds this many pixels (default: {DEFAULT_MAX_VIEW_ERROR})")
+    parser.add_argument("--output", default="fisheye_calibration",
+                        help="output prefix for the batch .npz/.txt results (default: fisheye_calibration)")
+    args = parser.parse_args()
+
+    if args.batch:
+        if batch_calibrate(args.batch, args.workers, args.output, args.max_view_error) is None:
+            raise SystemExit(1)
+    else:
+        run_focus_helper(args.camera, args.metric, args.auto_capture, args.max_view_error,
+                         args.headless, args.log_interval, args.profile, args.profile_json)
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
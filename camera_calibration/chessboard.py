@@ -0,0 +1,133 @@
+import cv2
+import numpy as np
+
+# Flags for findChessboardCorners; accuracy comes from the full resolution
+# cornerSubPix afterwards
+CHESSBOARD_FLAGS = cv2.CALIB_CB_ADAPTIVE_THRESH + \
+                   cv2.CALIB_CB_FAST_CHECK + \
+                   cv2.CALIB_CB_NORMALIZE_IMAGE
+
+# Refinement criteria for cornerSubPix
+SUBPIX_CRITERIA = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 30, 0.001)
+
+
+class ChessboardTracker:
+    """Find a checkerboard cheaply by reusing the previous detection.
+
+    Strategy per frame:
+    - board seen last frame: search a padded ROI around the previous
+      corners, downscaled if the ROI is still large
+    - otherwise: search a downscaled pyramid level of the whole frame
+    - if that fails: search the full resolution frame, right after the
+      board was lost but otherwise only every full_search_interval
+      frames, so frames without a board (the common idle case) cost no
+      more than the pyramid search
+    Corners are always refined with cornerSubPix at full resolution.
+    """
+
+    def __init__(self, checkerboard_size, search_width=640, min_square=16, roi_padding=0.25,
+                 flags=CHESSBOARD_FLAGS, subpix_window=(11, 11), full_search_interval=10):
+        self.checkerboard_size = checkerboard_size
+        self.search_width = search_width
+        self.min_square = min_square
+        self.roi_padding = roi_padding
+        self.flags = flags
+        self.subpix_window = subpix_window
+        self.full_search_interval = full_search_interval
+
+        self._misses = 0  # board-free frames since the last full search
+        self.last_corners = None
+        self.last_method = None
+
+    def reset(self):
+        self.last_corners = None
+
+    def _search(self, gray, levels, x0=0, y0=0, min_level=0):
+        """Search gray (a view into the frame at x0, y0) on a pyramid level.
+
+        Starts levels pyrDowns below gray and, since strongly distorted
+        squares near the fisheye edge can vanish at the coarsest level,
+        retries one level finer (but not below min_level) before giving up.
+        """
+        pyramid = [gray]
+        for _ in range(levels):
+            pyramid.append(cv2.pyrDown(pyramid[-1]))
+
+        for level in range(levels, max(min_level, levels - 1) - 1, -1):
+            ret, corners = cv2.findChessboardCorners(pyramid[level], self.checkerboard_size, self.flags)
+            if ret:
+                # pyrDown output pixel i is centred on input pixel 2i
+                corners = corners * float(2 ** level)
+                corners[:, :, 0] += x0
+                corners[:, :, 1] += y0
+                return corners.astype(np.float32)
+        return None
+
+    def _pyramid_levels(self, width):
+        """Levels that bring an unknown frame down to about search_width"""
+        levels = 0
+        while width > self.search_width * 1.5:
+            width //= 2
+            levels += 1
+        return levels
+
+    def _roi(self, shape):
+        """Padded ROI around the last corners and the levels it can be shrunk by"""
+        h, w = shape[:2]
+        x, y, bw, bh = cv2.boundingRect(self.last_corners.reshape(-1, 2))
+        pad_x = int(bw * self.roi_padding) + self.subpix_window[0]
+        pad_y = int(bh * self.roi_padding) + self.subpix_window[1]
+        x0, y0 = max(0, x - pad_x), max(0, y - pad_y)
+        x1, y1 = min(w, x + bw + pad_x), min(h, y + bh + pad_y)
+
+        # Shrink while the squares stay large enough to be detected
+        square = min(bw / max(1, self.checkerboard_size[0] - 1),
+                     bh / max(1, self.checkerboard_size[1] - 1))
+        levels = 0
+        while square / 2 >= self.min_square:
+            square /= 2
+            levels += 1
+        return x0, y0, x1, y1, levels
+
+    def locate(self, gray):
+        """Coarse corners of the board in gray, or None if it is not found"""
+        tracked = self.last_corners is not None
+        levels = 0
+        if tracked:
+            x0, y0, x1, y1, levels = self._roi(gray.shape)
+            corners = self._search(gray[y0:y1, x0:x1], levels, x0, y0)
+            self.last_method = "roi"
+        else:
+            # Level 0 of the whole frame is the full search below
+            levels = self._pyramid_levels(gray.shape[1])
+            corners = self._search(gray, levels, min_level=1) if levels else None
+            self.last_method = "pyramid"
+
+        if corners is None:
+            # Board just lost, frame too small for a pyramid, or a periodic
+            # look for a board too small for the pyramid level
+            self._misses += 1
+            if not (tracked or levels == 0 or self._misses >= self.full_search_interval):
+                self.last_method = None
+                return None
+            self._misses = 0
+            ret, corners = cv2.findChessboardCorners(gray, self.checkerboard_size, self.flags)
+            self.last_method = "full"
+            if not ret:
+                self.last_corners = None
+                self.last_method = None
+                return None
+        return corners
+
+    def refine(self, gray, corners):
+        """Refine located corners at full resolution and remember them"""
+        corners = cv2.cornerSubPix(gray, corners, self.subpix_window, (-1, -1), SUBPIX_CRITERIA)
+        self.last_corners = corners
+        return corners
+
+    def detect(self, gray):
+        """Return (found, corners) with corners refined at full resolution"""
+        corners = self.locate(gray)
+        if corners is None:
+            return False, None
+        return True, self.refine(gray, corners)
@@ -0,0 +1,114 @@
+import time
+
+import cv2
+import numpy as np
+
+TILT_LABELS = ("-", "0", "+")
+DISTANCE_LABELS = ("far", "mid", "near")
+
+
+class CoverageIndex:
+    """Track which views a set of calibration captures already covers.
+
+    Two kinds of bins are kept:
+    - an image-plane grid, marked by every corner of a captured board
+    - pose bins: horizontal tilt x vertical tilt x distance
+
+    Tilt is estimated from the board's perspective foreshortening (ratio
+    of opposite edge lengths) and distance from its apparent size, so no
+    calibration is needed to bin a view. A view is worth capturing only if
+    it fills at least one empty bin.
+    """
+
+    def __init__(self, checkerboard_size, image_size, grid=(8, 6),
+                 tilt_threshold=0.12, distance_edges=(0.3, 0.5), min_interval=1.0):
+        self.cols, self.rows = checkerboard_size
+        self.image_size = tuple(image_size)
+        self.grid = grid
+        self.tilt_threshold = tilt_threshold
+        self.distance_edges = distance_edges
+        self.min_interval = min_interval
+
+        self.cells = np.zeros((grid[1], grid[0]), dtype=bool)
+        self.poses = np.zeros((len(TILT_LABELS), len(TILT_LABELS), len(DISTANCE_LABELS)), dtype=bool)
+        self.last_capture = 0.0
+
+    def reset(self):
+        self.cells[:] = False
+        self.poses[:] = False
+
+    def _cells_of(self, corners):
+        pts = corners.reshape(-1, 2)
+        w, h = self.image_size
+        gx = np.clip((pts[:, 0] * self.grid[0] / w).astype(int), 0, self.grid[0] - 1)
+        gy = np.clip((pts[:, 1] * self.grid[1] / h).astype(int), 0, self.grid[1] - 1)
+        cells = np.zeros_like(self.cells)
+        cells[gy, gx] = True
+        return cells
+
+    def _tilt_bin(self, ratio):
+        # ratio is log(edge a / edge b): 0 for a board facing the camera
+        if ratio < -self.tilt_threshold:
+            return 0
+        if ratio > self.tilt_threshold:
+            return 2
+        return 1
+
+    def pose_bin(self, corners):
+        """(horizontal tilt, vertical tilt, distance) bin indices of a view"""
+        grid = corners.reshape(self.rows, self.cols, 2)
+        top = np.linalg.norm(grid[0, -1] - grid[0, 0])
+        bottom = np.linalg.norm(grid[-1, -1] - grid[-1, 0])
+        left = np.linalg.norm(grid[-1, 0] - grid[0, 0])
+        right = np.linalg.norm(grid[-1, -1] - grid[0, -1])
+
+        # Turning the board about its vertical axis shortens one side edge
+        horizontal = self._tilt_bin(np.log(max(left, 1e-6) / max(right, 1e-6)))
+        vertical = self._tilt_bin(np.log(max(top, 1e-6) / max(bottom, 1e-6)))
+
+        area = cv2.contourArea(cv2.convexHull(corners.reshape(-1, 1, 2).astype(np.float32)))
+        size = np.sqrt(area / (self.image_size[0] * self.image_size[1]))
+        distance = int(np.searchsorted(self.distance_edges, size))
+        return horizontal, vertical, distance
+
+    def novelty(self, corners):
+        """(new grid cells, fills an empty pose bin) for a candidate view"""
+        new_cells = int(np.count_nonzero(self._cells_of(corners) & ~self.cells))
+        return new_cells, not self.poses[self.pose_bin(corners)]
+
+    def should_capture(self, corners, now=None):
+        """True if the view fills an empty bin and auto-capture is not throttled"""
+        now = time.monotonic() if now is None else now
+        if now - self.last_capture < self.min_interval:
+            return False
+        new_cells, new_pose = self.novelty(corners)
+        return new_cells > 0 or new_pose
+
+    def add(self, corners, now=None):
+        """Mark the bins of a captured view"""
+        self.cells |= self._cells_of(corners)
+        self.poses[self.pose_bin(corners)] = True
+        self.last_capture = time.monotonic() if now is None else now
+
+    @property
+    def grid_coverage(self):
+        return int(self.cells.sum()), self.cells.size
+
+    @property
+    def pose_coverage(self):
+        return int(self.poses.sum()), self.poses.size
+
+    def draw(self, frame):
+        """Outline covered grid cells and print the coverage counts"""
+        h, w = frame.shape[:2]
+        cw, ch = w / self.grid[0], h / self.grid[1]
+        for gy, gx in zip(*np.nonzero(self.cells)):
+            cv2.rectangle(frame,
+                          (int(gx * cw) + 2, int(gy * ch) + 2),
+                          (int((gx + 1) * cw) - 2, int((gy + 1) * ch) - 2),
+                          (0, 160, 0), 1)
+
+        cells, total_cells = self.grid_coverage
+        poses, total_poses = self.pose_coverage
+        cv2.putText(frame, f"COVERAGE: grid {cells}/{total_cells}  pose {poses}/{total_poses}",
+                    (10, h - 130), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 160, 0), 2)
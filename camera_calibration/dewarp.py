@@ -0,0 +1,299 @@
+import argparse
+import glob
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from profiling import FpsMeter
+from undistort import DEFAULT_CALIBRATION, load_calibration, get_undistort_maps
+
+# Marks the end of the stream on the pipeline queues
+_END = object()
+
+
+def iter_image_files(paths):
+    """Yield (name, encoded bytes) for image files, directories and globs"""
+    for path in paths:
+        if os.path.isdir(path):
+            files = sorted(glob.glob(os.path.join(path, "*.jpg")) +
+                           glob.glob(os.path.join(path, "*.jpeg")) +
+                           glob.glob(os.path.join(path, "*.png")))
+        else:
+            files = sorted(glob.glob(path)) or [path]
+        for f in files:
+            with open(f, "rb") as fh:
+                yield os.path.basename(f), fh.read()
+
+
+def iter_video_frames(source):
+    """Yield (name, decoded frame) from a camera index, video file or stream URL"""
+    cap = cv2.VideoCapture(int(source) if str(source).isdigit() else source)
+    if not cap.isOpened():
+        print(f"Error: Could not open {source}")
+        return
+    index = 0
+    try:
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            index += 1
+            yield f"frame_{index:06d}.jpg", frame
+    finally:
+        cap.release()
+
+
+class BandRemapper:
+    """Remap a frame in horizontal bands spread across a thread pool.
+
+    cv2.remap releases the GIL, so bands of the same frame run truly in
+    parallel. Each band writes straight into its rows of the output buffer.
+    """
+
+    def __init__(self, map1, map2, threads=None):
+        self.map1 = map1
+        self.map2 = map2
+        self.threads = threads or os.cpu_count() or 1
+        self.pool = ThreadPoolExecutor(max_workers=self.threads)
+
+        height = map1.shape[0]
+        edges = np.linspace(0, height, self.threads + 1).astype(int)
+        self.bands = [(edges[i], edges[i + 1]) for i in range(self.threads)
+                      if edges[i + 1] > edges[i]]
+
+    def _remap_band(self, src, dst, y0, y1):
+        cv2.remap(src, self.map1[y0:y1], self.map2[y0:y1],
+                  interpolation=cv2.INTER_LINEAR,
+                  borderMode=cv2.BORDER_CONSTANT,
+                  dst=dst[y0:y1])
+
+    def remap(self, src, dst):
+        if len(self.bands) == 1:
+            self._remap_band(src, dst, *self.bands[0])
+        else:
+            futures = [self.pool.submit(self._remap_band, src, dst, y0, y1)
+                       for y0, y1 in self.bands]
+            for f in futures:
+                f.result()
+        return dst
+
+    def close(self):
+        self.pool.shutdown()
+
+
+class DewarpPipeline:
+    """Decode -> banded remap -> encode, connected by bounded queues.
+
+    Output frames are written into a fixed set of preallocated buffers that
+    are recycled once the encoder is done with them, so steady state does
+    not allocate per frame. The bounded queues apply back-pressure to the
+    decoder when remap or encode fall behind.
+    """
+
+    def __init__(self, K, D, threads=None, queue_size=4, quality=90,
+                 cache_dir=".", report_interval=5.0):
+        self.K = K
+        self.D = D
+        self.threads = threads
+        self.queue_size = queue_size
+        self.quality = quality
+        self.cache_dir = cache_dir
+        self.report_interval = report_interval
+
+        self.remapper = None
+        self.frame_shape = None
+        self.free_buffers = None
+        self.fps = FpsMeter()
+
+    def _setup(self, frame):
+        h, w = frame.shape[:2]
+        map1, map2 = get_undistort_maps(self.K, self.D, (w, h), cache_dir=self.cache_dir)
+        self.remapper = BandRemapper(map1, map2, self.threads)
+        self.frame_shape = frame.shape
+
+        # One buffer per slot in the encode queue, plus one being remapped
+        # and one being encoded
+        self.free_buffers = queue.Queue()
+        for _ in range(self.queue_size + 2):
+            self.free_buffers.put(np.empty(frame.shape, dtype=frame.dtype))
+
+    def _decode(self, source, decoded, errors):
+        try:
+            for name, item in source:
+                if isinstance(item, (bytes, bytearray)):
+                    frame = cv2.imdecode(np.frombuffer(item, np.uint8), cv2.IMREAD_COLOR)
+                    if frame is None:
+                        print(f"Could not decode {name} - skipped")
+                        continue
+                else:
+                    frame = item
+                decoded.put((name, frame))
+        except Exception as e:
+            errors.append(e)
+        finally:
+            decoded.put(_END)
+
+    def _encode(self, encoded, sink, errors):
+        params = [cv2.IMWRITE_JPEG_QUALITY, self.quality]
+        last_report = time.perf_counter()
+        while True:
+            item = encoded.get()
+            if item is _END:
+                break
+            name, buf = item
+            try:
+                ok, data = cv2.imencode(".jpg", buf, params)
+                if ok and sink is not None:
+                    sink(name, data)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                self.free_buffers.put(buf)
+
+            self.fps.tick()
+            now = time.perf_counter()
+            if self.report_interval and now - last_report >= self.report_interval:
+                print(f"  {self.fps.total} frames, {self.fps.fps:.1f} fps")
+                last_report = now
+
+    def run(self, source, sink=None):
+        """Dewarp every frame from source, handing (name, jpeg) to sink"""
+        decoded = queue.Queue(maxsize=self.queue_size)
+        encoded = queue.Queue(maxsize=self.queue_size)
+        errors = []
+
+        decoder = threading.Thread(target=self._decode, args=(source, decoded, errors), daemon=True)
+        encoder = threading.Thread(target=self._encode, args=(encoded, sink, errors), daemon=True)
+        decoder.start()
+        encoder.start()
+
+        try:
+            while True:
+                item = decoded.get()
+                if item is _END:
+                    break
+                name, frame = item
+
+                if self.remapper is None:
+                    self._setup(frame)
+                elif frame.shape != self.frame_shape:
+                    print(f"{name}: size {frame.shape[1::-1]} differs from the stream - skipped")
+                    continue
+
+                buf = self.free_buffers.get()
+                self.remapper.remap(frame, buf)
+                encoded.put((name, buf))
+        finally:
+            encoded.put(_END)
+            encoder.join()
+            decoder.join(timeout=1.0)
+            if self.remapper is not None:
+                self.remapper.close()
+
+        if errors:
+            raise errors[0]
+        return self.fps.total
+
+
+def directory_sink(output_dir):
+    """Sink that writes encoded frames to output_dir under their source name"""
+    os.makedirs(output_dir, exist_ok=True)
+
+    def write(name, data):
+        with open(os.path.join(output_dir, name), "wb") as f:
+            f.write(data.tobytes())
+    return write
+
+
+def bench(K, D, frame, thread_counts, seconds=2.0, cache_dir="."):
+    """Measure remap throughput for each thread count on a single frame"""
+    h, w = frame.shape[:2]
+    map1, map2 = get_undistort_maps(K, D, (w, h), cache_dir=cache_dir)
+    dst = np.empty_like(frame)
+
+    print(f"Remap throughput for {w}x{h} ({seconds:.0f}s per run)")
+    print("threads      fps   speedup")
+    baseline = None
+    results = {}
+    for threads in thread_counts:
+        remapper = BandRemapper(map1, map2, threads)
+        remapper.remap(frame, dst)  # warm up
+
+        frames = 0
+        start = time.perf_counter()
+        while time.perf_counter() - start < seconds:
+            remapper.remap(frame, dst)
+            frames += 1
+        fps = frames / (time.perf_counter() - start)
+        remapper.close()
+
+        baseline = baseline or fps
+        results[threads] = fps
+        print(f"{threads:7d} {fps:8.1f} {fps / baseline:8.2f}x")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Multi-threaded fisheye undistortion of streams and image archives")
+    parser.add_argument("sources", nargs="*",
+                        help="image files, directories or globs; or a single camera index, video file or stream URL")
+    parser.add_argument("--calibration", default=DEFAULT_CALIBRATION,
+                        help=f"calibration npz (default: {DEFAULT_CALIBRATION})")
+    parser.add_argument("--output-dir", default="undistorted",
+                        help="directory for the undistorted frames (default: undistorted)")
+    parser.add_argument("--threads", type=int, default=None,
+                        help="remap threads (default: all cores)")
+    parser.add_argument("--queue-size", type=int, default=4,
+                        help="depth of the decode and encode queues (default: 4)")
+    parser.add_argument("--quality", type=int, default=90,
+                        help="JPEG quality of the output (default: 90)")
+    parser.add_argument("--bench", action="store_true",
+                        help="measure remap throughput against thread count instead of writing output")
+    args = parser.parse_args()
+
+    # The pipeline does its own threading; OpenCV's internal pool would
+    # only compete with it for the same cores
+    cv2.setNumThreads(1)
+
+    K, D = load_calibration(args.calibration)
+    cache_dir = os.path.dirname(os.path.abspath(args.calibration))
+
+    if args.bench:
+        frame = None
+        if args.sources:
+            _, data = next(iter_image_files(args.sources[:1]))
+            frame = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+        if frame is None:
+            # Size of the sensor the calibration was made for
+            w, h = int(round(K[0, 2] * 2)), int(round(K[1, 2] * 2))
+            frame = np.random.randint(0, 256, (h, w, 3), dtype=np.uint8)
+        max_threads = args.threads or os.cpu_count() or 1
+        counts = sorted({1, max_threads} | {2 ** i for i in range(max_threads.bit_length()) if 2 ** i <= max_threads})
+        bench(K, D, frame, counts, cache_dir=cache_dir)
+        return
+
+    if not args.sources:
+        parser.error("no sources given")
+
+    first = args.sources[0]
+    is_stream = len(args.sources) == 1 and (first.isdigit() or "://" in first or
+                                            os.path.splitext(first)[1].lower() in (".mp4", ".avi", ".mkv", ".mjpg", ".mjpeg"))
+    source = iter_video_frames(first) if is_stream else iter_image_files(args.sources)
+
+    pipeline = DewarpPipeline(K, D, threads=args.threads, queue_size=args.queue_size,
+                              quality=args.quality, cache_dir=cache_dir)
+    try:
+        total = pipeline.run(source, directory_sink(args.output_dir))
+    except KeyboardInterrupt:
+        print("Interrupted by user - exiting")
+        return
+    print(f"Dewarped {total} frames to {args.output_dir} ({pipeline.fps.average_fps:.1f} fps average)")
+
+
+if __name__ == "__main__":
+    main()
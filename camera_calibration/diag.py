@@ -1,32 +1,71 @@
+import argparse
+import json
+import os
 import usb.core
 import usb.util
 import sys
 import time
-import struct
 import platform
+from concurrent.futures import ThreadPoolExecutor
 
-def detailed_usb_device_info(device):
+from uvc import (INFO_GET, REQUEST_NAMES, REQUEST_TYPE_GET, REQUEST_TYPE_SET, UVC_GET_CUR,
+                 UVC_GET_INFO, UVC_GET_LEN, UVC_SET_CUR, VIDEO_CLASS, VIDEO_CONTROL_SUBCLASS,
+                 UvcEntity, control_size, decode_value, describe_info, encode_value,
+                 entity_controls, parse_video_control_descriptors)
+
+# Per-request timeout; advertised controls answer quickly, so a stall here
+# means the control is broken rather than slow
+TRANSFER_TIMEOUT = 500  # ms
+
+# Bump when the cached capability layout changes
+CACHE_VERSION = 1
+
+# Control fields that are fixed for a camera model and firmware; everything
+# else (the current value) is read from the device on every run. Errors are
+# left out: a failed transfer may be transient and must not stick to the model
+STATIC_FIELDS = ("entity", "unit_id", "selector", "info", "size",
+                 "min", "max", "resolution", "default")
+
+
+class PyUsbBackend:
+    """USB access through pyusb.
+
+    diag.py reaches devices only through a backend (enumeration and string
+    descriptors) and the device objects it returns (configurations,
+    interfaces, ctrl_transfer), so a simulated backend can stand in for
+    real cameras.
+    """
+
+    def find_all(self):
+        return list(usb.core.find(find_all=True))
+
+    def get_string(self, device, index):
+        return usb.util.get_string(device, index)
+
+
+def detailed_usb_device_info(device, backend):
     """Get detailed information about a USB device"""
     info = {}
     
     try:
         info["vendor_id"] = hex(device.idVendor)
         info["product_id"] = hex(device.idProduct)
+        info["bcd_device"] = f"{device.bcdDevice:04x}"
         info["bus"] = device.bus
         info["address"] = device.address
         
         try:
-            info["manufacturer"] = usb.util.get_string(device, device.iManufacturer)
+            info["manufacturer"] = backend.get_string(device, device.iManufacturer)
         except:
             info["manufacturer"] = "Unknown"
             
         try:
-            info["product"] = usb.util.get_string(device, device.iProduct)
+            info["product"] = backend.get_string(device, device.iProduct)
         except:
             info["product"] = "Unknown"
             
         try:
-            info["serial"] = usb.util.get_string(device, device.iSerialNumber)
+            info["serial"] = backend.get_string(device, device.iSerialNumber)
         except:
             info["serial"] = "Unknown"
     except:
@@ -34,19 +73,15 @@ def detailed_usb_device_info(device):
         
     return info
 
-def find_all_usb_devices():
-    """Find and list all USB devices"""
-    devices = list(usb.core.find(find_all=True))
-    print(f"Found {len(devices)} USB devices in total")
-    return devices
+def find_all_usb_devices(backend):
+    """Find all USB devices"""
+    return backend.find_all()
 
-def find_uvc_cameras(devices):
+def find_uvc_cameras(devices, backend):
     """Find UVC camera devices from all USB devices"""
     uvc_devices = []
     
     for device in devices:
-        info = detailed_usb_device_info(device)
-        
         # Check each configuration and interface to find video class devices
         is_uvc = False
         has_video_control = False
@@ -55,7 +90,7 @@ def find_uvc_cameras(devices):
         try:
             for cfg in device:
                 for intf in cfg:
-                    if intf.bInterfaceClass == 14:  # Video class
+                    if intf.bInterfaceClass == VIDEO_CLASS:
                         is_uvc = True
                         if intf.bInterfaceSubClass == 1:  # Video Control
                             has_video_control = True
@@ -65,298 +100,361 @@ def find_uvc_cameras(devices):
             pass
             
         if is_uvc:
+            info = detailed_usb_device_info(device, backend)
             info["is_uvc"] = True
             info["has_video_control"] = has_video_control
             info["has_video_streaming"] = has_video_streaming
             info["device"] = device
             uvc_devices.append(info)
     
-    print(f"Found {len(uvc_devices)} UVC camera devices")
     return uvc_devices
 
-def analyze_uvc_controls(device_info):
-    """Analyze UVC control capabilities for a device"""
-    device = device_info["device"]
-    
-    print(f"\nAnalyzing UVC controls for {device_info['product']} ({device_info['vendor_id']}:{device_info['product_id']})")
-    
-    # Constants for UVC control
-    UVC_GET_CUR = 0x81
-    UVC_GET_MIN = 0x82
-    UVC_GET_MAX = 0x83
-    UVC_GET_RES = 0x84
-    UVC_GET_DEF = 0x87
-    
-    # UVC control selectors (common ones)
-    controls = {
-        "brightness": 0x02,
-        "contrast": 0x03,
-        "hue": 0x06,
-        "saturation": 0x07,
-        "sharpness": 0x08,
-        "gamma": 0x09,
-        "white_balance": 0x0A,
-        "exposure_time": 0x0B,
-        "focus": 0x0C,
-        "zoom": 0x0D
+class UvcControlChannel:
+    """Class-specific control requests to one Video Control interface.
+
+    Every request addresses an entity (terminal or unit) of the interface:
+    wIndex carries the entity ID in the high byte and the interface number
+    in the low byte. Transfers are counted so a probe can report its cost.
+    """
+
+    def __init__(self, device, interface, timeout=TRANSFER_TIMEOUT):
+        self.device = device
+        self.interface = interface
+        self.timeout = timeout
+        self.transfers = 0
+
+    def _index(self, unit_id):
+        return (unit_id << 8) | self.interface
+
+    def get(self, request, unit_id, selector, length):
+        self.transfers += 1
+        data = self.device.ctrl_transfer(REQUEST_TYPE_GET, request, selector << 8,
+                                         self._index(unit_id), length, self.timeout)
+        if len(data) != length:
+            raise usb.core.USBError(f"short reply ({len(data)} of {length} bytes)")
+        return bytes(data)
+
+    def set(self, unit_id, selector, data):
+        self.transfers += 1
+        self.device.ctrl_transfer(REQUEST_TYPE_SET, UVC_SET_CUR, selector << 8,
+                                  self._index(unit_id), data, self.timeout)
+
+
+def probe_control(channel, entity, control):
+    """Read a control with only the requests it supports.
+
+    GET_INFO says whether the control can be read at all; the value size
+    comes from the spec, or from GET_LEN for vendor extension controls.
+    A control that cannot be read costs a single transfer.
+    """
+    result = {"entity": entity.kind, "unit_id": entity.unit_id, "selector": control.selector}
+
+    try:
+        info = channel.get(UVC_GET_INFO, entity.unit_id, control.selector, 1)[0]
+    except usb.core.USBError as e:
+        result["error"] = f"GET_INFO failed: {e}"
+        return result
+    result["info"] = describe_info(info)
+    if not info & INFO_GET:
+        return result
+
+    size = control_size(control)
+    if size is None:
+        try:
+            size = int.from_bytes(channel.get(UVC_GET_LEN, entity.unit_id, control.selector, 2), "little")
+        except usb.core.USBError as e:
+            result["error"] = f"GET_LEN failed: {e}"
+            return result
+    result["size"] = size
+
+    for request in (UVC_GET_CUR,) + control.requests:
+        try:
+            data = channel.get(request, entity.unit_id, control.selector, size)
+        except usb.core.USBError:
+            continue
+        result[REQUEST_NAMES[request]] = decode_value(control, data)
+    return result
+
+
+def find_video_control_interface(device):
+    """The Video Control interface of a device, or None"""
+    for cfg in device:
+        for intf in cfg:
+            if intf.bInterfaceClass == VIDEO_CLASS and intf.bInterfaceSubClass == VIDEO_CONTROL_SUBCLASS:
+                return intf
+    return None
+
+
+def probe_controls(channel, entities):
+    """Probe every control the entities advertise; returns {name: result}"""
+    results = {}
+    for entity in entities:
+        for control in entity_controls(entity):
+            results[control.name] = probe_control(channel, entity, control)
+    return results
+
+
+def refresh_controls(channel, entities, capabilities):
+    """Current values for controls whose capabilities are already known.
+
+    One GET_CUR per readable control; min/max/resolution/default and the
+    sizes come from the cached capabilities.
+    """
+    controls = {c.name: (entity, c) for entity in entities for c in entity_controls(entity)}
+    results = {}
+    for control_name, cached in capabilities.items():
+        values = dict(cached)
+        results[control_name] = values
+        if control_name not in controls or "get" not in values.get("info", ()) or "size" not in values:
+            continue
+        entity, control = controls[control_name]
+        try:
+            data = channel.get(UVC_GET_CUR, entity.unit_id, control.selector, values["size"])
+        except usb.core.USBError:
+            continue
+        values["current"] = decode_value(control, data)
+    return results
+
+
+def test_control_writes(channel, entities, results):
+    """Step each settable range control by one resolution step, read back and restore.
+
+    Returns {control name: outcome}.
+    """
+    controls = {c.name: (entity, c) for entity in entities for c in entity_controls(entity)}
+    outcomes = {}
+    for control_name, values in results.items():
+        entity, control = controls[control_name]
+        if "set" not in values.get("info", ()) or not isinstance(values.get("current"), int):
+            continue
+        if "min" not in values or "max" not in values:
+            continue
+        try:
+            current = values["current"]
+            step = values.get("resolution") or 1
+            test_value = current + step
+            if test_value > values["max"]:
+                test_value = current - step
+            if test_value < values["min"]:
+                continue
+            
+            channel.set(entity.unit_id, control.selector, encode_value(control, test_value))
+            
+            # Read back to see if it worked
+            data = channel.get(UVC_GET_CUR, entity.unit_id, control.selector, values["size"])
+            value = decode_value(control, data)
+            
+            if value == test_value:
+                outcomes[control_name] = f"WRITABLE (Successfully set to {test_value})"
+                # Reset to original value
+                channel.set(entity.unit_id, control.selector, encode_value(control, current))
+            else:
+                outcomes[control_name] = f"NOT APPLIED (Got {value} instead of {test_value})"
+        except Exception as e:
+            outcomes[control_name] = f"ERROR ({str(e)})"
+    return outcomes
+
+
+def capability_cache_path(cache_dir, device_info):
+    """Cache file for a camera model: VID:PID plus firmware revision (bcdDevice)"""
+    key = f"{device_info['vendor_id'][2:]:0>4}_{device_info['product_id'][2:]:0>4}_{device_info['bcd_device']}"
+    return os.path.join(cache_dir, f"uvc_caps_{key}.json")
+
+
+def load_capabilities(path):
+    """Cached (interface, entities, controls) or None if missing or stale"""
+    try:
+        with open(path) as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if data.get("version") != CACHE_VERSION:
+        return None
+    entities = [UvcEntity(**entity) for entity in data["entities"]]
+    return data["interface"], entities, data["controls"]
+
+
+def save_capabilities(path, interface, entities, results):
+    """Store the static part of a probe; written atomically so parallel
+    probes of the same model never leave a half-written file behind"""
+    data = {
+        "version": CACHE_VERSION,
+        "interface": interface,
+        "entities": [entity._asdict() for entity in entities],
+        "controls": {name: {k: v for k, v in values.items() if k in STATIC_FIELDS}
+                     for name, values in results.items()},
     }
+    tmp = f"{path}.{os.getpid()}.{id(data)}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp, path)
+
+
+def probe_device(device_info, cache_dir=None, write_test=False):
+    """Probe one camera; returns a JSON-serialisable report.
+
+    With a cache_dir, a camera model and firmware seen before only has its
+    current values read; otherwise every advertised control is probed and
+    the capabilities are cached for the next run.
+    """
+    device = device_info["device"]
+    report = {k: v for k, v in device_info.items() if k != "device"}
+    report["log"] = []
+    log = report["log"].append
+    start = time.perf_counter()
     
     try:
         # Try to detach kernel driver if it's active
         for cfg in device:
             for intf in cfg:
-                if intf.bInterfaceClass == 14:  # Video class
+                if intf.bInterfaceClass == VIDEO_CLASS:
                     if device.is_kernel_driver_active(intf.bInterfaceNumber):
                         try:
-                            print(f"Detaching kernel driver from interface {intf.bInterfaceNumber}")
+                            log(f"Detaching kernel driver from interface {intf.bInterfaceNumber}")
                             device.detach_kernel_driver(intf.bInterfaceNumber)
                         except:
-                            print(f"Failed to detach kernel driver from interface {intf.bInterfaceNumber}")
+                            log(f"Failed to detach kernel driver from interface {intf.bInterfaceNumber}")
                 
         # Try to set configuration
         try:
             device.set_configuration()
         except:
-            print("Could not set configuration (may already be configured)")
-        
-        # Find the video control interface
-        control_interface = None
-        
-        for cfg in device:
-            for intf in cfg:
-                if intf.bInterfaceClass == 14 and intf.bInterfaceSubClass == 1:  # Video Control
-                    control_interface = intf
-                    break
-            if control_interface:
-                break
+            log("Could not set configuration (may already be configured)")
         
-        if not control_interface:
-            print("No video control interface found")
-            return
+        cache_path = capability_cache_path(cache_dir, device_info) if cache_dir else None
+        cached = load_capabilities(cache_path) if cache_path else None
         
-        print(f"Found video control interface: {control_interface.bInterfaceNumber}")
-        
-        # Try all the control selectors
-        results = {}
-        
-        for control_name, selector in controls.items():
-            results[control_name] = {}
+        if cached:
+            interface, entities, capabilities = cached
+            channel = UvcControlChannel(device, interface)
+            results = refresh_controls(channel, entities, capabilities)
+            report["cache"] = "hit"
+        else:
+            # Find the video control interface
+            control_interface = find_video_control_interface(device)
+            if not control_interface:
+                report["error"] = "No video control interface found"
+                return report
+            interface = control_interface.bInterfaceNumber
             
-            # Try to get current value
-            try:
-                # Standard Request Format for UVC
-                bmRequestType = 0xA1  # Device to Host, Class, Interface
-                bRequest = UVC_GET_CUR
-                wValue = (selector << 8)
-                wIndex = (control_interface.bInterfaceNumber << 8)
-                
-                # Try with different data lengths
-                for data_length in [1, 2, 4]:
-                    try:
-                        result = device.ctrl_transfer(bmRequestType, bRequest, wValue, wIndex, data_length)
-                        if result:
-                            value = 0
-                            if data_length == 1:
-                                value = result[0]
-                            elif data_length == 2:
-                                value = result[0] | (result[1] << 8)
-                            elif data_length == 4:
-                                value = result[0] | (result[1] << 8) | (result[2] << 16) | (result[3] << 24)
-                            
-                            results[control_name]["current"] = value
-                            results[control_name]["data_length"] = data_length
-                            break
-                    except:
-                        pass
-                
-                # If we found current value, try to get min/max
-                if "current" in results[control_name]:
-                    data_length = results[control_name]["data_length"]
-                    
-                    # Get min
-                    try:
-                        result = device.ctrl_transfer(bmRequestType, UVC_GET_MIN, wValue, wIndex, data_length)
-                        if result:
-                            value = 0
-                            if data_length == 1:
-                                value = result[0]
-                            elif data_length == 2:
-                                value = result[0] | (result[1] << 8)
-                            elif data_length == 4:
-                                value = result[0] | (result[1] << 8) | (result[2] << 16) | (result[3] << 24)
-                            results[control_name]["min"] = value
-                    except:
-                        pass
-                    
-                    # Get max
-                    try:
-                        result = device.ctrl_transfer(bmRequestType, UVC_GET_MAX, wValue, wIndex, data_length)
-                        if result:
-                            value = 0
-                            if data_length == 1:
-                                value = result[0]
-                            elif data_length == 2:
-                                value = result[0] | (result[1] << 8)
-                            elif data_length == 4:
-                                value = result[0] | (result[1] << 8) | (result[2] << 16) | (result[3] << 24)
-                            results[control_name]["max"] = value
-                    except:
-                        pass
-                    
-                    # Get resolution
-                    try:
-                        result = device.ctrl_transfer(bmRequestType, UVC_GET_RES, wValue, wIndex, data_length)
-                        if result:
-                            value = 0
-                            if data_length == 1:
-                                value = result[0]
-                            elif data_length == 2:
-                                value = result[0] | (result[1] << 8)
-                            elif data_length == 4:
-                                value = result[0] | (result[1] << 8) | (result[2] << 16) | (result[3] << 24)
-                            results[control_name]["resolution"] = value
-                    except:
-                        pass
-                    
-                    # Get default
-                    try:
-                        result = device.ctrl_transfer(bmRequestType, UVC_GET_DEF, wValue, wIndex, data_length)
-                        if result:
-                            value = 0
-                            if data_length == 1:
-                                value = result[0]
-                            elif data_length == 2:
-                                value = result[0] | (result[1] << 8)
-                            elif data_length == 4:
-                                value = result[0] | (result[1] << 8) | (result[2] << 16) | (result[3] << 24)
-                            results[control_name]["default"] = value
-                    except:
-                        pass
-            except Exception as e:
-                pass
-        
-        # Display results
-        print("\nCamera Controls:")
-        print("----------------")
-        
-        found_controls = False
+            # The class-specific descriptors list the terminals and units and
+            # the controls each of them implements
+            entities = parse_video_control_descriptors(control_interface.extra_descriptors)
+            channel = UvcControlChannel(device, interface)
+            results = probe_controls(channel, entities)
+            report["cache"] = "miss" if cache_path else "disabled"
+            # A control that failed is probed again next run rather than cached
+            if cache_path and any("error" in values for values in results.values()):
+                report["cache"] = "miss, not saved"
+            elif cache_path:
+                save_capabilities(cache_path, interface, entities, results)
         
-        for control_name, values in results.items():
-            if "current" in values:
-                found_controls = True
-                print(f"\n{control_name.upper()}:")
-                for key, value in values.items():
-                    if key != "data_length":
-                        print(f"  {key}: {value}")
+        report["interface"] = interface
+        report["entities"] = [entity._asdict() for entity in entities]
+        report["controls"] = results
         
-        if not found_controls:
-            print("No accessible controls found.")
-            print("This could be due to:")
-            print("1. macOS restrictions on USB device access")
-            print("2. Camera not supporting standard UVC controls")
-            print("3. Need for higher privileges (try running with sudo)")
-        
-        # Test if we can set a control value
-        print("\nTesting control write capability:")
-        for control_name, values in results.items():
-            if "current" in values and "min" in values and "max" in values:
-                try:
-                    # Choose a test value
-                    current = values["current"]
-                    test_value = current + 1
-                    if test_value > values["max"]:
-                        test_value = values["min"]
-                    
-                    selector = controls[control_name]
-                    bmRequestType = 0x21  # Host to Device, Class, Interface
-                    bRequest = 0x01  # SET_CUR
-                    wValue = (selector << 8)
-                    wIndex = (control_interface.bInterfaceNumber << 8)
-                    
-                    data_length = values["data_length"]
-                    data = []
-                    
-                    if data_length == 1:
-                        data = [test_value & 0xFF]
-                    elif data_length == 2:
-                        data = [test_value & 0xFF, (test_value >> 8) & 0xFF]
-                    elif data_length == 4:
-                        data = [test_value & 0xFF, 
-                               (test_value >> 8) & 0xFF, 
-                               (test_value >> 16) & 0xFF, 
-                               (test_value >> 24) & 0xFF]
-                    
-                    result = device.ctrl_transfer(bmRequestType, bRequest, wValue, wIndex, data)
-                    
-                    # Read back to see if it worked
-                    bmRequestType = 0xA1  # Device to Host, Class, Interface
-                    bRequest = UVC_GET_CUR
-                    result = device.ctrl_transfer(bmRequestType, bRequest, wValue, wIndex, data_length)
-                    
-                    value = 0
-                    if data_length == 1:
-                        value = result[0]
-                    elif data_length == 2:
-                        value = result[0] | (result[1] << 8)
-                    elif data_length == 4:
-                        value = result[0] | (result[1] << 8) | (result[2] << 16) | (result[3] << 24)
-                    
-                    if value == test_value:
-                        print(f"{control_name}: WRITABLE (Successfully set to {test_value})")
-                    else:
-                        print(f"{control_name}: READ-ONLY (Got {value} instead of {test_value})")
-                    
-                    # Reset to original value
-                    if value == test_value:
-                        if data_length == 1:
-                            data = [current & 0xFF]
-                        elif data_length == 2:
-                            data = [current & 0xFF, (current >> 8) & 0xFF]
-                        elif data_length == 4:
-                            data = [current & 0xFF, 
-                                   (current >> 8) & 0xFF, 
-                                   (current >> 16) & 0xFF, 
-                                   (current >> 24) & 0xFF]
-                        
-                        bmRequestType = 0x21  # Host to Device, Class, Interface
-                        device.ctrl_transfer(bmRequestType, 0x01, wValue, wIndex, data)
-                except Exception as e:
-                    print(f"{control_name}: ERROR ({str(e)})")
+        if write_test:
+            report["write_test"] = test_control_writes(channel, entities, results)
         
+        report["transfers"] = channel.transfers
     except Exception as e:
-        print(f"Error analyzing UVC controls: {e}")
+        report["error"] = f"Error analyzing UVC controls: {e}"
+    finally:
+        report["elapsed_s"] = round(time.perf_counter() - start, 4)
+    
+    return report
+
+
+def probe_devices(cameras, cache_dir=None, write_test=False, workers=None):
+    """Probe cameras concurrently, one worker per device; reports in input order"""
+    if not cameras:
+        return []
+    with ThreadPoolExecutor(max_workers=workers or len(cameras)) as pool:
+        return list(pool.map(lambda camera: probe_device(camera, cache_dir, write_test), cameras))
+
+
+def print_device_report(report):
+    """Human-readable version of a probe_device report"""
+    print(f"\nAnalyzing UVC controls for {report['product']} ({report['vendor_id']}:{report['product_id']}, "
+          f"bcdDevice {report.get('bcd_device', '?')}, bus {report.get('bus')} address {report.get('address')})")
+    for line in report["log"]:
+        print(line)
+    
+    if "error" in report:
+        print(report["error"])
+        return
+    
+    print(f"Found video control interface: {report['interface']}")
+    for entity in report["entities"]:
+        line = f"  {entity['kind']} {entity['unit_id']}: bmControls 0x{entity['bm_controls']:x}"
+        if entity["guid"]:
+            line += f" ({entity['guid']})"
+        print(line)
+    
+    # Display results
+    print("\nCamera Controls:")
+    print("----------------")
+    
+    found_controls = False
+    
+    for control_name, values in report["controls"].items():
+        if "current" in values:
+            found_controls = True
+        print(f"\n{control_name.upper()} ({values['entity']} {values['unit_id']}, selector 0x{values['selector']:02x}):")
+        for key, value in values.items():
+            if key not in ("entity", "unit_id", "selector"):
+                print(f"  {key}: {value}")
+    
+    print(f"\n{len(report['controls'])} advertised controls read with {report['transfers']} transfers "
+          f"in {report['elapsed_s']:.2f}s (capability cache: {report['cache']})")
+    
+    if not found_controls:
+        print("No accessible controls found.")
+        print("This could be due to:")
+        print("1. macOS restrictions on USB device access")
+        print("2. Camera not supporting standard UVC controls")
+        print("3. Need for higher privileges (try running with sudo)")
+    
+    if "write_test" in report:
+        print("\nTesting control write capability:")
+        for control_name, outcome in report["write_test"].items():
+            print(f"{control_name}: {outcome}")
     
     # Provide usage information
+    camera_terminal = next((e for e in report["entities"] if e["kind"] == "camera_terminal"), None)
+    terminal_id = camera_terminal["unit_id"] if camera_terminal else 1
+    interface_num = report["interface"]
+    
     print("\nUsage Instructions:")
     print("-----------------")
     print("To control this camera in your application, you'll need:")
-    print(f"1. Vendor ID: {device_info['vendor_id']}")
-    print(f"2. Product ID: {device_info['product_id']}")
+    print(f"1. Vendor ID: {report['vendor_id']}")
+    print(f"2. Product ID: {report['product_id']}")
     print("3. For each control you want to set:")
-    print("   - Control selector (from the list above)")
-    print("   - Data length (1, 2, or 4 bytes)")
+    print("   - Unit ID and control selector (from the list above)")
+    print("   - Data size (from the list above)")
     print("   - Min/Max values to stay within valid range")
     
     print("\nSample code to set exposure:")
     print("```python")
     print("import usb.core")
     print("import usb.util")
-    print(f"dev = usb.core.find(idVendor=int({device_info['vendor_id']}, 16), idProduct=int({device_info['product_id']}, 16))")
+    print(f"dev = usb.core.find(idVendor=int({report['vendor_id']}, 16), idProduct=int({report['product_id']}, 16))")
     print("if dev is None:")
     print("    print('Device not found')")
     print("    exit()")
     print("# Set configuration")
     print("dev.set_configuration()")
-    print("# Parameters for exposure control")
+    print("# Parameters for exposure control (camera terminal)")
     print("bmRequestType = 0x21  # Host to Device, Class, Interface")
     print("bRequest = 0x01       # SET_CUR")
-    print("control_selector = 0x0B  # Exposure time")
-    print("interface_num = 0     # Typically the video control interface")
+    print("control_selector = 0x04  # CT_EXPOSURE_TIME_ABSOLUTE_CONTROL, in 100us units")
+    print(f"terminal_id = {terminal_id}       # Camera terminal unit ID")
+    print(f"interface_num = {interface_num}     # Video control interface")
     print("wValue = (control_selector << 8)")
-    print("wIndex = (interface_num << 8)")
-    print("data_length = 4       # Usually 4 bytes for exposure")
+    print("wIndex = (terminal_id << 8) | interface_num")
     print("exposure_value = 500  # Adjust as needed")
-    print("data = [exposure_value & 0xFF, (exposure_value >> 8) & 0xFF, (exposure_value >> 16) & 0xFF, (exposure_value >> 24) & 0xFF]")
+    print("data = exposure_value.to_bytes(4, 'little')")
     print("try:")
     print("    result = dev.ctrl_transfer(bmRequestType, bRequest, wValue, wIndex, data)")
     print("    print(f'Set exposure result: {result}')")
@@ -364,63 +462,107 @@ def analyze_uvc_controls(device_info):
     print("    print(f'Error setting exposure: {e}')")
     print("```")
 
+
+def analyze_uvc_controls(device_info, write_test=False, cache_dir=None):
+    """Analyze UVC control capabilities for a device.
+
+    The controls to probe come from the Video Control interface's
+    descriptors: the camera terminal (exposure, focus, zoom, ...) and the
+    processing unit (brightness, gain, white balance, ...) each list their
+    controls in bmControls and are addressed by their own unit ID.
+    """
+    report = probe_device(device_info, cache_dir, write_test)
+    print_device_report(report)
+    return report.get("controls")
+
 def main():
-    print(f"USB Camera Diagnostic Tool for macOS ({platform.platform()})")
-    print("-------------------------------------------------------")
+    parser = argparse.ArgumentParser(description="UVC camera diagnostic tool")
+    parser.add_argument("--write-test", action="store_true",
+                        help="step each settable control once and restore it")
+    parser.add_argument("--json", metavar="FILE",
+                        help="write the device reports as JSON to FILE ('-' for stdout)")
+    parser.add_argument("--cache-dir", default=".",
+                        help="directory of the per-model capability cache (default: .)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="probe every control, ignoring and not writing the capability cache")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="cameras probed in parallel (default: one worker per camera)")
+    parser.add_argument("--simulate", type=int, metavar="N",
+                        help="probe N simulated cameras instead of real USB devices")
+    args = parser.parse_args()
+    
+    # With JSON on stdout, progress goes to stderr so the output stays parseable
+    quiet = args.json == "-"
+    out = sys.stderr if quiet else sys.stdout
+    
+    if args.simulate:
+        from uvc_sim import SimulatedBackend
+        backend = SimulatedBackend.bench(args.simulate)
+    else:
+        backend = PyUsbBackend()
+    
+    print(f"USB Camera Diagnostic Tool ({platform.platform()})", file=out)
+    print("-------------------------------------------------------", file=out)
     
     # Check if running with elevated privileges
-    elevated = False
+    elevated = bool(args.simulate)
     try:
         # This would typically fail without elevated privileges
-        test_dev = usb.core.find(idVendor=0x046d)  # Logitech Vendor ID
+        test_dev = None if elevated else usb.core.find(idVendor=0x046d)  # Logitech Vendor ID
         if test_dev:
             elevated = True
     except:
         pass
     
     if not elevated and platform.system() == 'Darwin':
-        print("\nWARNING: This script may need to be run with sudo on macOS")
-        print("Some USB operations require elevated privileges")
-        print("If you don't see your camera's controls, try: sudo python usb_camera_diag.py\n")
+        print("\nWARNING: This script may need to be run with sudo on macOS", file=out)
+        print("Some USB operations require elevated privileges", file=out)
+        print("If you don't see your camera's controls, try: sudo python diag.py\n", file=out)
     
     # Find all USB devices
-    all_devices = find_all_usb_devices()
-    
-    # Print basic info about all devices
-    print("\nAll USB Devices:")
-    print("--------------")
-    for i, device in enumerate(all_devices):
-        try:
-            info = detailed_usb_device_info(device)
-            print(f"Device {i+1}: {info.get('product', 'Unknown')} - {info.get('vendor_id', '?')}:{info.get('product_id', '?')}")
-        except:
-            print(f"Device {i+1}: [Error retrieving info]")
+    all_devices = find_all_usb_devices(backend)
+    print(f"Found {len(all_devices)} USB devices in total", file=out)
     
     # Find UVC cameras
-    uvc_cameras = find_uvc_cameras(all_devices)
+    uvc_cameras = find_uvc_cameras(all_devices, backend)
+    print(f"Found {len(uvc_cameras)} UVC camera devices", file=out)
     
     if not uvc_cameras:
-        print("\nNo UVC cameras found. Make sure your camera is connected.")
-        print("Common issues:")
-        print("1. Camera is not a standard UVC device")
-        print("2. Need elevated privileges (sudo)")
-        print("3. Camera is in use by another application")
+        print("\nNo UVC cameras found. Make sure your camera is connected.", file=out)
+        print("Common issues:", file=out)
+        print("1. Camera is not a standard UVC device", file=out)
+        print("2. Need elevated privileges (sudo)", file=out)
+        print("3. Camera is in use by another application", file=out)
         return
     
     # Print UVC camera details
-    print("\nUVC Cameras:")
-    print("-----------")
+    print("\nUVC Cameras:", file=out)
+    print("-----------", file=out)
     for i, camera in enumerate(uvc_cameras):
-        print(f"Camera {i+1}: {camera['product']} - {camera['vendor_id']}:{camera['product_id']}")
-        print(f"  Manufacturer: {camera['manufacturer']}")
-        print(f"  Has video control: {camera['has_video_control']}")
-        print(f"  Has video streaming: {camera['has_video_streaming']}")
+        print(f"Camera {i+1}: {camera['product']} - {camera['vendor_id']}:{camera['product_id']} "
+              f"(bcdDevice {camera.get('bcd_device', '?')}, serial {camera['serial']})", file=out)
+        print(f"  Manufacturer: {camera['manufacturer']}", file=out)
+        print(f"  Has video control: {camera['has_video_control']}", file=out)
+        print(f"  Has video streaming: {camera['has_video_streaming']}", file=out)
+    
+    # Probe every camera at once; the model cache makes repeat runs cheap
+    cache_dir = None if args.no_cache else args.cache_dir
+    start = time.perf_counter()
+    reports = probe_devices(uvc_cameras, cache_dir, args.write_test, args.workers)
+    elapsed = time.perf_counter() - start
     
-    # For each UVC camera, analyze controls
-    for camera in uvc_cameras:
-        analyze_uvc_controls(camera)
+    if quiet:
+        json.dump({"elapsed_s": round(elapsed, 4), "devices": reports}, sys.stdout, indent=2)
+        print()
+    else:
+        for report in reports:
+            print_device_report(report)
+        if args.json:
+            with open(args.json, "w") as f:
+                json.dump({"elapsed_s": round(elapsed, 4), "devices": reports}, f, indent=2)
+            print(f"\nReports written to {args.json}")
     
-    print("\nDiagnostic complete. See above for detailed camera information.")
+    print(f"\nProbed {len(reports)} cameras in {elapsed:.2f}s. Diagnostic complete.", file=out)
 
 if __name__ == "__main__":
     try:
@@ -430,4 +572,4 @@ if __name__ == "__main__":
         print("\nNote: Access to USB devices on macOS may require:")
         print("1. Running with sudo privileges")
         print("2. Installing libusb: brew install libusb")
-        print("3. Installing PyUSB: pip install pyusb")
\ No newline at end of file
+        print("3. Installing PyUSB: pip install pyusb")
@@ -0,0 +1,265 @@
+import re
+import threading
+import time
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+# Flags for fisheye calibration
+FISHEYE_FLAGS = cv2.fisheye.CALIB_RECOMPUTE_EXTRINSIC + \
+                cv2.fisheye.CALIB_CHECK_COND + \
+                cv2.fisheye.CALIB_FIX_SKEW
+
+# Fewest views the fisheye solve is attempted with
+MIN_VIEWS = 5
+
+# Views with a larger RMS reprojection error (pixels) are pruned
+DEFAULT_MAX_VIEW_ERROR = 1.0
+
+CalibrationResult = namedtuple(
+    "CalibrationResult",
+    "rms K D rvecs tvecs used view_errors views img_shape duration warm_start")
+
+
+def fisheye_calibrate(objpoints, imgpoints, img_shape, K=None, D=None, flags=FISHEYE_FLAGS):
+    """Run cv2.fisheye.calibrate, dropping views that fail CALIB_CHECK_COND.
+
+    Starting from a zeroed K the fisheye solver regularly diverges on wide
+    frames, so without a K to start from the intrinsics are seeded from the
+    planar homographies (cv2.initCameraMatrix2D).
+
+    OpenCV aborts the whole solve when a single view is ill-conditioned and
+    names that view in the error message, so drop it and solve again.
+    Returns (rms, K, D, rvecs, tvecs, used, dropped) where used lists the
+    indices of the views that made it into the solve and dropped those of
+    the ill-conditioned views, both into the given lists.
+    """
+    if K is None:
+        K = cv2.initCameraMatrix2D([o.reshape(-1, 3) for o in objpoints],
+                                   [i.reshape(-1, 2) for i in imgpoints],
+                                   img_shape)
+    flags |= cv2.fisheye.CALIB_USE_INTRINSIC_GUESS
+
+    used = list(range(len(objpoints)))
+    dropped = []
+    while True:
+        K0 = K.copy()
+        D0 = np.zeros((4, 1)) if D is None else D.copy()
+        try:
+            rms, K_out, D_out, rvecs, tvecs = cv2.fisheye.calibrate(
+                [objpoints[i] for i in used], [imgpoints[i] for i in used],
+                img_shape, K0, D0, flags=flags)
+            return rms, K_out, D_out, rvecs, tvecs, used, dropped
+        except cv2.error as e:
+            match = re.search(r"input array (\d+)", str(e))
+            if not match or len(used) <= MIN_VIEWS:
+                raise
+            dropped.append(used.pop(int(match.group(1))))
+
+
+def rodrigues_batch(rvecs):
+    """Rotation matrices (V, 3, 3) for a stack of rotation vectors (V, 3)"""
+    rvecs = np.asarray(rvecs, dtype=np.float64).reshape(-1, 3)
+    theta = np.linalg.norm(rvecs, axis=1)
+    safe = np.where(theta > 1e-12, theta, 1.0)
+    k = rvecs / safe[:, None]
+
+    # Cross-product matrices of the unit axes
+    kx = np.zeros((len(rvecs), 3, 3))
+    kx[:, 0, 1], kx[:, 0, 2] = -k[:, 2], k[:, 1]
+    kx[:, 1, 0], kx[:, 1, 2] = k[:, 2], -k[:, 0]
+    kx[:, 2, 0], kx[:, 2, 1] = -k[:, 1], k[:, 0]
+
+    sin = np.sin(theta)[:, None, None]
+    cos = np.cos(theta)[:, None, None]
+    return np.eye(3) + sin * kx + (1 - cos) * (kx @ kx)
+
+
+def project_fisheye_batch(objpoints, rvecs, tvecs, K, D):
+    """Project (V, N, 3) object points of all views at once with the fisheye model"""
+    R = rodrigues_batch(rvecs)
+    t = np.asarray(tvecs, dtype=np.float64).reshape(-1, 1, 3)
+    X = np.einsum("vij,vnj->vni", R, objpoints) + t
+
+    a = X[..., 0] / X[..., 2]
+    b = X[..., 1] / X[..., 2]
+    r = np.hypot(a, b)
+    theta = np.arctan(r)
+    theta2 = theta * theta
+    k1, k2, k3, k4 = np.asarray(D, dtype=np.float64).ravel()[:4]
+    theta_d = theta * (1 + theta2 * (k1 + theta2 * (k2 + theta2 * (k3 + theta2 * k4))))
+    scale = np.where(r > 1e-12, theta_d / np.where(r > 1e-12, r, 1.0), 1.0)
+
+    xd = a * scale
+    yd = b * scale
+    u = K[0, 0] * (xd + K[0, 1] / K[0, 0] * yd) + K[0, 2]
+    v = K[1, 1] * yd + K[1, 2]
+    return np.stack((u, v), axis=-1)
+
+
+def per_view_errors(objpoints, imgpoints, rvecs, tvecs, K, D):
+    """RMS reprojection error of every view, computed in one batched pass"""
+    obj = np.asarray(objpoints, dtype=np.float64).reshape(len(objpoints), -1, 3)
+    img = np.asarray(imgpoints, dtype=np.float64).reshape(len(imgpoints), -1, 2)
+    residual = project_fisheye_batch(obj, rvecs, tvecs, K, D) - img
+    return np.sqrt(np.mean(np.sum(residual * residual, axis=-1), axis=-1))
+
+
+def calibrate_with_rejection(objpoints, imgpoints, img_shape, K=None, D=None,
+                             flags=FISHEYE_FLAGS, max_view_error=DEFAULT_MAX_VIEW_ERROR,
+                             max_rounds=5):
+    """Fisheye calibration that iteratively prunes views with a high error.
+
+    After each solve, views whose RMS reprojection error exceeds
+    max_view_error are removed (worst first, never below MIN_VIEWS) and the
+    solve is repeated, warm-started from the current K and D. Returns
+    (rms, K, D, rvecs, tvecs, used, view_errors). view_errors has one entry
+    per input view: the error under the final solution for used views, the
+    error when it was rejected for pruned views, and NaN for views that
+    were dropped as ill-conditioned.
+    """
+    view_errors = np.full(len(objpoints), np.nan)
+    candidates = list(range(len(objpoints)))
+
+    for _ in range(max_rounds):
+        rms, K, D, rvecs, tvecs, used, dropped = fisheye_calibrate(
+            [objpoints[i] for i in candidates], [imgpoints[i] for i in candidates],
+            img_shape, K, D, flags)
+        used = [candidates[i] for i in used]
+        for i in dropped:
+            print(f"  View {candidates[i]} is ill-conditioned - dropped from calibration")
+        errors = per_view_errors([objpoints[i] for i in used], [imgpoints[i] for i in used],
+                                 rvecs, tvecs, K, D)
+        # Candidates left out of this solve were ill-conditioned; an error
+        # from an earlier round would mark them as pruned outliers
+        view_errors[candidates] = np.nan
+        view_errors[used] = errors
+
+        if max_view_error is None:
+            break
+        order = np.argsort(errors)[::-1]
+        outliers = [used[i] for i in order if errors[i] > max_view_error]
+        outliers = outliers[:max(0, len(used) - MIN_VIEWS)]
+        if not outliers:
+            break
+        candidates = [i for i in used if i not in outliers]
+
+    return rms, K, D, rvecs, tvecs, used, view_errors
+
+
+class CalibrationWorker:
+    """Solve the fisheye calibration on a background thread.
+
+    submit() hands over the current views and returns immediately. Requests
+    that arrive while a solve is running are coalesced: only the newest set
+    of views is solved next, so the result tracks the operator's captures
+    without queueing up stale work. Each solve warm-starts from the previous
+    K and D (CALIB_USE_INTRINSIC_GUESS) and falls back to a cold start if
+    the warm solve fails. Views above max_view_error are pruned.
+    """
+
+    def __init__(self, flags=FISHEYE_FLAGS, max_view_error=DEFAULT_MAX_VIEW_ERROR, on_result=None):
+        self.flags = flags
+        self.max_view_error = max_view_error
+        self.on_result = on_result
+
+        self._cond = threading.Condition()
+        self._pending = None
+        self._busy = False
+        self._running = True
+        self._result = None
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name="calibration-worker", daemon=True)
+        self._thread.start()
+
+    def submit(self, objpoints, imgpoints, img_shape):
+        """Queue a solve of these views, replacing any solve not yet started"""
+        if len(objpoints) < MIN_VIEWS:
+            return False
+        with self._cond:
+            self._pending = (list(objpoints), list(imgpoints), tuple(img_shape))
+            self._cond.notify()
+        return True
+
+    @property
+    def busy(self):
+        with self._cond:
+            return self._busy or self._pending is not None
+
+    @property
+    def result(self):
+        """Most recent successful CalibrationResult, or None"""
+        with self._cond:
+            return self._result
+
+    @property
+    def error(self):
+        """Error of the most recent solve, None if it succeeded"""
+        with self._cond:
+            return self._error
+
+    def wait(self, timeout=None):
+        """Block until no solve is running or pending; returns the result"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._busy or self._pending is not None:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            return self._result
+
+    def _solve(self, objpoints, imgpoints, img_shape):
+        previous = self._result
+        warm = previous is not None and previous.img_shape == img_shape
+        solution = None
+        start = time.perf_counter()
+        if warm:
+            try:
+                solution = calibrate_with_rejection(objpoints, imgpoints, img_shape,
+                                                    previous.K, previous.D, self.flags,
+                                                    self.max_view_error)
+            except cv2.error:
+                warm = False
+        if solution is None:
+            solution = calibrate_with_rejection(objpoints, imgpoints, img_shape,
+                                                flags=self.flags, max_view_error=self.max_view_error)
+
+        rms, K, D, rvecs, tvecs, used, view_errors = solution
+        return CalibrationResult(rms, K, D, rvecs, tvecs, used, view_errors, len(objpoints),
+                                 img_shape, time.perf_counter() - start, warm)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._running and self._pending is None:
+                    self._cond.wait()
+                if not self._running:
+                    return
+                objpoints, imgpoints, img_shape = self._pending
+                self._pending = None
+                self._busy = True
+
+            result, error = None, None
+            try:
+                result = self._solve(objpoints, imgpoints, img_shape)
+            except Exception as e:
+                error = e
+
+            with self._cond:
+                if result is not None:
+                    self._result = result
+                self._error = error
+                self._busy = False
+                self._cond.notify_all()
+
+            if result is not None and self.on_result is not None:
+                self.on_result(result)
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._pending = None
+            self._cond.notify_all()
+        self._thread.join(timeout=5.0)
@@ -0,0 +1,79 @@
+import threading
+import time
+
+import cv2
+
+from profiling import FpsMeter
+
+
+class LatestFrameGrabber:
+    """Read frames from a cv2.VideoCapture on a background thread.
+
+    Only the newest frame is kept (a single slot that every read replaces),
+    so a slow consumer skips stale frames instead of working through the
+    camera's backlog. VideoCapture.read() returns a new array every time,
+    which lets the slot be swapped without copying.
+    """
+
+    def __init__(self, cap):
+        self.cap = cap
+        self.capture_fps = FpsMeter()
+
+        self._cond = threading.Condition()
+        self._frame = None
+        self._seq = 0
+        self._running = False
+        self._failed = False
+        self._thread = None
+
+        # Ask the driver not to queue frames on our behalf either; backends
+        # that do not support it just ignore the property
+        self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="frame-grabber", daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while self._running:
+            ret, frame = self.cap.read()
+            with self._cond:
+                if not ret:
+                    self._failed = True
+                    self._running = False
+                else:
+                    self._frame = frame
+                    self._seq += 1
+                    self.capture_fps.tick()
+                self._cond.notify_all()
+
+    def read(self, last_seq=0, timeout=2.0):
+        """Wait for a frame newer than last_seq.
+
+        Returns (ok, frame, seq). ok is False once the camera stopped
+        delivering frames or no new frame arrived within timeout.
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._seq <= last_seq and not self._failed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False, None, self._seq
+                self._cond.wait(remaining)
+            if self._seq <= last_seq:
+                return False, None, self._seq
+            return True, self._frame, self._seq
+
+    @property
+    def failed(self):
+        """True once the capture stopped delivering frames for good"""
+        with self._cond:
+            return self._failed
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+            self._thread = None
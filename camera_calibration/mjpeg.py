@@ -0,0 +1,308 @@
+import argparse
+import base64
+import http.client
+import threading
+import time
+from urllib.parse import urlparse
+
+import cv2
+import numpy as np
+
+READ_SIZE = 64 * 1024
+INITIAL_BUFFER = 512 * 1024  # grown on demand to fit the largest part
+
+
+def is_stream_url(source):
+    return str(source).startswith(("http://", "https://"))
+
+
+def multipart_boundary(content_type):
+    """Boundary of a multipart Content-Type header, without any leading '--'"""
+    for param in content_type.split(";")[1:]:
+        key, _, value = param.strip().partition("=")
+        if key.lower() == "boundary":
+            return value.strip().strip('"').lstrip("-").encode()
+    raise ValueError(f"no boundary in Content-Type '{content_type}'")
+
+
+class MultipartParser:
+    """Incremental parser of a multipart/x-mixed-replace JPEG stream.
+
+    Network reads go straight into one bytearray through writable(); after
+    commit() every part completed since the last call is parsed in place
+    and only the newest one is returned, as a memoryview valid until the
+    next writable(). Parts use their Content-Length when the server sends
+    one (mjpg-streamer does) and are cut at the next boundary otherwise.
+    The buffer is compacted rather than reallocated and only grows when a
+    single part does not fit.
+    """
+
+    def __init__(self, boundary, size=INITIAL_BUFFER):
+        self.boundary = b"--" + boundary  # delimiter line as it appears in the stream
+        self._buf = bytearray(size)
+        self._view = memoryview(self._buf)
+        self._start = 0  # first unparsed byte
+        self._end = 0  # end of received data
+        self._body = None  # (offset, length or None) of the part being received
+        self.parts = 0
+        self.skipped = 0  # complete parts dropped in favour of a newer one
+
+    def writable(self, size=READ_SIZE):
+        """Free space at the end of the buffer for the next read"""
+        if self._start:
+            remain = self._end - self._start
+            self._view[:remain] = self._view[self._start:self._end]
+            if self._body is not None:
+                self._body = (self._body[0] - self._start, self._body[1])
+            self._start, self._end = 0, remain
+        if len(self._buf) - self._end < size:
+            self._view.release()
+            self._buf.extend(bytes(max(size, len(self._buf))))
+            self._view = memoryview(self._buf)
+        return self._view[self._end:]
+
+    def commit(self, n):
+        """Account for n bytes read into writable(); returns the newest
+        complete JPEG as a memoryview, or None"""
+        self._end += n
+        newest = None
+        while True:
+            span = self._next_part()
+            if span is None:
+                break
+            if newest is not None:
+                self.skipped += 1
+            newest = span
+            self.parts += 1
+        return None if newest is None else self._view[newest[0]:newest[1]]
+
+    def _next_part(self):
+        """(start, end) of the next complete part body, or None"""
+        buf = self._buf
+        if self._body is None:
+            marker = buf.find(self.boundary, self._start, self._end)
+            if marker < 0:
+                # Keep a boundary that may be split across reads
+                self._start = max(self._start, self._end - len(self.boundary))
+                return None
+            headers_end = buf.find(b"\r\n\r\n", marker, self._end)
+            if headers_end < 0:
+                self._start = marker
+                return None
+            length = None
+            for line in bytes(buf[marker:headers_end]).split(b"\r\n")[1:]:
+                name, _, value = line.partition(b":")
+                if name.strip().lower() == b"content-length":
+                    length = int(value)
+            self._body = (headers_end + 4, length)
+            self._start = headers_end + 4
+
+        offset, length = self._body
+        if length is not None:
+            if self._end - offset < length:
+                return None
+            end = offset + length
+            self._start = end
+        else:
+            marker = buf.find(self.boundary, offset, self._end)
+            if marker < 0:
+                return None
+            # The part ends before the CRLF and dashes leading the boundary
+            end = marker
+            while end > offset and buf[end - 1] in b"-\r\n":
+                end -= 1
+            # The JPEG's own EOI marker ends in 0xD9, never in '-' or CRLF
+            self._start = marker
+        self._body = None
+        return offset, end
+
+
+class MjpegCapture:
+    """cv2.VideoCapture-like reader of an HTTP MJPEG stream (mjpg-streamer).
+
+    A reader thread keeps the socket drained through a MultipartParser and
+    copies only the newest complete JPEG into a triple buffer, so the
+    network never waits for decoding. read() decodes just the newest JPEG
+    received since the last call; everything older is dropped unseen,
+    which keeps focus feedback close to real time over a slow link. A
+    dropped connection is reopened until release(); read() waits for it
+    rather than reporting the stream as failed. timeout applies to
+    connecting and to each socket read.
+    """
+
+    def __init__(self, url, timeout=5.0, reconnect_delay=1.0):
+        self.url = url
+        self.timeout = timeout
+        self.reconnect_delay = reconnect_delay
+        parts = urlparse(url)
+        self._https = parts.scheme == "https"
+        self._host = parts.hostname
+        self._port = parts.port
+        self._path = parts.path or "/"
+        if parts.query:
+            self._path += "?" + parts.query
+        self._headers = {}
+        if parts.username is not None:
+            credentials = f"{parts.username}:{parts.password or ''}".encode()
+            self._headers["Authorization"] = "Basic " + base64.b64encode(credentials).decode()
+
+        # Triple buffer: the reader fills back, publishes it as ready and
+        # read() decodes from front; each is (bytearray, used length)
+        self._back = [bytearray(), 0]
+        self._ready = [bytearray(), 0]
+        self._front = [bytearray(), 0]
+        self._fresh = False
+        self._cond = threading.Condition()
+        self._opened = threading.Event()
+        self.error = None
+        self._running = True
+        self._conn = None
+        self.received = 0
+        self.decoded = 0
+        self.dropped = 0
+        self.reconnects = 0
+
+        self._thread = threading.Thread(target=self._run, name="mjpeg-reader", daemon=True)
+        self._thread.start()
+        self._opened.wait(timeout)
+
+    def _connect(self):
+        cls = http.client.HTTPSConnection if self._https else http.client.HTTPConnection
+        conn = cls(self._host, self._port, timeout=self.timeout)
+        conn.request("GET", self._path, headers=self._headers)
+        response = conn.getresponse()
+        if response.status != 200:
+            conn.close()
+            raise ConnectionError(f"HTTP {response.status} {response.reason}")
+        content_type = response.getheader("Content-Type", "")
+        if not content_type.lower().startswith("multipart/"):
+            conn.close()
+            raise ConnectionError(f"not an MJPEG stream (Content-Type '{content_type}')")
+        return conn, response, multipart_boundary(content_type)
+
+    def _publish(self, jpeg):
+        buf, _ = self._back
+        if len(buf) < len(jpeg):
+            buf.extend(bytes(len(jpeg) - len(buf)))
+        buf[:len(jpeg)] = jpeg
+        self._back[1] = len(jpeg)
+        # The parser's buffer can only grow once no view of it is left
+        jpeg.release()
+        with self._cond:
+            self._back, self._ready = self._ready, self._back
+            if self._fresh:
+                self.dropped += 1
+            self._fresh = True
+            self.received += 1
+            self._cond.notify_all()
+
+    def _run(self):
+        while self._running:
+            try:
+                self._conn, response, boundary = self._connect()
+            except (OSError, http.client.HTTPException, ValueError) as e:
+                self.error = str(e)
+                self._opened.set()
+                time.sleep(self.reconnect_delay)
+                self.reconnects += 1
+                continue
+            self.error = None
+            self._opened.set()
+            parser = MultipartParser(boundary)
+            # Single reads into the parser's buffer; the chunked fallback
+            # copies once, mjpg-streamer's plain HTTP/1.0 stream does not
+            readinto = response.readinto1 if response.chunked else response.fp.readinto1
+            try:
+                while self._running:
+                    n = readinto(parser.writable())
+                    if not n:
+                        break
+                    jpeg = parser.commit(n)
+                    if jpeg is not None:
+                        self.dropped += parser.skipped
+                        parser.skipped = 0
+                        self._publish(jpeg)
+            except (OSError, http.client.HTTPException, ValueError) as e:
+                self.error = str(e)
+            finally:
+                self._conn.close()
+            if self._running:
+                time.sleep(self.reconnect_delay)
+                self.reconnects += 1
+
+    def isOpened(self):
+        return self._running and self.error is None and self._opened.is_set()
+
+    def set(self, prop, value):
+        return False
+
+    def get(self, prop):
+        return 0.0
+
+    def read(self):
+        """(ok, frame) of the newest JPEG not returned yet. Waits while the
+        reader reconnects, like a camera that stalls; ok is False only
+        once release() was called"""
+        while True:
+            with self._cond:
+                while not self._fresh and self._running:
+                    self._cond.wait()
+                if not self._running:
+                    return False, None
+                self._front, self._ready = self._ready, self._front
+                self._fresh = False
+            buf, length = self._front
+            frame = cv2.imdecode(np.frombuffer(buf, np.uint8, count=length), cv2.IMREAD_COLOR)
+            if frame is not None:
+                self.decoded += 1
+                return True, frame
+            # A corrupt part is skipped; the next one replaces it
+
+    def release(self):
+        self._running = False
+        if self._conn is not None and self._conn.sock is not None:
+            # Unblock a reader waiting on the socket
+            try:
+                self._conn.sock.shutdown(2)
+            except OSError:
+                pass
+        with self._cond:
+            self._cond.notify_all()
+        self._thread.join(timeout=2.0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Read an MJPEG stream and report frame rates and drops")
+    parser.add_argument("url", help="stream URL, e.g. http://<cam>:8080/?action=stream")
+    parser.add_argument("--seconds", type=float, default=10.0,
+                        help="how long to read (default: 10)")
+    parser.add_argument("--decode-ms", type=float, default=0.0,
+                        help="extra processing time per frame, to see older frames dropped")
+    args = parser.parse_args()
+
+    cap = MjpegCapture(args.url)
+    if not cap.isOpened():
+        print(f"Error: Could not open {args.url}: {cap.error}")
+        raise SystemExit(1)
+    start = time.monotonic()
+    latencies = []
+    try:
+        while time.monotonic() - start < args.seconds:
+            t0 = time.perf_counter()
+            ok, frame = cap.read()
+            if not ok:
+                print("Error: stream stopped")
+                break
+            latencies.append((time.perf_counter() - t0) * 1000)
+            time.sleep(args.decode_ms / 1000)
+    finally:
+        cap.release()
+    elapsed = time.monotonic() - start
+    print(f"{cap.received} frames received ({cap.received / elapsed:.1f} fps), {cap.decoded} decoded, "
+          f"{cap.dropped} dropped, {cap.reconnects} reconnects")
+    if latencies:
+        print(f"read(): p50 {np.percentile(latencies, 50):.1f} ms, p99 {np.percentile(latencies, 99):.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
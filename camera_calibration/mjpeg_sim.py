@@ -0,0 +1,122 @@
+import argparse
+import glob
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BOUNDARY = "boundarydonotcross"  # what mjpg-streamer sends
+DEFAULT_IMAGES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "calibration_images")
+
+
+class MjpegStandIn(ThreadingHTTPServer):
+    """Local stand-in for mjpg-streamer's HTTP output.
+
+    Serves /?action=stream as multipart/x-mixed-replace with the part
+    headers mjpg-streamer writes (Content-Length, X-Timestamp), replaying
+    the given JPEG files in a loop at fps. With content_length=False the
+    parts carry no length, as some other MJPEG servers do. Each part is
+    written in chunks of chunk bytes to exercise incremental parsing.
+    While paused is set, no frames are sent but connections stay open,
+    like a camera stalling on a weak link.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address, jpegs, fps=10.0, content_length=True, chunk=None):
+        super().__init__(address, _Handler)
+        self.jpegs = list(jpegs)
+        self.fps = fps
+        self.content_length = content_length
+        self.chunk = chunk
+        self.paused = threading.Event()
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.frames_sent = 0
+
+    def serve_in_background(self):
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return thread
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.0"  # like mjpg-streamer: the stream ends with the connection
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        if "action=stream" not in self.path:
+            self.send_error(404)
+            return
+        with server.lock:
+            server.connections += 1
+        self.send_response(200)
+        self.send_header("Cache-Control", "no-store, no-cache, must-revalidate")
+        self.send_header("Content-Type", f"multipart/x-mixed-replace;boundary={BOUNDARY}")
+        self.end_headers()
+        self.wfile.write(f"\r\n--{BOUNDARY}\r\n".encode())
+
+        start = time.monotonic()
+        index = 0
+        try:
+            while True:
+                while server.paused.is_set():
+                    time.sleep(0.05)
+                    start = time.monotonic() - index / server.fps
+                jpeg = server.jpegs[index % len(server.jpegs)]
+                headers = "Content-Type: image/jpeg\r\n"
+                if server.content_length:
+                    headers += f"Content-Length: {len(jpeg)}\r\n"
+                headers += f"X-Timestamp: {time.time():.6f}\r\n\r\n"
+                part = headers.encode() + jpeg + f"\r\n--{BOUNDARY}\r\n".encode()
+                step = server.chunk or len(part)
+                for i in range(0, len(part), step):
+                    self.wfile.write(part[i:i + step])
+                self.wfile.flush()
+                with server.lock:
+                    server.frames_sent += 1
+                index += 1
+                delay = start + index / server.fps - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay JPEG files as an mjpg-streamer MJPEG stream")
+    parser.add_argument("images", nargs="*", default=[DEFAULT_IMAGES],
+                        help="JPEG files or directories (default: the bundled calibration images)")
+    parser.add_argument("--port", type=int, default=8080,
+                        help="port to listen on (default: 8080)")
+    parser.add_argument("--fps", type=float, default=10.0,
+                        help="frames per second (default: 10, as configured for mjpg-streamer)")
+    parser.add_argument("--no-length", action="store_true",
+                        help="leave out Content-Length so clients must find the boundaries")
+    args = parser.parse_args()
+
+    files = []
+    for path in args.images:
+        files.extend(sorted(glob.glob(os.path.join(path, "*.jpg"))) if os.path.isdir(path) else [path])
+    jpegs = []
+    for path in files:
+        with open(path, "rb") as f:
+            jpegs.append(f.read())
+    if not jpegs:
+        print("Error: no JPEG files to replay")
+        raise SystemExit(1)
+
+    server = MjpegStandIn(("127.0.0.1", args.port), jpegs, args.fps, not args.no_length)
+    print(f"Replaying {len(jpegs)} images at http://127.0.0.1:{args.port}/?action=stream, Ctrl+C to stop")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    print(f"{server.frames_sent} frames sent over {server.connections} connections")
+
+
+if __name__ == "__main__":
+    main()
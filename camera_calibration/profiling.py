@@ -0,0 +1,101 @@
+import json
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import numpy as np
+
+
+class FpsMeter:
+    """Frames per second over a sliding window"""
+
+    def __init__(self, window=2.0):
+        self.window = window
+        self.times = deque()
+        self.total = 0
+        self.start = time.perf_counter()
+
+    def tick(self):
+        now = time.perf_counter()
+        self.total += 1
+        self.times.append(now)
+        while self.times and now - self.times[0] > self.window:
+            self.times.popleft()
+
+    @property
+    def fps(self):
+        if len(self.times) < 2:
+            return 0.0
+        return (len(self.times) - 1) / (self.times[-1] - self.times[0])
+
+    @property
+    def average_fps(self):
+        elapsed = time.perf_counter() - self.start
+        return self.total / elapsed if elapsed > 0 else 0.0
+
+
+class StageProfiler:
+    """Rolling per-stage timings for the focus helper loop.
+
+    Each stage keeps the durations of its last window calls, so the
+    percentiles follow the current scene (board found or lost, ROI or full
+    search) instead of averaging over the whole session. Stages are listed
+    in the order they were first recorded.
+    """
+
+    def __init__(self, window=300):
+        self.window = window
+        self._samples = {}
+        self._counts = {}
+
+    def record(self, stage, seconds):
+        samples = self._samples.get(stage)
+        if samples is None:
+            samples = self._samples[stage] = deque(maxlen=self.window)
+            self._counts[stage] = 0
+        samples.append(seconds)
+        self._counts[stage] += 1
+
+    @contextmanager
+    def stage(self, name):
+        """Time the body of a with block as one call of stage name"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def reset(self):
+        self._samples.clear()
+        self._counts.clear()
+
+    def summary(self):
+        """{stage: {p50_ms, p99_ms, mean_ms, max_ms, samples, calls}}"""
+        stats = {}
+        for stage, samples in self._samples.items():
+            ms = np.fromiter(samples, dtype=np.float64, count=len(samples)) * 1000
+            p50, p99 = np.percentile(ms, (50, 99))
+            stats[stage] = {
+                "p50_ms": round(float(p50), 3),
+                "p99_ms": round(float(p99), 3),
+                "mean_ms": round(float(ms.mean()), 3),
+                "max_ms": round(float(ms.max()), 3),
+                "samples": len(samples),
+                "calls": self._counts[stage],
+            }
+        return stats
+
+    def format(self):
+        """One line per stage, for printing to a terminal"""
+        lines = [f"{'stage':<12}{'p50 ms':>10}{'p99 ms':>10}{'calls':>10}"]
+        for stage, s in self.summary().items():
+            lines.append(f"{stage:<12}{s['p50_ms']:>10.2f}{s['p99_ms']:>10.2f}{s['calls']:>10}")
+        return "\n".join(lines)
+
+    def save_json(self, path, **extra):
+        """Write the summary (plus any extra fields) as JSON to path"""
+        data = dict(extra)
+        data["window"] = self.window
+        data["stages"] = self.summary()
+        with open(path, "w") as f:
+            json.dump(data, f, indent=2)
@@ -0,0 +1,207 @@
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+METRICS = ("laplacian", "tenengrad", "fft")
+
+QUADRANTS = ("top_left", "top_right", "bottom_left", "bottom_right")
+
+
+class SharpnessMeter:
+    """Focus metrics over the checkerboard hull only.
+
+    All work happens inside the hull's bounding rectangle, and statistics
+    are taken over the pixels inside the hull, so the value no longer
+    depends on how much of the frame the board covers. Buffers are grown
+    on demand and reused between frames; each frame works on views of them.
+
+    Metrics:
+    - laplacian: variance of the Laplacian
+    - tenengrad: mean squared Sobel gradient magnitude
+    - fft: fraction of spectral energy above fft_cutoff of Nyquist
+    """
+
+    def __init__(self, metric="laplacian", fft_cutoff=0.25):
+        if metric not in METRICS:
+            raise ValueError(f"Unknown sharpness metric '{metric}', expected one of {', '.join(METRICS)}")
+        self.metric = metric
+        self.fft_cutoff = fft_cutoff
+
+        self._capacity = (0, 0)
+        self._roi = None
+        self._mask = None
+        self._response = None
+        self._gy = None
+        self._fft_masks = {}
+
+    def _ensure_buffers(self, h, w):
+        cap_h, cap_w = self._capacity
+        if h <= cap_h and w <= cap_w:
+            return
+        cap_h, cap_w = max(h, cap_h), max(w, cap_w)
+        self._roi = np.empty((cap_h, cap_w), np.float32)
+        self._mask = np.empty((cap_h, cap_w), np.uint8)
+        self._response = np.empty((cap_h, cap_w), np.float32)
+        self._gy = np.empty((cap_h, cap_w), np.float32)
+        self._capacity = (cap_h, cap_w)
+
+    def _prepare(self, gray, hull):
+        """Crop gray to the hull's bounding rect; returns (roi, mask, rect)"""
+        hull = np.asarray(hull, dtype=np.int32).reshape(-1, 2)
+        x, y, w, h = cv2.boundingRect(hull)
+        x1, y1 = min(x + w, gray.shape[1]), min(y + h, gray.shape[0])
+        x, y = max(x, 0), max(y, 0)
+        w, h = x1 - x, y1 - y
+        self._ensure_buffers(h, w)
+
+        roi = self._roi[:h, :w]
+        mask = self._mask[:h, :w]
+        np.copyto(roi, gray[y:y1, x:x1], casting="unsafe")
+        mask[:] = 0
+        cv2.fillConvexPoly(mask, hull - (x, y), 255)
+        return roi, mask, (x, y, w, h)
+
+    def _response_map(self, roi):
+        h, w = roi.shape
+        response = self._response[:h, :w]
+        if self.metric == "laplacian":
+            cv2.Laplacian(roi, cv2.CV_32F, dst=response)
+        else:
+            gy = self._gy[:h, :w]
+            cv2.Sobel(roi, cv2.CV_32F, 1, 0, dst=response, ksize=3)
+            cv2.Sobel(roi, cv2.CV_32F, 0, 1, dst=gy, ksize=3)
+            cv2.multiply(response, response, dst=response)
+            cv2.multiply(gy, gy, dst=gy)
+            cv2.add(response, gy, dst=response)
+        return response
+
+    def _statistic(self, response, mask):
+        if cv2.countNonZero(mask) == 0:
+            return 0.0
+        mean, std = cv2.meanStdDev(response, mask=mask)
+        if self.metric == "laplacian":
+            return float(std[0, 0] ** 2)
+        return float(mean[0, 0])
+
+    def _fft_radius_mask(self, h, w):
+        key = (h, w)
+        if key not in self._fft_masks:
+            fy = np.fft.fftfreq(h)[:, None]
+            fx = np.fft.rfftfreq(w)[None, :]
+            # Frequencies are in cycles/pixel, Nyquist is 0.5
+            self._fft_masks[key] = np.hypot(fx, fy) > self.fft_cutoff * 0.5
+        return self._fft_masks[key]
+
+    def _fft_energy(self, roi, mask):
+        if cv2.countNonZero(mask) == 0:
+            return 0.0
+        mean = cv2.mean(roi, mask=mask)[0]
+        # Zero-mean inside the hull and zero outside, so the hull edge does
+        # not add a step of its own to the spectrum
+        h, w = roi.shape
+        data = self._response[:h, :w]
+        data[:] = 0
+        cv2.subtract(roi, mean, dst=data, mask=mask)
+        power = np.abs(np.fft.rfft2(data)) ** 2
+        total = power.sum()
+        if total <= 0:
+            return 0.0
+        return float(power[self._fft_radius_mask(*roi.shape)].sum() / total)
+
+    def measure(self, gray, hull):
+        """Sharpness of the region of gray inside hull"""
+        roi, mask, _ = self._prepare(gray, hull)
+        if self.metric == "fft":
+            return self._fft_energy(roi, mask)
+        return self._statistic(self._response_map(roi), mask)
+
+    def measure_quadrants(self, gray, hull):
+        """Overall and per-quadrant sharpness of the hull.
+
+        Quadrants split the hull at its centroid. A lens that is tilted
+        against the sensor shows up as one side staying soft while the
+        other side is in focus. Returns (overall, {quadrant: value}).
+        """
+        roi, mask, (x, y, w, h) = self._prepare(gray, hull)
+        moments = cv2.moments(mask, binaryImage=True)
+        if moments["m00"] > 0:
+            cx = int(round(moments["m10"] / moments["m00"]))
+            cy = int(round(moments["m01"] / moments["m00"]))
+        else:
+            cx, cy = w // 2, h // 2
+
+        slices = {
+            "top_left": (slice(0, cy), slice(0, cx)),
+            "top_right": (slice(0, cy), slice(cx, w)),
+            "bottom_left": (slice(cy, h), slice(0, cx)),
+            "bottom_right": (slice(cy, h), slice(cx, w)),
+        }
+
+        if self.metric == "fft":
+            overall = self._fft_energy(roi, mask)
+            quadrants = {q: self._fft_energy(roi[s], mask[s]) for q, s in slices.items()}
+        else:
+            # One response map, statistics over masked views of it
+            response = self._response_map(roi)
+            overall = self._statistic(response, mask)
+            quadrants = {q: self._statistic(response[s], mask[s]) for q, s in slices.items()}
+        return overall, quadrants
+
+
+def legacy_sharpness(gray, hull):
+    """Original full-frame masked Laplacian variance from calibrate.py"""
+    mask = np.zeros_like(gray)
+    cv2.fillConvexPoly(mask, np.asarray(hull, dtype=np.int32), 255)
+    masked_gray = cv2.bitwise_and(gray, gray, mask=mask)
+    return cv2.Laplacian(masked_gray, cv2.CV_64F).var()
+
+
+def benchmark(gray, hull, repeat=50):
+    """Time each metric on one frame; returns {name: (ms per frame, value)}"""
+    candidates = [("legacy", lambda: legacy_sharpness(gray, hull))]
+    for metric in METRICS:
+        meter = SharpnessMeter(metric)
+        candidates.append((metric, lambda m=meter: m.measure(gray, hull)))
+        candidates.append((f"{metric} quadrants", lambda m=meter: m.measure_quadrants(gray, hull)[0]))
+
+    results = {}
+    for name, fn in candidates:
+        value = fn()  # warm up and size the buffers
+        start = time.perf_counter()
+        for _ in range(repeat):
+            fn()
+        results[name] = ((time.perf_counter() - start) / repeat * 1000, value)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmark for the focus metrics")
+    parser.add_argument("image", help="image containing the checkerboard")
+    parser.add_argument("--checkerboard", default="13x9",
+                        help="inner corners as COLSxROWS (default: 13x9)")
+    parser.add_argument("--repeat", type=int, default=50,
+                        help="iterations per metric (default: 50)")
+    args = parser.parse_args()
+
+    gray = cv2.imread(args.image, cv2.IMREAD_GRAYSCALE)
+    if gray is None:
+        print(f"Error: Could not read {args.image}")
+        raise SystemExit(1)
+
+    checkerboard_size = tuple(int(v) for v in args.checkerboard.split("x"))
+    ret, corners = cv2.findChessboardCorners(gray, checkerboard_size)
+    if not ret:
+        print("No checkerboard detected")
+        raise SystemExit(1)
+    hull = cv2.convexHull(corners.astype(np.int32))
+
+    print(f"{gray.shape[1]}x{gray.shape[0]}, {args.repeat} iterations")
+    print(f"{'metric':<24}{'ms/frame':>10}{'value':>14}")
+    for name, (ms, value) in benchmark(gray, hull, args.repeat).items():
+        print(f"{name:<24}{ms:>10.2f}{value:>14.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+import argparse
+import hashlib
+import os
+
+import cv2
+import numpy as np
+
+DEFAULT_CALIBRATION = "camera_calibration.npz"
+
+# Bump when the on-disk map layout changes so stale caches are not reused
+CACHE_VERSION = 1
+
+
+def load_calibration(calibration_file=DEFAULT_CALIBRATION):
+    """Load camera matrix and distortion coefficients from a calibration npz"""
+    with np.load(calibration_file) as data:
+        K = np.asarray(data["camera_matrix"], dtype=np.float64)
+        D = np.asarray(data["dist_coeffs"], dtype=np.float64)
+    return K, D
+
+
+def is_fisheye(D):
+    """cv2.fisheye stores D as a 4x1 column, calibrateCamera as a 1xN row"""
+    return D.size == 4 and D.shape[0] == 4
+
+
+def scaled_camera_matrix(K, image_size, output_size):
+    """New camera matrix that keeps the same field of view at output_size"""
+    sx = output_size[0] / image_size[0]
+    sy = output_size[1] / image_size[1]
+    P = K.copy()
+    P[0, 0] *= sx
+    P[0, 2] *= sx
+    P[1, 1] *= sy
+    P[1, 2] *= sy
+    return P
+
+
+def cache_key(K, D, image_size, output_size, P):
+    """Hash of everything the undistortion maps depend on"""
+    h = hashlib.sha1()
+    h.update(f"v{CACHE_VERSION}:{'fisheye' if is_fisheye(D) else 'pinhole'}:".encode())
+    h.update(f"{tuple(image_size)}:{tuple(output_size)}:".encode())
+    for m in (K, D, P):
+        h.update(np.ascontiguousarray(m, dtype=np.float64).tobytes())
+    return h.hexdigest()[:16]
+
+
+def build_undistort_maps(K, D, image_size, output_size=None, P=None):
+    """Compute CV_16SC2 undistortion maps for image_size -> output_size"""
+    output_size = tuple(output_size or image_size)
+    if P is None:
+        P = scaled_camera_matrix(K, image_size, output_size)
+
+    if is_fisheye(D):
+        return cv2.fisheye.initUndistortRectifyMap(
+            K, D, np.eye(3), P, output_size, cv2.CV_16SC2)
+    return cv2.initUndistortRectifyMap(
+        K, D, np.eye(3), P, output_size, cv2.CV_16SC2)
+
+
+def _save_array(path, array):
+    # Write to a temporary file and rename so a concurrent reader never
+    # memory-maps a half-written map
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.save(f, array)
+    os.replace(tmp_path, path)
+
+
+def get_undistort_maps(K, D, image_size, output_size=None, P=None, cache_dir="."):
+    """Return undistortion maps, building them only on a cache miss.
+
+    Maps are stored as .npy files in cache_dir, named after a hash of
+    (K, D, image size, output size, new camera matrix). Cached maps are
+    memory-mapped read-only instead of loaded, so repeated jobs and several
+    processes over the same calibration share the page cache.
+    """
+    image_size = tuple(image_size)
+    output_size = tuple(output_size or image_size)
+    if P is None:
+        P = scaled_camera_matrix(K, image_size, output_size)
+
+    key = cache_key(K, D, image_size, output_size, P)
+    map1_path = os.path.join(cache_dir, f"undistort_{key}_map1.npy")
+    map2_path = os.path.join(cache_dir, f"undistort_{key}_map2.npy")
+
+    try:
+        map1 = np.load(map1_path, mmap_mode="r")
+        map2 = np.load(map2_path, mmap_mode="r")
+        expected = (output_size[1], output_size[0])
+        if map1.shape[:2] == expected and map2.shape == expected:
+            return map1, map2
+    except (OSError, ValueError):
+        pass
+
+    map1, map2 = build_undistort_maps(K, D, image_size, output_size, P)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        _save_array(map1_path, map1)
+        _save_array(map2_path, map2)
+    except OSError as e:
+        print(f"Warning: Could not cache undistortion maps in {cache_dir}: {e}")
+    return map1, map2
+
+
+def maps_for_calibration(calibration_file=DEFAULT_CALIBRATION, image_size=None, output_size=None):
+    """Undistortion maps for a calibration file, cached next to that file"""
+    K, D = load_calibration(calibration_file)
+    if image_size is None:
+        # Without an explicit size assume the principal point is centred
+        image_size = (int(round(K[0, 2] * 2)), int(round(K[1, 2] * 2)))
+    cache_dir = os.path.dirname(os.path.abspath(calibration_file))
+    return get_undistort_maps(K, D, image_size, output_size, cache_dir=cache_dir)
+
+
+def undistort(image, map1, map2, dst=None):
+    """Apply precomputed undistortion maps to an image"""
+    return cv2.remap(image, map1, map2,
+                     interpolation=cv2.INTER_LINEAR,
+                     borderMode=cv2.BORDER_CONSTANT,
+                     dst=dst)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Undistort images using cached calibration maps")
+    parser.add_argument("images", nargs="+", help="images to undistort")
+    parser.add_argument("--calibration", default=DEFAULT_CALIBRATION,
+                        help=f"calibration npz (default: {DEFAULT_CALIBRATION})")
+    parser.add_argument("--output-dir", default="undistorted",
+                        help="directory for the undistorted images (default: undistorted)")
+    parser.add_argument("--output-size", type=lambda s: tuple(int(v) for v in s.split("x")),
+                        help="output size as WIDTHxHEIGHT (default: input size)")
+    args = parser.parse_args()
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    maps = {}
+
+    for path in args.images:
+        img = cv2.imread(path)
+        if img is None:
+            print(f"Could not read {path} - skipped")
+            continue
+
+        image_size = img.shape[1::-1]
+        if image_size not in maps:
+            maps[image_size] = maps_for_calibration(args.calibration, image_size, args.output_size)
+        map1, map2 = maps[image_size]
+
+        out_path = os.path.join(args.output_dir, os.path.basename(path))
+        cv2.imwrite(out_path, undistort(img, map1, map2))
+        print(f"Saved {out_path}")
+
+
+if __name__ == "__main__":
+    main()
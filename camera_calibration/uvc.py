@@ -0,0 +1,202 @@
+import struct
+from collections import namedtuple
+
+# Class-specific requests (UVC 1.5, table A-8)
+UVC_SET_CUR = 0x01
+UVC_GET_CUR = 0x81
+UVC_GET_MIN = 0x82
+UVC_GET_MAX = 0x83
+UVC_GET_RES = 0x84
+UVC_GET_LEN = 0x85
+UVC_GET_INFO = 0x86
+UVC_GET_DEF = 0x87
+
+REQUEST_NAMES = {
+    UVC_GET_CUR: "current",
+    UVC_GET_MIN: "min",
+    UVC_GET_MAX: "max",
+    UVC_GET_RES: "resolution",
+    UVC_GET_DEF: "default",
+}
+
+# bmRequestType for class requests addressed to an interface/entity
+REQUEST_TYPE_GET = 0xA1  # Device to Host, Class, Interface
+REQUEST_TYPE_SET = 0x21  # Host to Device, Class, Interface
+
+# GET_INFO capability bits
+INFO_GET = 0x01
+INFO_SET = 0x02
+INFO_DISABLED = 0x04  # disabled by an automatic mode
+INFO_AUTOUPDATE = 0x08
+INFO_ASYNC = 0x10
+
+# Video Control interface descriptors
+CS_INTERFACE = 0x24
+VC_HEADER = 0x01
+VC_INPUT_TERMINAL = 0x02
+VC_PROCESSING_UNIT = 0x05
+VC_EXTENSION_UNIT = 0x06
+ITT_CAMERA = 0x0201
+
+VIDEO_CLASS = 14
+VIDEO_CONTROL_SUBCLASS = 1
+
+# Which requests beyond GET_CUR a control answers: range controls support
+# MIN/MAX/RES/DEF, switches and enumerations only DEF (plus RES as the
+# bitmap of valid modes for auto-exposure)
+RANGE = (UVC_GET_MIN, UVC_GET_MAX, UVC_GET_RES, UVC_GET_DEF)
+SWITCH = (UVC_GET_DEF,)
+BITMAP = (UVC_GET_RES, UVC_GET_DEF)
+
+# bit: position in the entity's bmControls, fmt: struct layout of the value
+UvcControl = namedtuple("UvcControl", "bit name selector fmt requests")
+
+CAMERA_TERMINAL_CONTROLS = (
+    UvcControl(0, "scanning_mode", 0x01, "<B", SWITCH),
+    UvcControl(1, "auto_exposure_mode", 0x02, "<B", BITMAP),
+    UvcControl(2, "auto_exposure_priority", 0x03, "<B", SWITCH),
+    UvcControl(3, "exposure_time_absolute", 0x04, "<I", RANGE),
+    UvcControl(4, "exposure_time_relative", 0x05, "<b", SWITCH),
+    UvcControl(5, "focus_absolute", 0x06, "<H", RANGE),
+    UvcControl(6, "focus_relative", 0x07, "<bB", RANGE),
+    UvcControl(7, "iris_absolute", 0x09, "<H", RANGE),
+    UvcControl(8, "iris_relative", 0x0A, "<B", SWITCH),
+    UvcControl(9, "zoom_absolute", 0x0B, "<H", RANGE),
+    UvcControl(10, "zoom_relative", 0x0C, "<bBB", RANGE),
+    UvcControl(11, "pan_tilt_absolute", 0x0D, "<ii", RANGE),
+    UvcControl(12, "pan_tilt_relative", 0x0E, "<bBbB", RANGE),
+    UvcControl(13, "roll_absolute", 0x0F, "<h", RANGE),
+    UvcControl(14, "roll_relative", 0x10, "<bB", RANGE),
+    UvcControl(17, "focus_auto", 0x08, "<B", SWITCH),
+    UvcControl(18, "privacy", 0x11, "<B", SWITCH),
+    UvcControl(19, "focus_simple", 0x12, "<B", SWITCH),
+)
+
+PROCESSING_UNIT_CONTROLS = (
+    UvcControl(0, "brightness", 0x02, "<h", RANGE),
+    UvcControl(1, "contrast", 0x03, "<H", RANGE),
+    UvcControl(2, "hue", 0x06, "<h", RANGE),
+    UvcControl(3, "saturation", 0x07, "<H", RANGE),
+    UvcControl(4, "sharpness", 0x08, "<H", RANGE),
+    UvcControl(5, "gamma", 0x09, "<H", RANGE),
+    UvcControl(6, "white_balance_temperature", 0x0A, "<H", RANGE),
+    UvcControl(7, "white_balance_component", 0x0C, "<HH", RANGE),
+    UvcControl(8, "backlight_compensation", 0x01, "<H", RANGE),
+    UvcControl(9, "gain", 0x04, "<H", RANGE),
+    UvcControl(10, "power_line_frequency", 0x05, "<B", SWITCH),
+    UvcControl(11, "hue_auto", 0x10, "<B", SWITCH),
+    UvcControl(12, "white_balance_temperature_auto", 0x0B, "<B", SWITCH),
+    UvcControl(13, "white_balance_component_auto", 0x0D, "<B", SWITCH),
+    UvcControl(14, "digital_multiplier", 0x0E, "<H", RANGE),
+    UvcControl(15, "digital_multiplier_limit", 0x0F, "<H", RANGE),
+    UvcControl(16, "analog_video_standard", 0x11, "<B", ()),
+    UvcControl(17, "analog_lock_status", 0x12, "<B", ()),
+    UvcControl(18, "contrast_auto", 0x13, "<B", SWITCH),
+)
+
+# Controls of each entity kind, looked up by the descriptor parser
+ENTITY_CONTROLS = {
+    "camera_terminal": CAMERA_TERMINAL_CONTROLS,
+    "processing_unit": PROCESSING_UNIT_CONTROLS,
+}
+
+# Entity: one terminal or unit of the Video Control interface
+UvcEntity = namedtuple("UvcEntity", "kind unit_id bm_controls guid")
+
+
+def _bitmap(data):
+    """Little-endian bmControls bytes as an int"""
+    return int.from_bytes(bytes(data), "little")
+
+
+def parse_video_control_descriptors(extra):
+    """Entities of a Video Control interface from its class-specific descriptors.
+
+    extra is the raw byte string that follows the standard interface
+    descriptor (pyusb's Interface.extra_descriptors). Returns a list of
+    UvcEntity for camera terminals, processing units and extension units;
+    other terminals and units have no controls worth probing.
+    """
+    data = bytes(extra)
+    entities = []
+    offset = 0
+    while offset + 3 <= len(data):
+        length = data[offset]
+        if length < 3 or offset + length > len(data):
+            break  # truncated or corrupt descriptor
+        desc = data[offset:offset + length]
+        offset += length
+        if desc[1] != CS_INTERFACE:
+            continue
+
+        subtype = desc[2]
+        if subtype == VC_INPUT_TERMINAL and length >= 15:
+            terminal_type = desc[4] | (desc[5] << 8)
+            if terminal_type != ITT_CAMERA:
+                continue
+            size = desc[14]
+            entities.append(UvcEntity("camera_terminal", desc[3], _bitmap(desc[15:15 + size]), None))
+        elif subtype == VC_PROCESSING_UNIT and length >= 8:
+            size = desc[7]
+            entities.append(UvcEntity("processing_unit", desc[3], _bitmap(desc[8:8 + size]), None))
+        elif subtype == VC_EXTENSION_UNIT and length >= 22:
+            pins = desc[21]
+            size_at = 22 + pins
+            if size_at >= length:
+                continue
+            size = desc[size_at]
+            guid = desc[4:20]
+            guid = "-".join(part.hex() for part in (guid[3::-1], guid[5:3:-1], guid[7:5:-1],
+                                                    guid[8:10], guid[10:16]))
+            entities.append(UvcEntity("extension_unit", desc[3],
+                                      _bitmap(desc[size_at + 1:size_at + 1 + size]), guid))
+    return entities
+
+
+def entity_controls(entity):
+    """Controls an entity advertises in bmControls.
+
+    Extension unit controls are vendor-defined: by convention selector n is
+    bit n - 1, and the value layout is unknown (fmt None, sized by GET_LEN).
+    """
+    if entity.kind == "extension_unit":
+        controls = []
+        bit, bits = 0, entity.bm_controls
+        while bits >> bit:
+            if bits & (1 << bit):
+                controls.append(UvcControl(bit, f"xu_{entity.unit_id}_{bit + 1}", bit + 1, None, ()))
+            bit += 1
+        return controls
+    return [c for c in ENTITY_CONTROLS[entity.kind] if entity.bm_controls & (1 << c.bit)]
+
+
+def control_size(control):
+    """Value size in bytes fixed by the spec, or None if GET_LEN must be asked"""
+    return struct.calcsize(control.fmt) if control.fmt else None
+
+
+def decode_value(control, data):
+    """Decode a control value; multi-field values become tuples, unknown ones hex"""
+    data = bytes(data)
+    if control.fmt is None or len(data) != struct.calcsize(control.fmt):
+        return data.hex()
+    values = struct.unpack(control.fmt, data)
+    return values[0] if len(values) == 1 else values
+
+
+def encode_value(control, value):
+    """Bytes for SET_CUR of a value in decode_value's representation"""
+    if control.fmt is None:
+        return bytes.fromhex(value)
+    values = value if isinstance(value, (tuple, list)) else (value,)
+    return struct.pack(control.fmt, *values)
+
+
+def describe_info(info):
+    """GET_INFO bitmap as a list of capability names"""
+    names = []
+    for bit, name in ((INFO_GET, "get"), (INFO_SET, "set"), (INFO_DISABLED, "auto_disabled"),
+                      (INFO_AUTOUPDATE, "autoupdate"), (INFO_ASYNC, "async")):
+        if info & bit:
+            names.append(name)
+    return names
@@ -0,0 +1,156 @@
+import threading
+import time
+
+import usb.core
+
+from uvc import (CAMERA_TERMINAL_CONTROLS, CS_INTERFACE, INFO_GET, INFO_SET, ITT_CAMERA,
+                 PROCESSING_UNIT_CONTROLS, REQUEST_TYPE_GET, REQUEST_TYPE_SET, UVC_GET_CUR,
+                 UVC_GET_DEF, UVC_GET_INFO, UVC_GET_LEN, UVC_GET_MAX, UVC_GET_MIN, UVC_GET_RES,
+                 UVC_SET_CUR, VC_HEADER, VC_INPUT_TERMINAL, VC_PROCESSING_UNIT, VIDEO_CLASS,
+                 VIDEO_CONTROL_SUBCLASS, control_size, encode_value)
+
+# IDs of a simulated camera; not a real vendor
+SIM_VENDOR_ID = 0xFFF0
+SIM_PRODUCT_ID = 0x0001
+
+CAMERA_TERMINAL_ID = 1
+PROCESSING_UNIT_ID = 2
+
+# (min, max, resolution, default) of the simulated controls, roughly what a
+# 2MP UVC board camera reports
+DEFAULT_CONTROLS = {
+    "auto_exposure_mode": (None, None, 0x09, 0x08),
+    "exposure_time_absolute": (1, 5000, 1, 156),
+    "focus_absolute": (0, 1023, 1, 68),
+    "focus_auto": (None, None, None, 1),
+    "brightness": (-64, 64, 1, 0),
+    "contrast": (0, 95, 1, 32),
+    "hue": (-2000, 2000, 1, 0),
+    "saturation": (0, 100, 1, 55),
+    "sharpness": (0, 7, 1, 2),
+    "gamma": (64, 300, 1, 100),
+    "white_balance_temperature": (2800, 6500, 10, 4600),
+    "backlight_compensation": (0, 8, 1, 2),
+    "gain": (0, 255, 1, 64),
+    "power_line_frequency": (None, None, None, 1),
+    "white_balance_temperature_auto": (None, None, None, 1),
+}
+
+
+class _Interface:
+    def __init__(self, number, subclass, extra=b""):
+        self.bInterfaceNumber = number
+        self.bInterfaceClass = VIDEO_CLASS
+        self.bInterfaceSubClass = subclass
+        self.extra_descriptors = list(extra)
+
+
+class SimulatedUvcDevice:
+    """A UVC camera answering class requests from an in-memory control table.
+
+    Looks like a pyusb Device to diag.py: iterating it yields one
+    configuration with a Video Control and a Video Streaming interface, and
+    ctrl_transfer handles GET_INFO/LEN/CUR/MIN/MAX/RES/DEF and SET_CUR.
+    Controls the descriptors do not advertise stall, like on real hardware.
+    Each transfer sleeps for latency seconds to model the bus round trip.
+    """
+
+    def __init__(self, bus=1, address=2, serial="SIM0001", bcd_device=0x0100,
+                 controls=DEFAULT_CONTROLS, latency=0.002):
+        self.idVendor = SIM_VENDOR_ID
+        self.idProduct = SIM_PRODUCT_ID
+        self.bcdDevice = bcd_device
+        self.bus = bus
+        self.address = address
+        self.iManufacturer, self.iProduct, self.iSerialNumber = 1, 2, 3
+        self.strings = {1: "Simulated", 2: "Simulated UVC Camera", 3: serial}
+        self.latency = latency
+        self.transfers = 0
+        self._lock = threading.Lock()
+
+        # (unit ID, selector) -> [control, min, max, res, def, cur]
+        self._table = {}
+        bitmaps = {CAMERA_TERMINAL_ID: 0, PROCESSING_UNIT_ID: 0}
+        for unit_id, table in ((CAMERA_TERMINAL_ID, CAMERA_TERMINAL_CONTROLS),
+                               (PROCESSING_UNIT_ID, PROCESSING_UNIT_CONTROLS)):
+            for control in table:
+                if control.name in controls:
+                    minimum, maximum, res, default = controls[control.name]
+                    self._table[(unit_id, control.selector)] = [control, minimum, maximum, res,
+                                                                default, default]
+                    bitmaps[unit_id] |= 1 << control.bit
+
+        header = bytes([13, CS_INTERFACE, VC_HEADER, 0x00, 0x01, 0, 0, 0, 0, 0, 0, 0, 0])
+        terminal = bytes([18, CS_INTERFACE, VC_INPUT_TERMINAL, CAMERA_TERMINAL_ID,
+                          ITT_CAMERA & 0xFF, ITT_CAMERA >> 8, 0, 0, 0, 0, 0, 0, 0, 0, 3])
+        terminal += bitmaps[CAMERA_TERMINAL_ID].to_bytes(3, "little")
+        unit = bytes([13, CS_INTERFACE, VC_PROCESSING_UNIT, PROCESSING_UNIT_ID,
+                      CAMERA_TERMINAL_ID, 0, 0, 3])
+        unit += bitmaps[PROCESSING_UNIT_ID].to_bytes(3, "little") + bytes([0, 0])
+        self._configs = [[_Interface(0, VIDEO_CONTROL_SUBCLASS, header + terminal + unit),
+                          _Interface(1, 2)]]
+
+    def __iter__(self):
+        return iter(self._configs)
+
+    def is_kernel_driver_active(self, interface):
+        return False
+
+    def detach_kernel_driver(self, interface):
+        pass
+
+    def set_configuration(self):
+        pass
+
+    def ctrl_transfer(self, bmRequestType, bRequest, wValue=0, wIndex=0, data_or_wLength=None,
+                      timeout=None):
+        time.sleep(self.latency)
+        with self._lock:
+            self.transfers += 1
+            entry = self._table.get((wIndex >> 8, wValue >> 8))
+            if entry is None or (wIndex & 0xFF) != 0:
+                raise usb.core.USBError("Pipe error", 32)
+            control, minimum, maximum, res, default, current = entry
+
+            if bmRequestType == REQUEST_TYPE_SET and bRequest == UVC_SET_CUR:
+                value = int.from_bytes(bytes(data_or_wLength), "little",
+                                       signed=control.fmt[-1].islower())
+                if minimum is not None and not minimum <= value <= maximum:
+                    raise usb.core.USBError("Pipe error", 32)
+                entry[5] = value
+                return len(data_or_wLength)
+
+            if bmRequestType != REQUEST_TYPE_GET:
+                raise usb.core.USBError("Pipe error", 32)
+            if bRequest == UVC_GET_INFO:
+                reply = bytes([INFO_GET | INFO_SET])
+            elif bRequest == UVC_GET_LEN:
+                reply = control_size(control).to_bytes(2, "little")
+            else:
+                value = {UVC_GET_CUR: current, UVC_GET_MIN: minimum, UVC_GET_MAX: maximum,
+                         UVC_GET_RES: res, UVC_GET_DEF: default}.get(bRequest)
+                if value is None:
+                    raise usb.core.USBError("Pipe error", 32)
+                reply = encode_value(control, value)
+            if len(reply) != data_or_wLength:
+                raise usb.core.USBError("Pipe error", 32)
+            return bytearray(reply)
+
+
+class SimulatedBackend:
+    """Drop-in for diag.PyUsbBackend serving simulated devices"""
+
+    def __init__(self, devices):
+        self.devices = list(devices)
+
+    @classmethod
+    def bench(cls, count, latency=0.002):
+        """count identical cameras on one hub, as on a test bench"""
+        return cls(SimulatedUvcDevice(bus=1, address=2 + i, serial=f"SIM{i + 1:04d}", latency=latency)
+                   for i in range(count))
+
+    def find_all(self):
+        return list(self.devices)
+
+    def get_string(self, device, index):
+        return device.strings[index]
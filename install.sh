@@ -20,6 +20,18 @@ else
     fi
 fi
 
+# Python is optional: without it the shell fallbacks are used. The capture
+# daemon needs more than python3-light: logging, urllib, http.client (which
+# imports email) and ssl for HTTPS to Azure
+PYTHON_PACKAGES="python3-light python3-ctypes python3-logging python3-urllib python3-email python3-openssl"
+if command -v python3 >/dev/null 2>&1 && \
+        python3 -c 'import ctypes, logging, ssl, http.client, urllib.request' >/dev/null 2>&1; then
+    echo "✅ python3 already installed"
+else
+    echo "Installing python3 packages..."
+    opkg update && opkg install $PYTHON_PACKAGES || echo "⚠️ python3 not fully installed, using shell fallbacks"
+fi
+
 # Step 1: Create temp directory and prepare environment
 cd /tmp
 rm -rf avi_scripts_temp install.tar.gz
@@ -56,6 +68,20 @@ else
     chmod +x /bin/camsetup.sh 2>/dev/null || true
 fi
 
+# Step 3b: Install/Update Python modules
+echo "Installing/updating Python modules..."
+mkdir -p /usr/lib/avi
+if [ -d "./openwrt_7628/usr/lib/avi" ]; then
+    for module in ./openwrt_7628/usr/lib/avi/*.py; do
+        if [ -f "$module" ]; then
+            cp -v "$module" /usr/lib/avi/
+            echo "✅ Installed/Updated: $(basename "$module")"
+        fi
+    done
+fi
+# UVC control tables shared with the calibration tools (diag.py)
+cp -v ./camera_calibration/uvc.py /usr/lib/avi/uvc.py
+
 # Step 4: Install/Update config files (with overwrite detection)
 echo "Installing/updating configuration files..."
 mkdir -p /etc/config
@@ -285,6 +311,7 @@ echo "✅ Installation/Update complete!"
 echo ""
 echo "📋 Summary of changes:"
 echo "  - All .sh scripts updated/installed in /bin/"
+echo "  - Python modules updated/installed in /usr/lib/avi/"
 echo "  - Configuration files updated/added in /etc/config/"
 echo "  - Init scripts updated/added in /etc/init.d/"
 echo "  - LuCI Camera module updated/installed"
@@ -4,6 +4,14 @@
 
 VIDEO_DEVICE="/dev/video0"
 
+# Preferred path: one process, one open of the device, and a single batched
+# ioctl for only the controls that differ from the camera's current values
+if command -v python3 >/dev/null 2>&1 && [ -f "/usr/lib/avi/camctl.py" ]; then
+    exec python3 /usr/lib/avi/camctl.py --device "$VIDEO_DEVICE" --env /root/.env "$@"
+fi
+
+# Fallback without Python: one v4l2-ctl per control
+
 # Load .env file
 if [ -f "/root/.env" ]; then
     . "/root/.env"
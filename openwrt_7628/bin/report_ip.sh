@@ -22,7 +22,7 @@ else
 fi
 
 # Check if u3_service is running
-if ps | grep "/bin/u3.sh" | grep -v grep >/dev/null; then
+if ps | grep -e "/bin/u3.sh" -e "capture_daemon.py" | grep -v grep >/dev/null; then
   U3_RUNNING=1
 else
   U3_RUNNING=0
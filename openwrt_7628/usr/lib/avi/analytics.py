@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import time
+
+import cv2
+import numpy as np
+
+from mask import parse_polygons
+
+# Snapshots are decoded at 1/SCALE per side by libjpeg's DCT scaling, so a
+# 1920x1080 frame costs 480x270 pixels of memory and work
+SCALE = 4
+DECODE_FLAGS = {1: cv2.IMREAD_COLOR, 2: cv2.IMREAD_REDUCED_COLOR_2,
+                4: cv2.IMREAD_REDUCED_COLOR_4, 8: cv2.IMREAD_REDUCED_COLOR_8}
+
+# Background model: exponential average with weight 1/2**BACKGROUND_SHIFT
+# per frame, kept as 8.8 fixed point in uint16
+BACKGROUND_SHIFT = 3
+MOTION_THRESHOLD = 25  # grey levels a pixel must differ from the background
+
+
+def parse_rois(text):
+    """[(name, polygons)] from ANALYTICS_ROI.
+
+    Each ROI is "name:x1,y1 x2,y2 x3,y3 ..." in full-resolution pixels,
+    several are separated by ';'. Without a name an ROI is called roi<n>.
+    """
+    rois = []
+    for i, part in enumerate(p for p in text.split(";") if p.strip()):
+        name, sep, points = part.partition(":")
+        if not sep:
+            name, points = f"roi{i + 1}", part
+        rois.append((name.strip(), parse_polygons(points)))
+    return rois
+
+
+class FrameAnalytics:
+    """Motion, brightness and colour metrics of successive snapshots.
+
+    All per-pixel state lives in arrays allocated once per resolution:
+    the uint16 background model, a grey frame, scratch buffers and one
+    mask per ROI. Each frame is a fixed number of vectorised passes over
+    the reduced image; nothing scales with the number of frames seen.
+    """
+
+    def __init__(self, rois=(), scale=SCALE, threshold=MOTION_THRESHOLD, shift=BACKGROUND_SHIFT):
+        self.rois = list(rois)
+        self.scale = scale
+        self.threshold = threshold
+        self.shift = shift
+        self.shape = None
+        self.frames = 0
+
+    def _allocate(self, height, width):
+        self.shape = (height, width)
+        self.gray = np.empty((height, width), np.uint8)
+        self.background = np.empty((height, width), np.uint16)
+        self.scratch = np.empty((height, width), np.uint16)
+        self.reference = np.empty((height, width), np.uint8)
+        self.diff = np.empty((height, width), np.uint8)
+        self.motion = np.empty((height, width), np.uint8)
+        self.masked = np.empty((height, width), np.uint8)
+        self.roi_masks = []
+        for name, polygons in self.rois:
+            roi = np.zeros((height, width), np.uint8)
+            cv2.fillPoly(roi, [(p // self.scale).astype(np.int32) for p in polygons], 255)
+            self.roi_masks.append((name, roi, max(1, cv2.countNonZero(roi))))
+        self.frames = 0
+
+    def decode(self, data):
+        image = cv2.imdecode(np.frombuffer(data, np.uint8), DECODE_FLAGS[self.scale])
+        if image is None:
+            raise ValueError("snapshot is not a decodable JPEG")
+        return image
+
+    def _update_background(self):
+        """Motion mask of gray against the background, then blend it in"""
+        bg, scratch = self.background, self.scratch
+        if self.frames == 0:
+            np.left_shift(self.gray, 8, out=bg, dtype=np.uint16)
+            self.motion.fill(0)
+            return
+        np.right_shift(bg, 8, out=scratch)
+        np.copyto(self.reference, scratch, casting="unsafe")
+        cv2.absdiff(self.gray, self.reference, dst=self.diff)
+        cv2.threshold(self.diff, self.threshold, 255, cv2.THRESH_BINARY, dst=self.motion)
+        # bg += (gray * 256 - bg) / 2**shift without leaving uint16
+        np.right_shift(bg, self.shift, out=scratch)
+        np.subtract(bg, scratch, out=bg)
+        np.left_shift(self.gray, 8 - self.shift, out=scratch, dtype=np.uint16)
+        np.add(bg, scratch, out=bg)
+
+    def analyze(self, data, when=None):
+        """Compact record of one JPEG snapshot"""
+        start = time.perf_counter()
+        image = self.decode(data)
+        if image.shape[:2] != self.shape:
+            self._allocate(*image.shape[:2])
+        cv2.cvtColor(image, cv2.COLOR_BGR2GRAY, dst=self.gray)
+        self._update_background()
+        self.frames += 1
+
+        mean, std = cv2.meanStdDev(image)
+        pixels = self.shape[0] * self.shape[1]
+        record = {
+            "t": round(time.time() if when is None else when, 3),
+            "brightness": round(float(cv2.mean(self.gray)[0]), 1),
+            "motion": round(cv2.countNonZero(self.motion) / pixels, 4),
+            "color": {c: [round(float(m), 1), round(float(s), 1)]
+                      for c, m, s in zip("bgr", mean.ravel(), std.ravel())},
+        }
+        if self.roi_masks:
+            record["roi"] = {}
+            for name, roi, area in self.roi_masks:
+                cv2.bitwise_and(self.motion, roi, dst=self.masked)
+                record["roi"][name] = {
+                    "motion": round(cv2.countNonZero(self.masked) / area, 4),
+                    "brightness": round(float(cv2.mean(self.gray, mask=roi)[0]), 1),
+                }
+        record["ms"] = round((time.perf_counter() - start) * 1000, 1)
+        return record
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Motion and brightness metrics of JPEG snapshots")
+    parser.add_argument("images", nargs="+", help="snapshots, in capture order")
+    parser.add_argument("--roi", default="",
+                        help='ROIs as "name:x1,y1 x2,y2 x3,y3; name2:..." (default: whole frame only)')
+    parser.add_argument("--scale", type=int, choices=sorted(DECODE_FLAGS), default=SCALE,
+                        help=f"decode at 1/SCALE resolution (default: {SCALE})")
+    parser.add_argument("--threshold", type=int, default=MOTION_THRESHOLD,
+                        help=f"motion threshold in grey levels (default: {MOTION_THRESHOLD})")
+    args = parser.parse_args()
+
+    analytics = FrameAnalytics(parse_rois(args.roi), args.scale, args.threshold)
+    for path in args.images:
+        with open(path, "rb") as f:
+            print(json.dumps(analytics.analyze(f.read()), separators=(",", ":")))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+import argparse
+import io
+import logging
+import math
+import os
+import stat
+import struct
+import subprocess
+import threading
+import time
+import wave
+
+AUDIO_FIFO = "/tmp/audio_stream.fifo"
+
+# Format the audio-capture service writes (arecord -f S16_LE -r 32000 -c 2)
+AUDIO_RATE = 32000
+AUDIO_CHANNELS = 2
+AUDIO_SAMPLE_WIDTH = 2
+FRAME_BYTES = AUDIO_CHANNELS * AUDIO_SAMPLE_WIDTH
+
+BUFFER_SECONDS = 10
+READ_SIZE = 64 * 1024  # bytes per read(); half a second of audio
+
+log = logging.getLogger("audio")
+
+
+def wav_bytes(pcm, rate=AUDIO_RATE, channels=AUDIO_CHANNELS, sample_width=AUDIO_SAMPLE_WIDTH):
+    """PCM from the audio stream as a WAV file with correct lengths"""
+    out = io.BytesIO()
+    with wave.open(out, "wb") as w:
+        w.setnchannels(channels)
+        w.setsampwidth(sample_width)
+        w.setframerate(rate)
+        w.writeframes(pcm)
+    return out.getvalue()
+
+
+def record_with_arecord(seconds):
+    """Raw PCM recorded directly from the sound card, like u3.sh does
+    when the FIFO is missing"""
+    result = subprocess.run(["arecord", "-d", str(seconds), "-f", "S16_LE", "-r", str(AUDIO_RATE),
+                             "-c", str(AUDIO_CHANNELS), "-D", "hw:0,0", "-t", "raw", "-"],
+                            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, timeout=seconds + 10)
+    return result.stdout if result.returncode == 0 else None
+
+
+class AudioRing:
+    """The last seconds of the audio FIFO, always ready to be cut.
+
+    A reader thread keeps the FIFO drained with large reads straight into
+    a preallocated ring buffer, so the audio-capture service never blocks
+    and clip() returns the most recent audio at once instead of waiting
+    for it to be recorded. If the writer goes away the FIFO is reopened.
+    """
+
+    def __init__(self, seconds=BUFFER_SECONDS, fifo=AUDIO_FIFO, rate=AUDIO_RATE, frame_bytes=FRAME_BYTES):
+        self.fifo = fifo
+        self.rate = rate
+        self.frame_bytes = frame_bytes
+        # One read's worth of slack: the read in progress may be
+        # overwriting the oldest bytes of the ring
+        self.capacity = seconds * rate * frame_bytes + READ_SIZE
+        self.seconds = seconds
+        self._buffer = bytearray(self.capacity)
+        self._view = memoryview(self._buffer)
+        self._lock = threading.Lock()
+        self.written = 0  # bytes since start; the write position is written % capacity
+        self.reads = 0
+        self.reopens = 0
+        self._fd = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="audio-reader", daemon=True)
+        self._thread.start()
+
+    def _open(self):
+        """Blocking open of the FIFO; waits for it to exist"""
+        while not self._stop.is_set():
+            try:
+                if stat.S_ISFIFO(os.stat(self.fifo).st_mode):
+                    return os.open(self.fifo, os.O_RDONLY)
+            except FileNotFoundError:
+                pass
+            self._stop.wait(1.0)
+        return None
+
+    def _run(self):
+        while not self._stop.is_set():
+            fd = self._fd = self._open()
+            if fd is None:
+                return
+            try:
+                while True:
+                    pos = self.written % self.capacity
+                    n = os.readv(fd, [self._view[pos:min(pos + READ_SIZE, self.capacity)]])
+                    if n == 0:
+                        break  # writer closed
+                    with self._lock:
+                        self.written += n
+                    self.reads += 1
+            except OSError as e:
+                if not self._stop.is_set():
+                    log.warning("Audio FIFO read failed: %s", e)
+            finally:
+                os.close(fd)
+                self._fd = None
+            self.reopens += 1
+            self._stop.wait(0.2)
+
+    def available(self):
+        """Seconds of audio currently buffered"""
+        return min(self.written, self.capacity - READ_SIZE) // self.frame_bytes / self.rate
+
+    def pcm(self, seconds):
+        """The most recent seconds of raw audio (less if not yet buffered)"""
+        with self._lock:
+            end = self.written - self.written % self.frame_bytes
+        oldest = end - (self.capacity - READ_SIZE) // self.frame_bytes * self.frame_bytes
+        start = max(end - int(seconds * self.rate) * self.frame_bytes, oldest, 0)
+        a, b = start % self.capacity, end % self.capacity
+        if start == end:
+            return b""
+        if a < b:
+            return bytes(self._view[a:b])
+        return bytes(self._view[a:]) + bytes(self._view[:b])
+
+    def clip(self, seconds):
+        """The most recent seconds as a WAV file, or None if nothing was
+        buffered yet"""
+        pcm = self.pcm(seconds)
+        return wav_bytes(pcm, self.rate) if pcm else None
+
+    def stop(self, timeout=2.0):
+        self._stop.set()
+        # Unblock a reader waiting in open() for a writer
+        try:
+            fd = os.open(self.fifo, os.O_WRONLY | os.O_NONBLOCK)
+            os.close(fd)
+        except OSError:
+            pass
+        self._thread.join(timeout)
+
+
+def feed_fifo(fifo, seconds, frequency=440.0, chunk=4096):
+    """Write a stereo test tone into fifo in real time, like the
+    audio-capture service would"""
+    if not os.path.exists(fifo):
+        os.mkfifo(fifo, 0o666)
+    frames = [struct.pack("<hh", *(2 * [int(8000 * math.sin(2 * math.pi * frequency * i / AUDIO_RATE))]))
+              for i in range(AUDIO_RATE)]
+    tone = b"".join(frames) * 2
+    start = time.monotonic()
+    with open(fifo, "wb", buffering=0) as f:
+        sent = 0
+        total = int(seconds * AUDIO_RATE) * FRAME_BYTES
+        while sent < total:
+            n = min(chunk, total - sent)
+            pos = sent % (len(tone) // 2)
+            f.write(tone[pos:pos + n])
+            sent += n
+            delay = start + sent / (AUDIO_RATE * FRAME_BYTES) - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cut a WAV clip from the audio FIFO")
+    parser.add_argument("output", help="WAV file to write")
+    parser.add_argument("--fifo", default=AUDIO_FIFO,
+                        help=f"FIFO of the audio-capture service (default: {AUDIO_FIFO})")
+    parser.add_argument("--seconds", type=float, default=3.0,
+                        help="clip length (default: 3)")
+    parser.add_argument("--wait", type=float, default=None,
+                        help="seconds to buffer before cutting (default: the clip length)")
+    parser.add_argument("--feed", type=float, default=None, metavar="SECONDS",
+                        help="also write a test tone of this length into the FIFO")
+    args = parser.parse_args()
+
+    if args.feed:
+        threading.Thread(target=feed_fifo, args=(args.fifo, args.feed), daemon=True).start()
+    ring = AudioRing(max(BUFFER_SECONDS, math.ceil(args.seconds)), args.fifo)
+    time.sleep(args.seconds if args.wait is None else args.wait)
+    start = time.perf_counter()
+    clip = ring.clip(args.seconds)
+    elapsed = (time.perf_counter() - start) * 1000
+    ring.stop()
+    if clip is None:
+        print("Error: no audio received")
+        raise SystemExit(1)
+    with open(args.output, "wb") as f:
+        f.write(clip)
+    print(f"{len(clip)} bytes ({ring.available():.2f}s buffered) cut in {elapsed:.1f} ms; "
+          f"{ring.reads} reads for {ring.written} bytes")
+
+
+if __name__ == "__main__":
+    main()
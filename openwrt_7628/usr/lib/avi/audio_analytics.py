@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import time
+import wave
+
+import numpy as np
+
+from audio import AUDIO_CHANNELS, AUDIO_RATE
+
+FFT_SIZE = 4096
+FULL_SCALE = 32768.0
+CLIP_LEVEL = 32767  # samples at or beyond this magnitude count as clipped
+FLOOR_DB = -120.0
+
+# Nominal octave-band centres (Hz); a band is kept if it lies below Nyquist
+OCTAVE_CENTRES = (31.5, 63, 125, 250, 500, 1000, 2000, 4000, 8000, 16000)
+
+
+def _db(mean_square):
+    """dBFS of a mean square relative to a full-scale square wave"""
+    return round(max(FLOOR_DB, 10 * float(np.log10(mean_square / FULL_SCALE ** 2 + 1e-30))), 1)
+
+
+class AudioAnalyzer:
+    """Level and octave-band features of S16 clips.
+
+    The clip is cut into FFT_SIZE frames that go through one batched
+    rfft with a Hann window; the mean power spectrum is summed into
+    octave bands with a precomputed bin-to-band index, so a clip costs a
+    fixed handful of NumPy calls. Band levels are the mean-square power
+    of the channels' mix in each band, in dBFS on the same scale as the
+    RMS level (a full-scale sine is -3 dBFS).
+    """
+
+    def __init__(self, rate=AUDIO_RATE, channels=AUDIO_CHANNELS, fft_size=FFT_SIZE):
+        self.rate = rate
+        self.channels = channels
+        self.fft_size = fft_size
+        self.window = np.hanning(fft_size).astype(np.float32)
+        # Parseval for a windowed one-sided spectrum: mean square per bin
+        self.scale = 2.0 / (fft_size * float(np.sum(self.window ** 2)))
+
+        freqs = np.fft.rfftfreq(fft_size, 1.0 / rate)
+        self.bands = [c for c in OCTAVE_CENTRES if c * 2 ** 0.5 <= rate / 2]
+        edges = [c / 2 ** 0.5 for c in self.bands] + [self.bands[-1] * 2 ** 0.5]
+        # Bins outside every band go to an extra, ignored slot
+        index = np.searchsorted(edges, freqs, side="right") - 1
+        index[(index < 0) | (index >= len(self.bands))] = len(self.bands)
+        self.band_index = index
+
+    def analyze(self, pcm, when=None):
+        """Compact feature record of interleaved S16 little-endian PCM"""
+        start = time.perf_counter()
+        samples = np.frombuffer(pcm, dtype="<i2")
+        samples = samples[:len(samples) - len(samples) % self.channels].reshape(-1, self.channels)
+        if not len(samples):
+            raise ValueError("empty audio clip")
+
+        magnitude = np.abs(samples.astype(np.int32))
+        peak = int(magnitude.max())
+        clipped = int(np.count_nonzero(magnitude >= CLIP_LEVEL))
+        channel_ms = np.mean(np.square(samples, dtype=np.float64), axis=0)
+
+        mono = samples.mean(axis=1, dtype=np.float32)
+        frames = len(mono) // self.fft_size
+        record = {
+            "t": round(time.time() if when is None else when, 3),
+            "seconds": round(len(samples) / self.rate, 2),
+            "rms_dbfs": _db(float(channel_ms.mean())),
+            "channel_dbfs": [_db(float(ms)) for ms in channel_ms],
+            "peak_dbfs": round(max(FLOOR_DB, 20 * float(np.log10(peak / FULL_SCALE + 1e-30))), 1),
+            "clipped": clipped,
+        }
+        if frames:
+            spectrum = np.fft.rfft(mono[:frames * self.fft_size].reshape(frames, -1) * self.window, axis=1)
+            power = np.mean(spectrum.real ** 2 + spectrum.imag ** 2, axis=0) * self.scale
+            energy = np.bincount(self.band_index, weights=power, minlength=len(self.bands) + 1)
+            record["bands"] = {f"{c:g}": _db(float(e)) for c, e in zip(self.bands, energy)}
+        record["ms"] = round((time.perf_counter() - start) * 1000, 1)
+        return record
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Level and octave-band features of a WAV clip")
+    parser.add_argument("wavs", nargs="+", help="16-bit WAV files")
+    args = parser.parse_args()
+
+    analyzers = {}
+    for path in args.wavs:
+        with wave.open(path, "rb") as w:
+            if w.getsampwidth() != 2:
+                raise SystemExit(f"Error: {path} is not 16-bit PCM")
+            key = (w.getframerate(), w.getnchannels())
+            pcm = w.readframes(w.getnframes())
+        if key not in analyzers:
+            analyzers[key] = AudioAnalyzer(*key)
+        print(json.dumps(analyzers[key].analyze(pcm), separators=(",", ":")))
+
+
+if __name__ == "__main__":
+    main()
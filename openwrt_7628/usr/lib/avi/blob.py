@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+import argparse
+import http.client
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote, urlparse
+
+from envfile import DEFAULT_ENV, load_env
+
+# Same service version u3.sh sends
+AZURE_API_VERSION = "2019-12-12"
+
+# Requests that fail on a reused keep-alive connection are retried once on
+# a fresh one; the server may have closed it while idle
+RETRYABLE = (OSError, http.client.HTTPException)
+
+
+class UploadError(Exception):
+    """An upload was refused or could not be sent"""
+
+
+def account_endpoint(account):
+    return f"https://{account}.blob.core.windows.net"
+
+
+def http_date(now=None):
+    return time.strftime("%a, %d %b %Y %H:%M:%S GMT", time.gmtime(now))
+
+
+class BlobClient:
+    """Block blob uploads to one storage account over pooled connections.
+
+    Up to max_connections requests run at once, each on a kept-alive
+    HTTP(S) connection reused by later requests, so only the first upload
+    per connection pays for the TLS handshake. endpoint overrides the
+    account URL, e.g. a local stand-in such as blob_sim.py.
+    """
+
+    def __init__(self, account, sas_token, max_connections=2, timeout=15, endpoint=None):
+        self.account = account
+        self.sas_token = sas_token  # carries its leading '?', as in .env
+        self.endpoint = (endpoint or account_endpoint(account)).rstrip("/")
+        parts = urlparse(self.endpoint)
+        self._https = parts.scheme == "https"
+        self._host = parts.hostname
+        self._port = parts.port
+        self._prefix = parts.path
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max_connections)
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self.connections = 0
+        self.requests = 0
+        self.bytes_sent = 0
+
+    def blob_path(self, container, blob_name):
+        return f"{self._prefix}/{quote(container)}/{quote(blob_name, safe='/')}"
+
+    def blob_url(self, container, blob_name):
+        """Full URL of a blob including the SAS token"""
+        return f"{self.endpoint}/{quote(container)}/{quote(blob_name, safe='/')}{self.sas_token}"
+
+    def _connect(self):
+        with self._lock:
+            self.connections += 1
+        if self._https:
+            return http.client.HTTPSConnection(self._host, self._port, timeout=self.timeout)
+        return http.client.HTTPConnection(self._host, self._port, timeout=self.timeout)
+
+    def _request(self, method, path, body=b"", headers=None):
+        """(status, reason, headers) of one request on a pooled connection"""
+        headers = dict(headers or {}, **{"x-ms-version": AZURE_API_VERSION, "x-ms-date": http_date()})
+        headers["Content-Length"] = str(len(body))
+        with self._slots:
+            try:
+                conn, reused = self._idle.get_nowait(), True
+            except queue.Empty:
+                conn, reused = self._connect(), False
+            while True:
+                try:
+                    conn.request(method, path + self.sas_token, body=body, headers=headers)
+                    response = conn.getresponse()
+                    response.read()
+                    break
+                except RETRYABLE:
+                    conn.close()
+                    if not reused:
+                        raise
+                    conn, reused = self._connect(), False
+            with self._lock:
+                self.requests += 1
+                self.bytes_sent += len(body)
+            if response.will_close:
+                conn.close()
+            else:
+                self._idle.put(conn)
+        return response.status, response.reason, response.headers
+
+    def put_blob(self, container, blob_name, data, content_type="application/octet-stream"):
+        """Upload data as a block blob, like upload_to_azure in u3.sh"""
+        if not data:
+            raise UploadError(f"Upload failed: nothing to upload for {blob_name}")
+        try:
+            status, reason, _ = self._request("PUT", self.blob_path(container, blob_name), data, {
+                "x-ms-blob-type": "BlockBlob",
+                "Content-Type": content_type,
+            })
+        except RETRYABLE as e:
+            raise UploadError(f"Upload failed: {blob_name}: {e}")
+        if status >= 300:
+            raise UploadError(f"Upload failed: {blob_name}: HTTP {status} {reason}")
+
+    def copy_blob(self, container, source_name, blob_name):
+        """Server-side copy of a blob in the same account; no data is sent.
+
+        Copies within an account normally finish before the response;
+        a copy left pending completes on the service side.
+        """
+        try:
+            status, reason, headers = self._request("PUT", self.blob_path(container, blob_name), b"", {
+                "x-ms-copy-source": self.blob_url(container, source_name),
+            })
+        except RETRYABLE as e:
+            raise UploadError(f"Copy failed: {blob_name}: {e}")
+        if status >= 300 or headers.get("x-ms-copy-status") in ("failed", "aborted"):
+            raise UploadError(f"Copy failed: {blob_name}: HTTP {status} {reason}")
+
+    def copy_or_put(self, container, source_name, blob_name, data, content_type="application/octet-stream"):
+        """Create blob_name from an uploaded source_name server-side.
+
+        A copy the service refuses (e.g. a SAS token without read
+        permission on the source) is uploaded from data instead. Returns
+        True if the copy worked.
+        """
+        try:
+            self.copy_blob(container, source_name, blob_name)
+            return True
+        except UploadError:
+            self.put_blob(container, blob_name, data, content_type)
+            return False
+
+    def upload(self, container, blob_name, data, content_type="application/octet-stream", copies=()):
+        """Upload data once and create each of copies from it server-side.
+        Returns the number of copies that needed a second upload."""
+        self.put_blob(container, blob_name, data, content_type)
+        return sum(not self.copy_or_put(container, blob_name, copy_name, data, content_type)
+                   for copy_name in copies)
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Upload files to Azure Blob Storage with the .env settings")
+    parser.add_argument("files", nargs="+", help="files to upload")
+    parser.add_argument("--env", default=DEFAULT_ENV,
+                        help=f"settings file (default: {DEFAULT_ENV})")
+    parser.add_argument("--prefix", default="",
+                        help="blob name prefix, e.g. customer/date/camera/")
+    parser.add_argument("--latest", default=None,
+                        help="also copy the last file to this blob name server-side")
+    parser.add_argument("--endpoint", default=None,
+                        help="Blob service URL (default: the account's; e.g. http://127.0.0.1:10000/acct)")
+    parser.add_argument("--connections", type=int, default=2,
+                        help="parallel uploads (default: 2)")
+    args = parser.parse_args()
+
+    env = load_env(args.env)
+    client = BlobClient(env.get("STORAGE_ACCOUNT_NAME", ""), env.get("SAS_TOKEN", ""),
+                        max_connections=args.connections, endpoint=args.endpoint)
+    container = env.get("CONTAINER_NAME", "")
+
+    def upload_file(i, path):
+        with open(path, "rb") as f:
+            data = f.read()
+        copies = (args.latest,) if args.latest and i == len(args.files) - 1 else ()
+        client.upload(container, args.prefix + os.path.basename(path), data, copies=copies)
+        return len(data)
+
+    start = time.monotonic()
+    sent = 0
+    failed = 0
+    with ThreadPoolExecutor(max_workers=args.connections) as pool:
+        for future in [pool.submit(upload_file, i, path) for i, path in enumerate(args.files)]:
+            try:
+                sent += future.result()
+            except (OSError, UploadError) as e:
+                failed += 1
+                print(f"Error: {e}")
+    client.close()
+
+    print(f"Uploaded {len(args.files) - failed}/{len(args.files)} files, {sent} bytes in "
+          f"{time.monotonic() - start:.2f}s ({client.requests} requests, {client.connections} connections)")
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlparse
+
+
+class BlobStandIn(ThreadingHTTPServer):
+    """Local stand-in for the Blob service, for trying out uploads.
+
+    Understands Put Blob and same-server Copy Blob under
+    http://host:port/<account>/<container>/<blob>, keeps blobs in memory
+    and counts connections, requests and received bytes. The SAS token
+    is accepted and ignored. With refuse_copy every copy is answered
+    403, like a SAS token without read permission.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address, refuse_copy=False):
+        super().__init__(address, _Handler)
+        self.refuse_copy = refuse_copy
+        self.blobs = {}
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.requests = 0
+        self.bytes_received = 0
+
+    def serve_in_background(self):
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return thread
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real service
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status, headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_PUT(self):
+        path = unquote(urlparse(self.path).path)
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        server = self.server
+        with server.lock:
+            server.requests += 1
+            server.bytes_received += len(body)
+
+        source = self.headers.get("x-ms-copy-source")
+        if source is not None:
+            if server.refuse_copy:
+                self._reply(403)
+                return
+            with server.lock:
+                blob = server.blobs.get(unquote(urlparse(source).path))
+                if blob is not None:
+                    server.blobs[path] = blob
+            if blob is None:
+                self._reply(404)
+            else:
+                self._reply(202, {"x-ms-copy-status": "success"})
+            return
+
+        if self.headers.get("x-ms-blob-type") != "BlockBlob":
+            self._reply(400)
+            return
+        with server.lock:
+            server.blobs[path] = (body, self.headers.get("Content-Type"))
+        self._reply(201)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for Azure Blob Storage")
+    parser.add_argument("--port", type=int, default=10000,
+                        help="port to listen on (default: 10000)")
+    parser.add_argument("--refuse-copy", action="store_true",
+                        help="answer every Copy Blob with 403")
+    args = parser.parse_args()
+
+    server = BlobStandIn(("127.0.0.1", args.port), args.refuse_copy)
+    print(f"Blob stand-in at http://127.0.0.1:{args.port}/<account>, Ctrl+C to stop")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    print(f"{len(server.blobs)} blobs, {server.requests} requests, "
+          f"{server.connections} connections, {server.bytes_received} bytes received")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+import argparse
+import ctypes
+import errno
+import fcntl
+import os
+import platform
+import sys
+
+from envfile import DEFAULT_ENV, env_int, load_env
+
+try:
+    from uvc import CAMERA_TERMINAL_CONTROLS, PROCESSING_UNIT_CONTROLS
+except ImportError:
+    # Running from a checkout: install.sh copies uvc.py next to this file
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                 "..", "..", "..", "..", "camera_calibration"))
+    from uvc import CAMERA_TERMINAL_CONTROLS, PROCESSING_UNIT_CONTROLS
+
+DEFAULT_DEVICE = "/dev/video0"
+
+# V4L2 IDs of the UVC controls, keyed by the control names diag.py reports
+# (uvc.py); uvcvideo maps each UVC control to exactly one of these
+V4L2_CID = {
+    "brightness": 0x00980900,
+    "contrast": 0x00980901,
+    "saturation": 0x00980902,
+    "hue": 0x00980903,
+    "white_balance_temperature_auto": 0x0098090C,
+    "gamma": 0x00980910,
+    "gain": 0x00980913,
+    "power_line_frequency": 0x00980918,
+    "white_balance_temperature": 0x0098091A,
+    "sharpness": 0x0098091B,
+    "backlight_compensation": 0x0098091C,
+    "auto_exposure_mode": 0x009A0901,
+    "exposure_time_absolute": 0x009A0902,
+    "auto_exposure_priority": 0x009A0903,
+    "focus_absolute": 0x009A090A,
+    "focus_auto": 0x009A090C,
+}
+
+# UVC entity each control lives on, for reporting
+CONTROL_ENTITY = {c.name: "camera_terminal" for c in CAMERA_TERMINAL_CONTROLS}
+CONTROL_ENTITY.update({c.name: "processing_unit" for c in PROCESSING_UNIT_CONTROLS})
+
+# What camsetup.sh applies for the AS-2MUSB12J: (.env variable, control,
+# default); a variable of None is a fixed value. The batch is applied in this
+# order, so automatic modes come before the values they gate.
+SETTINGS = (
+    ("CAM_AUTO_WB", "white_balance_temperature_auto", 1),
+    (None, "auto_exposure_mode", 3),  # V4L2 menu: 3 = aperture priority (auto)
+    ("CAM_AUTO_EXP", "auto_exposure_priority", 1),
+    ("CAM_BRIGHTNESS", "brightness", 0),
+    ("CAM_CONTRAST", "contrast", 32),
+    ("CAM_SATURATION", "saturation", 64),
+    ("CAM_HUE", "hue", 0),
+    ("CAM_GAMMA", "gamma", 100),
+    ("CAM_GAIN", "gain", 20),
+    (None, "power_line_frequency", 2),  # 60 Hz
+    ("CAM_SHARPNESS", "sharpness", 3),
+    ("CAM_BACKLIGHT", "backlight_compensation", 1),
+)
+
+
+class ControlError(Exception):
+    """A batched control request failed; index is the offending control or None"""
+
+    def __init__(self, message, index=None, err=None):
+        super().__init__(message)
+        self.index = index
+        self.errno = err
+
+
+# --- ioctl layer ---
+
+class _ControlValue(ctypes.Union):
+    _fields_ = [("value", ctypes.c_int32), ("value64", ctypes.c_int64), ("ptr", ctypes.c_void_p)]
+
+
+class v4l2_ext_control(ctypes.Structure):
+    _pack_ = 1
+    _fields_ = [("id", ctypes.c_uint32), ("size", ctypes.c_uint32),
+                ("reserved2", ctypes.c_uint32), ("u", _ControlValue)]
+
+
+class v4l2_ext_controls(ctypes.Structure):
+    _fields_ = [("which", ctypes.c_uint32), ("count", ctypes.c_uint32),
+                ("error_idx", ctypes.c_uint32), ("request_fd", ctypes.c_int32),
+                ("reserved", ctypes.c_uint32 * 1),
+                ("controls", ctypes.POINTER(v4l2_ext_control))]
+
+
+def _iowr(type_char, nr, size):
+    """_IOWR() for the running architecture; MIPS (the MT7628) uses a
+    3-bit direction field with different read/write values"""
+    if platform.machine().startswith(("mips", "ppc", "powerpc", "sparc")):
+        return (6 << 29) | (size << 16) | (ord(type_char) << 8) | nr
+    return (3 << 30) | (size << 16) | (ord(type_char) << 8) | nr
+
+
+VIDIOC_G_EXT_CTRLS = _iowr("V", 71, ctypes.sizeof(v4l2_ext_controls))
+VIDIOC_S_EXT_CTRLS = _iowr("V", 72, ctypes.sizeof(v4l2_ext_controls))
+V4L2_CTRL_WHICH_CUR_VAL = 0
+
+
+class V4l2ControlDevice:
+    """Integer controls of a V4L2 device through one open file descriptor.
+
+    get_controls and set_controls each issue a single VIDIOC_G/S_EXT_CTRLS
+    ioctl for the whole batch. Any object with these two methods (and
+    close) can stand in for the device, see FakeControlDevice.
+    """
+
+    def __init__(self, path=DEFAULT_DEVICE):
+        self.path = path
+        self.fd = os.open(path, os.O_RDWR | os.O_NONBLOCK)
+        self.ioctls = 0
+
+    def _ext_ctrls(self, request, ids, values=None):
+        array = (v4l2_ext_control * len(ids))()
+        for i, cid in enumerate(ids):
+            array[i].id = cid
+            if values is not None:
+                array[i].u.value = values[i]
+        # error_idx stays at count unless the driver blames one control
+        batch = v4l2_ext_controls(which=V4L2_CTRL_WHICH_CUR_VAL, count=len(ids),
+                                  error_idx=len(ids), controls=array)
+        self.ioctls += 1
+        try:
+            fcntl.ioctl(self.fd, request, batch)
+        except OSError as e:
+            index = batch.error_idx if batch.error_idx < len(ids) else None
+            raise ControlError(f"{os.strerror(e.errno)} ({self.path})", index, e.errno)
+        return [array[i].u.value for i in range(len(ids))]
+
+    def get_controls(self, ids):
+        return self._ext_ctrls(VIDIOC_G_EXT_CTRLS, list(ids))
+
+    def set_controls(self, ids, values):
+        self._ext_ctrls(VIDIOC_S_EXT_CTRLS, list(ids), list(values))
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+class FakeControlDevice:
+    """In-memory stand-in for V4l2ControlDevice.
+
+    values maps control IDs to current values; IDs missing from it fail
+    like a control the camera does not have (EINVAL with error_idx).
+    """
+
+    def __init__(self, values=None):
+        self.values = dict(values or {})
+        self.ioctls = 0
+        self.writes = []
+
+    def _check(self, ids):
+        self.ioctls += 1
+        for i, cid in enumerate(ids):
+            if cid not in self.values:
+                raise ControlError(os.strerror(errno.EINVAL), i, errno.EINVAL)
+
+    def get_controls(self, ids):
+        ids = list(ids)
+        self._check(ids)
+        return [self.values[cid] for cid in ids]
+
+    def set_controls(self, ids, values):
+        ids = list(ids)
+        self._check(ids)
+        self.writes.append(dict(zip(ids, values)))
+        self.values.update(zip(ids, values))
+
+    def close(self):
+        pass
+
+
+# --- applying settings ---
+
+def desired_settings(env):
+    """[(control name, value)] in batch order from the .env variables"""
+    return [(name, default if var is None else env_int(env, var, default))
+            for var, name, default in SETTINGS]
+
+
+def read_controls(device, names):
+    """{name: current value} in one ioctl; controls the camera lacks are
+    dropped from the batch (and the result) one at a time"""
+    names = list(names)
+    while names:
+        try:
+            values = device.get_controls(V4L2_CID[n] for n in names)
+            return dict(zip(names, values))
+        except ControlError as e:
+            if e.index is None:
+                raise
+            names.pop(e.index)
+    return {}
+
+
+def apply_settings(device, settings):
+    """Write only the controls whose value differs, in one batched ioctl.
+
+    Returns (changed {name: (old, new)}, unsupported [name]). If the
+    driver rejects one control, it is reported and the rest is retried.
+    """
+    wanted = dict(settings)
+    current = read_controls(device, wanted)
+    unsupported = [name for name in wanted if name not in current]
+
+    changes = [(name, value) for name, value in settings
+               if name in current and current[name] != value]
+    changed = {}
+    while changes:
+        try:
+            device.set_controls([V4L2_CID[n] for n, _ in changes], [v for _, v in changes])
+        except ControlError as e:
+            if e.index is None:
+                raise
+            name, _ = changes.pop(e.index)
+            unsupported.append(name)
+            continue
+        changed = {name: (current[name], value) for name, value in changes}
+        break
+    return changed, unsupported
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply the CAM_* settings of .env to a UVC camera")
+    parser.add_argument("--device", default=DEFAULT_DEVICE,
+                        help=f"V4L2 device (default: {DEFAULT_DEVICE})")
+    parser.add_argument("--env", default=DEFAULT_ENV,
+                        help=f".env file with the CAM_* settings (default: {DEFAULT_ENV})")
+    parser.add_argument("--show", action="store_true",
+                        help="only print the current values")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.env):
+        print("Warning: No .env file found, using defaults")
+    settings = desired_settings(load_env(args.env))
+
+    try:
+        device = V4l2ControlDevice(args.device)
+    except OSError as e:
+        print(f"Error: cannot open {args.device}: {e.strerror}")
+        raise SystemExit(1)
+
+    try:
+        if args.show:
+            for name, value in read_controls(device, dict(settings)).items():
+                print(f"  {name} ({CONTROL_ENTITY[name]}): {value}")
+            return
+
+        print("Applying camera settings from .env file...")
+        changed, unsupported = apply_settings(device, settings)
+    except ControlError as e:
+        print(f"Error: camera settings not applied: {e}")
+        raise SystemExit(1)
+    finally:
+        device.close()
+
+    for name, (old, new) in changed.items():
+        print(f"  {name}: {old} -> {new}")
+    for name in unsupported:
+        print(f"  {name}: not supported by this camera, skipped")
+    print(f"Camera settings applied successfully ({len(changed)} changed, "
+          f"{len(settings) - len(changed) - len(unsupported)} already set, {device.ioctls} ioctls)")
+
+    values = dict(settings)
+    print(f"  Brightness: {values['brightness']}, Contrast: {values['contrast']}, Saturation: {values['saturation']}")
+    print(f"  Gamma: {values['gamma']}, Gain: {values['gain']}, Sharpness: {values['sharpness']}")
+    print(f"  Auto WB: {values['white_balance_temperature_auto']}, "
+          f"Auto Exposure Priority: {values['auto_exposure_priority']}")
+
+
+if __name__ == "__main__":
+    main()
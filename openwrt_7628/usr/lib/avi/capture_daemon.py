@@ -0,0 +1,733 @@
+#!/usr/bin/env python3
+import argparse
+import fcntl
+import http.client
+import json
+import logging
+import os
+import queue
+import shutil
+import signal
+import subprocess
+import threading
+import time
+import urllib.request
+from collections import namedtuple
+from urllib.parse import urlparse
+
+import camctl
+from audio import AUDIO_FIFO, BUFFER_SECONDS, AudioRing, record_with_arecord, wav_bytes
+from blob import BlobClient, UploadError
+from envfile import DEFAULT_ENV, env_bool, env_int, env_signature, load_env
+from influx import InfluxExporter
+from spool import SPOOL_DIR, SPOOL_MAX_MB, Spool, SpoolDrainer
+
+try:
+    from mask import MODES as MASK_MODES, PolygonMasker
+except ImportError:
+    # Without NumPy/OpenCV the polygon is drawn by ImageMagick, like u3.sh
+    MASK_MODES, PolygonMasker = ("exact",), None
+try:
+    from analytics import FrameAnalytics, parse_rois
+except ImportError:
+    FrameAnalytics = None
+try:
+    from audio_analytics import AudioAnalyzer
+except ImportError:
+    AudioAnalyzer = None
+try:
+    from change import KEYFRAME_MINUTES, ChangeDetector
+except ImportError:
+    KEYFRAME_MINUTES, ChangeDetector = 30, None
+
+LOCKFILE = "/var/lock/u3.lock"
+SNAPSHOT_URL = "http://localhost:8080/?action=snapshot"
+ANALYTICS_FILE = "/tmp/analytics.json"  # latest record, for LuCI and scripts
+
+# USB load switch of the camera (GPIO11 on OpenWrt 22.03.5)
+CAMERA_GPIO = 491
+GPIO_SETTLE = 10  # seconds after switching the camera on
+STATUS_LED = "/sys/class/leds/green:wlan/brightness"
+
+# mjpg-streamer is restarted at most this often while snapshots fail
+RESTART_BACKOFF = 60
+
+# When the raw WAV of each audio clip is uploaded; "event" means only
+# clips at least AUDIO_EVENT_DBFS loud or with clipped samples
+AUDIO_UPLOAD_MODES = ("always", "event", "never")
+
+# Parallel uploads, each on its own kept-alive connection
+UPLOAD_CONNECTIONS = 2
+
+log = logging.getLogger("capture_daemon")
+
+Config = namedtuple("Config", "interval customer camname account container sas_token uptime_ping "
+                              "influx polygon polygon_mode change_threshold keyframe_minutes analytics_enabled analytics_roi audio_enabled audio_duration audio_upload audio_event_dbfs spool_max_mb camera")
+
+
+def load_config(env):
+    """Daemon settings from the .env variables u3.sh and u3_service read"""
+    return Config(
+        interval=env_int(env, "UPLOAD_INTERVAL", 60, minimum=5, maximum=3600),
+        customer=env.get("CUSTOMER", ""),
+        camname=env.get("CAMNAME", ""),
+        account=env.get("STORAGE_ACCOUNT_NAME", ""),
+        container=env.get("CONTAINER_NAME", ""),
+        sas_token=env.get("SAS_TOKEN", ""),
+        uptime_ping=env.get("UPTIME_PING", ""),
+        influx=tuple(env.get(k, "") for k in ("INFLUX_HOST", "INFLUX_ORG", "INFLUX_BUCKET", "INFLUX_TOKEN")),
+        polygon=env.get("POLYGON", "").strip(),
+        polygon_mode=env.get("POLYGON_MODE") if env.get("POLYGON_MODE") in MASK_MODES else "exact",
+        change_threshold=env_int(env, "CHANGE_THRESHOLD", 0, minimum=0, maximum=100),
+        keyframe_minutes=env_int(env, "KEYFRAME_MINUTES", KEYFRAME_MINUTES, minimum=1, maximum=1440),
+        analytics_enabled=env_bool(env, "ANALYTICS_ENABLED"),
+        analytics_roi=env.get("ANALYTICS_ROI", "").strip(),
+        audio_enabled=env_bool(env, "AUDIO_ENABLED"),
+        audio_duration=env_int(env, "AUDIO_DURATION", 5, minimum=1, maximum=60),
+        audio_upload=env.get("AUDIO_UPLOAD") if env.get("AUDIO_UPLOAD") in AUDIO_UPLOAD_MODES else "always",
+        audio_event_dbfs=env_int(env, "AUDIO_EVENT_DBFS", -30, minimum=-120, maximum=0),
+        spool_max_mb=env_int(env, "SPOOL_MAX_MB", SPOOL_MAX_MB, minimum=1, maximum=64),
+        camera=tuple(camctl.desired_settings(env)),
+    )
+
+
+def blob_names(config, kind, ext, when):
+    """(dated, latest) blob names, in the layout u3.sh uses"""
+    date = time.strftime("%d-%m-%Y", time.gmtime(when))
+    stamp = time.strftime("%H_%M_%S", time.gmtime(when))
+    return (f"{config.customer}/{date}/{config.camname}/{kind}_{stamp}.{ext}",
+            f"{config.customer}/latest/{config.camname}.{ext}")
+
+
+class IntervalScheduler:
+    """Fixed-rate ticks on the monotonic clock.
+
+    Deadlines are anchor + n * interval, so time spent inside a cycle never
+    accumulates into drift. A cycle that overruns skips the slots it missed
+    instead of bursting to catch up.
+    """
+
+    def __init__(self, interval, clock=time.monotonic):
+        self.clock = clock
+        self.interval = interval
+        self.anchor = clock()
+        self.ticks = 0
+        self.skipped = 0
+
+    def set_interval(self, interval):
+        """Switch interval, with the next tick one new interval from now"""
+        self.interval = interval
+        self.anchor = self.clock() + interval
+        self.ticks = 0
+
+    def wait(self, stop):
+        """Sleep until the next slot; returns the lateness in seconds, or
+        None if stop (a threading.Event) was set while waiting"""
+        deadline = self.anchor + self.ticks * self.interval
+        now = self.clock()
+        if now - deadline >= self.interval:
+            missed = int((now - deadline) // self.interval)
+            self.ticks += missed
+            self.skipped += missed
+            deadline += missed * self.interval
+        if stop.wait(max(0.0, deadline - now)):
+            return None
+        self.ticks += 1
+        return self.clock() - deadline
+
+
+class Stage:
+    """Worker threads fed by a bounded queue.
+
+    When the queue is full the oldest item is evicted, so a slow stage
+    (a stalled upload) never blocks the stages before it. on_drop, if
+    given, is handed the evicted item and returns True if it kept it
+    (e.g. spooled it); only items it did not keep count as dropped.
+    """
+
+    def __init__(self, name, handler, maxsize=4, workers=1, on_drop=None):
+        self.name = name
+        self.handler = handler
+        self.on_drop = on_drop
+        self.queue = queue.Queue(maxsize)
+        self.dropped = 0
+        self.active = 0  # items being handled; workers update it under _lock
+        self._lock = threading.Lock()
+        self._threads = [threading.Thread(target=self._run, name=name if workers == 1 else f"{name}-{i}",
+                                          daemon=True) for i in range(workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, item):
+        while True:
+            try:
+                self.queue.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    oldest = self.queue.get_nowait()
+                except queue.Empty:
+                    continue
+                if self.on_drop is not None and self.on_drop(oldest):
+                    continue
+                self.dropped += 1
+                log.warning("%s: queue full, dropped oldest item", self.name)
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            with self._lock:
+                self.active += 1
+            try:
+                self.handler(item)
+            except Exception:
+                log.exception("%s failed", self.name)
+            finally:
+                with self._lock:
+                    self.active -= 1
+
+    def pending(self):
+        """Items queued or being handled"""
+        with self._lock:
+            return self.queue.qsize() + self.active
+
+    def stop(self, timeout=20.0):
+        # Sentinels wait for room behind the queued items instead of
+        # dropping them; those items still get handled (or spooled)
+        deadline = time.monotonic() + timeout
+        for _ in self._threads:
+            try:
+                self.queue.put(None, timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Full:
+                log.warning("%s: still busy, not waiting for %d queued items", self.name, self.queue.qsize())
+                break
+        for thread in self._threads:
+            thread.join(timeout)
+
+
+class SnapshotSource:
+    """JPEG snapshots from mjpg-streamer over a reused HTTP connection"""
+
+    def __init__(self, url=SNAPSHOT_URL, timeout=10):
+        parts = urlparse(url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.path = parts.path + (f"?{parts.query}" if parts.query else "")
+        self.timeout = timeout
+        self._conn = None
+
+    def fetch(self):
+        for attempt in range(2):
+            if self._conn is None:
+                self._conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            try:
+                self._conn.request("GET", self.path)
+                response = self._conn.getresponse()
+                data = response.read()
+                if response.will_close:
+                    self.close()
+                if response.status != 200 or not data:
+                    raise OSError(f"HTTP {response.status}, {len(data)} bytes")
+                return data
+            except (OSError, http.client.HTTPException):
+                # A kept-alive connection may have been closed by the server
+                self.close()
+                if attempt:
+                    raise
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+def mask_with_convert(data, polygon):
+    """Black out the POLYGON region with ImageMagick, as blacken_regions did"""
+    if not polygon:
+        return data
+    if shutil.which("convert") is None:
+        log.warning("ImageMagick not available, skipping privacy polygon")
+        return data
+    result = subprocess.run(["convert", "jpg:-", "-fill", "black", "-draw", f"polygon {polygon}", "jpg:-"],
+                            input=data, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, timeout=60)
+    if result.returncode != 0 or not result.stdout:
+        log.warning("Failed to apply privacy polygon")
+        return data
+    return result.stdout
+
+
+class CaptureDaemon:
+    """Long-running replacement for the u3.sh cycle.
+
+    The camera is powered and configured once; each tick captures a
+    snapshot on the main thread and hands it on to worker stages for
+    masking, uploading, the heartbeat and audio, so a slow upload never
+    delays the next capture. The .env file is re-read only when it changes.
+    """
+
+    def __init__(self, env_path=DEFAULT_ENV, device=camctl.DEFAULT_DEVICE, snapshot_url=SNAPSHOT_URL,
+                 blob_endpoint=None, spool_dir=SPOOL_DIR):
+        self.env_path = env_path
+        self.device = device
+        self.source = SnapshotSource(snapshot_url)
+        self.stop_event = threading.Event()
+
+        self.env_sig = None
+        self.config = None
+        self.scheduler = None
+        self.last_restart = None
+        self.failures = 0
+        self.masker = None
+        self.blob_endpoint = blob_endpoint
+        self.blob = None
+        self.exporter = None
+
+        # Uploads pushed out of a backed-up queue go to the spool like failed ones
+        self.uploads = Stage("upload", self._upload, maxsize=8, workers=UPLOAD_CONNECTIONS,
+                             on_drop=self._spool_upload)
+        self.process = Stage("process", self._process, maxsize=2)
+        self.analytics = Stage("analytics", self._analyze, maxsize=1)
+        self.analyzer = None
+        self.audio_ring = None
+        self.audio_analyzer = AudioAnalyzer() if AudioAnalyzer is not None else None
+        self.detector = None
+        self.analyzer_roi = None
+        self.heartbeat = Stage("heartbeat", self._heartbeat, maxsize=1)
+        self.audio = Stage("audio", self._audio, maxsize=1)
+        # Failed uploads wait here; the backlog goes only while current
+        # uploads are idle
+        self.spool = Spool(spool_dir)
+        self.drainer = SpoolDrainer(self.spool, self._upload_spooled, busy=self.uploads.pending)
+
+    # --- configuration ---
+
+    def reload_if_changed(self):
+        """Re-read .env if it changed; apply only what the change affects"""
+        sig = env_signature(self.env_path)
+        if sig == self.env_sig and self.config is not None:
+            return False
+        self.env_sig = sig
+        if sig is None:
+            log.error("Error: No .env file found at %s", self.env_path)
+        config = load_config(load_env(self.env_path))
+        previous, self.config = self.config, config
+        if previous == config:
+            return False
+
+        log.info("Configuration loaded for %s/%s (interval: %ss)",
+                 config.customer, config.camname, config.interval)
+        if previous is None or previous.camera != config.camera:
+            self.configure_camera()
+        if previous is None or (previous.account, previous.sas_token) != (config.account, config.sas_token):
+            # Uploads in flight finish on the old client's connections
+            self.blob = BlobClient(config.account, config.sas_token, UPLOAD_CONNECTIONS,
+                                   endpoint=self.blob_endpoint)
+        self.spool.max_bytes = config.spool_max_mb * 1024 * 1024
+        if previous is None or (previous.influx, previous.customer, previous.camname) != \
+                (config.influx, config.customer, config.camname):
+            if self.exporter is not None:
+                self.exporter.stop()
+            host = config.influx[0]
+            self.exporter = InfluxExporter(*config.influx, tags={"customer": config.customer,
+                                                                 "camera": config.camname}) if host else None
+        self.update_audio_ring(config)
+        if self.scheduler is None:
+            self.scheduler = IntervalScheduler(config.interval)
+        elif previous.interval != config.interval:
+            self.scheduler.set_interval(config.interval)
+        return True
+
+    def power_camera(self):
+        """Switch on the camera's USB load switch; waits only if it was off"""
+        gpio = f"/sys/class/gpio/gpio{CAMERA_GPIO}"
+        try:
+            with open(STATUS_LED, "w") as f:
+                f.write("0")
+        except OSError:
+            pass
+        try:
+            if not os.path.exists(gpio):
+                with open("/sys/class/gpio/export", "w") as f:
+                    f.write(str(CAMERA_GPIO))
+            with open(f"{gpio}/direction") as f:
+                output = f.read().strip() == "out"
+            with open(f"{gpio}/value") as f:
+                powered = output and f.read().strip() == "1"
+            if powered:
+                return
+            # Writing "out" would drive the pin low first and glitch a
+            # running camera; "high" sets output and level in one step
+            if output:
+                with open(f"{gpio}/value", "w") as f:
+                    f.write("1")
+            else:
+                with open(f"{gpio}/direction", "w") as f:
+                    f.write("high")
+            log.info("Camera powered on, waiting %ss for it to settle", GPIO_SETTLE)
+            self.stop_event.wait(GPIO_SETTLE)
+        except OSError as e:
+            log.warning("GPIO setup failed: %s", e)
+
+    def update_audio_ring(self, config):
+        """Keep the last seconds of the audio FIFO buffered while audio is
+        enabled, so clips are cut without waiting"""
+        ring = self.audio_ring
+        seconds = max(BUFFER_SECONDS, config.audio_duration)
+        if ring is not None and (not config.audio_enabled or ring.seconds < seconds):
+            ring.stop()
+            ring = self.audio_ring = None
+        if ring is None and config.audio_enabled:
+            self.audio_ring = AudioRing(seconds, AUDIO_FIFO)
+
+    def configure_camera(self):
+        """Apply the CAM_* settings; unchanged controls cost nothing"""
+        try:
+            device = camctl.V4l2ControlDevice(self.device)
+        except OSError as e:
+            log.warning("Camera configuration failed: cannot open %s: %s", self.device, e.strerror)
+            return
+        try:
+            changed, unsupported = camctl.apply_settings(device, self.config.camera)
+        except camctl.ControlError as e:
+            log.warning("Camera configuration failed: %s", e)
+            return
+        finally:
+            device.close()
+        for name, (old, new) in changed.items():
+            log.info("Camera %s: %s -> %s", name, old, new)
+        if unsupported:
+            log.info("Camera lacks %s", ", ".join(unsupported))
+
+    def metric(self, measurement, fields, tags=None):
+        """Queue a point for InfluxDB, if INFLUX_HOST is set"""
+        exporter = self.exporter
+        if exporter is not None:
+            exporter.point(measurement, fields, tags)
+
+    # --- stages ---
+
+    def _process(self, job):
+        when, data = job
+        config = self.config
+        if not self.scene_changed(data, config):
+            return
+        masked = self.mask_snapshot(data, config)
+        dated, latest = blob_names(config, "snapshot", "jpg", when)
+        self.uploads.submit((dated, latest, masked, "image/jpeg"))
+
+    def scene_changed(self, data, config):
+        """Whether to upload this snapshot; with CHANGE_THRESHOLD set, a
+        static scene is only uploaded every KEYFRAME_MINUTES (the
+        heartbeat still goes out every cycle)"""
+        if not config.change_threshold or ChangeDetector is None:
+            self.detector = None
+            return True
+        if self.detector is None:
+            self.detector = ChangeDetector(config.change_threshold / 100)
+        detector = self.detector
+        detector.threshold = config.change_threshold / 100
+        detector.keyframe_interval = config.keyframe_minutes * 60
+        try:
+            upload, changed, reason = detector.check(data, time.monotonic())
+        except ValueError as e:
+            log.warning("Change detection failed: %s", e)
+            return True
+        self.metric("change", {"changed": round(changed, 4), "upload": upload,
+                               "check_ms": round(detector.last_ms, 1)})
+        if not upload:
+            log.info("Scene unchanged (%.1f%% of blocks, %.1f ms), upload skipped (%d so far)",
+                     changed * 100, detector.last_ms, detector.skipped)
+        else:
+            log.debug("Uploading %s frame (%.1f%% of blocks changed)", reason, changed * 100)
+        return upload
+
+    def mask_snapshot(self, data, config):
+        """Apply the privacy polygon; on failure the snapshot goes up
+        unmasked, as with blacken_regions"""
+        if not config.polygon:
+            return data
+        if PolygonMasker is None:
+            return mask_with_convert(data, config.polygon)
+        masker = self.masker
+        try:
+            if masker is None or (masker.polygon, masker.mode) != (config.polygon, config.polygon_mode):
+                masker = self.masker = PolygonMasker(config.polygon, config.polygon_mode)
+            masked = masker.apply_jpeg(data)
+        except ValueError as e:
+            log.warning("Failed to apply privacy polygon: %s", e)
+            return data
+        timing = masker.last_timing
+        self.metric("mask", {name: round(ms, 1) for name, ms in timing.items()})
+        log.info("Privacy polygon applied in %.0f ms (decode %.0f, mask %.1f, encode %.0f)",
+                 timing["total_ms"], timing["decode_ms"], timing["mask_ms"], timing["encode_ms"])
+        return masked
+
+    def _analyze(self, job):
+        """Motion/brightness record of the unmasked snapshot, kept locally"""
+        when, data = job
+        if FrameAnalytics is None:
+            log.warning("Analytics need python3-numpy and OpenCV, skipping")
+            return
+        roi = self.config.analytics_roi
+        if self.analyzer is None or self.analyzer_roi != roi:
+            try:
+                self.analyzer = FrameAnalytics(parse_rois(roi))
+            except ValueError as e:
+                log.error("Invalid ANALYTICS_ROI: %s", e)
+                return
+            self.analyzer_roi = roi
+        try:
+            record = self.analyzer.analyze(data, when)
+        except ValueError as e:
+            log.warning("Analytics failed: %s", e)
+            return
+        color = record["color"]
+        self.metric("analytics", {"brightness": record["brightness"], "motion": record["motion"],
+                                  "b": color["b"][0], "g": color["g"][0], "r": color["r"][0],
+                                  "ms": record["ms"]})
+        for name, values in record.get("roi", {}).items():
+            self.metric("analytics", values, {"roi": name})
+        line = json.dumps(record, separators=(",", ":"))
+        log.info("Analytics: %s", line)
+        tmp = ANALYTICS_FILE + ".tmp"
+        try:
+            with open(tmp, "w") as f:
+                f.write(line + "\n")
+            os.replace(tmp, ANALYTICS_FILE)
+        except OSError as e:
+            log.warning("Cannot write %s: %s", ANALYTICS_FILE, e)
+
+    def _upload(self, job):
+        blob_name, latest, data, content_type = job
+        container = self.config.container
+        start = time.monotonic()
+        try:
+            self.blob.put_blob(container, blob_name, data, content_type)
+        except UploadError as e:
+            log.error("%s", e)
+            self.metric("upload", {"ok": False, "bytes": len(data), "ms": round((time.monotonic() - start) * 1000)},
+                        {"type": content_type})
+            self._spool_upload(job, container)
+            return
+        if len(self.spool):
+            self.drainer.wake(reset_backoff=True)
+        try:
+            copied = self.blob.copy_or_put(container, blob_name, latest, data, content_type)
+        except UploadError as e:
+            log.error("%s", e)
+            return
+        elapsed = (time.monotonic() - start) * 1000
+        self.metric("upload", {"ok": True, "bytes": len(data), "ms": round(elapsed), "copied": copied},
+                    {"type": content_type})
+        log.info("Upload successful: %s (%d bytes, %s %s, %.0f ms)", blob_name, len(data),
+                 "copied to" if copied else "uploaded", latest, elapsed)
+
+    def _spool_upload(self, job, container=None):
+        """Keep an upload job that could not be sent for the drainer;
+        True if it was spooled"""
+        blob_name, _, data, content_type = job
+        meta = {"container": container or self.config.container, "blob_name": blob_name,
+                "content_type": content_type}
+        spooled = self.spool.put(meta, data)
+        if spooled:
+            log.info("Spooled %s for a later upload (%d waiting)", blob_name, len(self.spool))
+        self.drainer.wake()
+        return spooled
+
+    def _upload_spooled(self, meta, data):
+        """Catch-up upload of a spooled item; latest/ is left to current ones"""
+        self.blob.put_blob(meta["container"], meta["blob_name"], data, meta["content_type"])
+        log.info("Spooled upload successful: %s", meta["blob_name"])
+
+    def _heartbeat(self, size):
+        if not self.config.uptime_ping:
+            return
+        try:
+            with urllib.request.urlopen(f"{self.config.uptime_ping}{size}bytes", timeout=5) as response:
+                response.read()
+        except OSError as e:
+            log.warning("Heartbeat failed: %s", e)
+
+    def _audio(self, when):
+        config = self.config
+        ring = self.audio_ring
+        if not os.path.exists(AUDIO_FIFO) or ring is None:
+            log.warning("Audio pipe not available, using fallback recording")
+            pcm = record_with_arecord(config.audio_duration)
+        else:
+            # Right after start the ring may not hold a whole clip yet
+            missing = config.audio_duration - ring.available()
+            if missing > 0:
+                self.stop_event.wait(missing + 0.2)
+            pcm = ring.pcm(config.audio_duration)
+        if not pcm:
+            log.error("Audio recording failed")
+            return
+        log.info("Audio recording completed: %d bytes", len(pcm))
+
+        features = self.audio_features(pcm, when)
+        if features is not None:
+            dated, latest = blob_names(config, "audio", "json", when)
+            self.uploads.submit((dated, latest, json.dumps(features, separators=(",", ":")).encode(),
+                                 "application/json"))
+
+        upload = config.audio_upload
+        if upload == "event" and features is not None:
+            upload = "always" if features["rms_dbfs"] >= config.audio_event_dbfs or features["clipped"] \
+                else "never"
+        if upload != "never":
+            dated, latest = blob_names(config, "audio", "wav", when)
+            self.uploads.submit((dated, latest, wav_bytes(pcm), "audio/wav"))
+
+    def audio_features(self, pcm, when):
+        """Level and band features of a clip, or None without NumPy"""
+        if self.audio_analyzer is None:
+            return None
+        try:
+            features = self.audio_analyzer.analyze(pcm, when)
+        except ValueError as e:
+            log.warning("Audio analytics failed: %s", e)
+            return None
+        log.info("Audio level %.1f dBFS (peak %.1f, %d clipped) in %.0f ms", features["rms_dbfs"],
+                 features["peak_dbfs"], features["clipped"], features["ms"])
+        fields = {"rms_dbfs": features["rms_dbfs"], "peak_dbfs": features["peak_dbfs"],
+                  "clipped": features["clipped"], "ms": features["ms"]}
+        fields.update((f"band_{c}", level) for c, level in features.get("bands", {}).items())
+        self.metric("audio", fields)
+        return features
+
+    # --- main loop ---
+
+    def cycle(self):
+        when = time.time()
+        if self.config.audio_enabled:
+            self.audio.submit(when)
+
+        start = time.monotonic()
+        try:
+            data = self.source.fetch()
+        except (OSError, http.client.HTTPException) as e:
+            self.failures += 1
+            log.error("Snapshot capture failed (%s)", e)
+            self.metric("snapshot", {"ok": False, "failures": self.failures})
+            self.restart_streamer()
+            return False
+        self.failures = 0
+        elapsed = (time.monotonic() - start) * 1000
+        log.info("Snapshot captured successfully: %d bytes in %.0f ms", len(data), elapsed)
+        self.metric("snapshot", {"ok": True, "bytes": len(data), "ms": round(elapsed)})
+
+        spool = self.drainer.metrics()
+        self.metric("spool", spool)
+        if spool["depth"]:
+            log.info("Spool: %s", " ".join(f"{k}={v}" for k, v in spool.items()))
+
+        # Only send heartbeat if capture succeeds
+        self.heartbeat.submit(len(data))
+        self.process.submit((when, data))
+        if self.config.analytics_enabled:
+            self.analytics.submit((when, data))
+        return True
+
+    def restart_streamer(self):
+        now = time.monotonic()
+        if self.last_restart is not None and now - self.last_restart < RESTART_BACKOFF:
+            return
+        self.last_restart = now
+        log.error("Restarting mjpg-streamer")
+        subprocess.run(["/etc/init.d/mjpg-streamer", "restart"],
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        # A restarted streamer re-opens the device; settings are re-checked
+        self.configure_camera()
+
+    def run(self, cycles=None):
+        self.power_camera()
+        self.reload_if_changed()
+        done = 0
+        while cycles is None or done < cycles:
+            late = self.scheduler.wait(self.stop_event)
+            if late is None:
+                break
+            if late > 1.0:
+                log.warning("Cycle started %.1fs late", late)
+            self.metric("cycle", {"late_ms": round(late * 1000), "skipped": self.scheduler.skipped,
+                                  "dropped": sum(stage.dropped for stage in self.stages())})
+            self.reload_if_changed()
+            self.cycle()
+            done += 1
+        self.shutdown()
+
+    def stages(self):
+        """Worker stages in pipeline order"""
+        return self.audio, self.analytics, self.process, self.heartbeat, self.uploads
+
+    def shutdown(self):
+        # Finish queued work in pipeline order
+        for stage in self.stages():
+            stage.stop()
+        self.drainer.stop()
+        if self.audio_ring is not None:
+            self.audio_ring.stop()
+        if self.exporter is not None:
+            self.exporter.stop()
+        self.source.close()
+        if self.blob is not None:
+            self.blob.close()
+
+    def request_reload(self, *_):
+        self.env_sig = None
+
+    def request_stop(self, *_):
+        self.stop_event.set()
+
+
+def acquire_lock(path=LOCKFILE):
+    """Exclusive lock shared with u3.sh, so only one of them runs"""
+    f = open(path, "w")
+    try:
+        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        f.close()
+        return None
+    return f
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Camera capture and upload daemon")
+    parser.add_argument("--env", default=DEFAULT_ENV,
+                        help=f"settings file (default: {DEFAULT_ENV})")
+    parser.add_argument("--device", default=camctl.DEFAULT_DEVICE,
+                        help=f"V4L2 device for the camera controls (default: {camctl.DEFAULT_DEVICE})")
+    parser.add_argument("--snapshot-url", default=SNAPSHOT_URL,
+                        help=f"snapshot URL of mjpg-streamer (default: {SNAPSHOT_URL})")
+    parser.add_argument("--blob-endpoint", default=None,
+                        help="Blob service URL instead of the account's, e.g. a local blob_sim.py")
+    parser.add_argument("--spool-dir", default=SPOOL_DIR,
+                        help=f"where failed uploads wait (default: {SPOOL_DIR})")
+    parser.add_argument("--lockfile", default=LOCKFILE,
+                        help=f"lock shared with u3.sh (default: {LOCKFILE})")
+    parser.add_argument("--cycles", type=int, default=None,
+                        help="exit after this many cycles (default: run until stopped)")
+    parser.add_argument("-v", "--verbose", action="store_true",
+                        help="log debug messages")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO,
+                        format="%(threadName)s: %(message)s")
+
+    lock = acquire_lock(args.lockfile)
+    if lock is None:
+        log.warning("Another instance is running, exiting")
+        raise SystemExit(1)
+
+    daemon = CaptureDaemon(args.env, args.device, args.snapshot_url, args.blob_endpoint, args.spool_dir)
+    signal.signal(signal.SIGTERM, daemon.request_stop)
+    signal.signal(signal.SIGINT, daemon.request_stop)
+    signal.signal(signal.SIGHUP, daemon.request_reload)
+    daemon.run(args.cycles)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+# Frames are compared as GRID block means of a 1/8-scale grey decode
+GRID = (16, 16)
+BLOCK_DELTA = 8  # grey levels a block mean must move to count as changed
+KEYFRAME_MINUTES = 30
+
+
+def block_means(data, grid=GRID):
+    """uint8 grid of block means of a JPEG, from libjpeg's 1/8 decode"""
+    gray = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_8)
+    if gray is None:
+        raise ValueError("snapshot is not a decodable JPEG")
+    return cv2.resize(gray, grid, interpolation=cv2.INTER_AREA)
+
+
+def changed_fraction(a, b, delta=BLOCK_DELTA):
+    """Fraction of blocks whose mean differs by more than delta"""
+    return cv2.countNonZero(cv2.threshold(cv2.absdiff(a, b), delta, 255, cv2.THRESH_BINARY)[1]) / a.size
+
+
+class ChangeDetector:
+    """Decides whether a snapshot differs enough from the last uploaded one.
+
+    A frame is uploaded when more than threshold (a fraction) of its
+    block means moved by over delta grey levels since the last uploaded
+    frame, and in any case once every keyframe_interval seconds, so a
+    static scene still gets a fresh image now and then. Only uploaded
+    frames become the new reference, so slow drifts add up until they
+    count.
+    """
+
+    def __init__(self, threshold, keyframe_interval=KEYFRAME_MINUTES * 60, delta=BLOCK_DELTA, grid=GRID):
+        self.threshold = threshold
+        self.keyframe_interval = keyframe_interval
+        self.delta = delta
+        self.grid = grid
+        self.reference = None
+        self.reference_time = None
+        self.last_ms = 0.0
+        self.skipped = 0
+
+    def check(self, data, now):
+        """(upload, changed fraction, reason) for a snapshot taken at now
+        (monotonic seconds); reason is first, keyframe, changed or static"""
+        start = time.perf_counter()
+        means = block_means(data, self.grid)
+        changed = 1.0 if self.reference is None else changed_fraction(means, self.reference, self.delta)
+        self.last_ms = (time.perf_counter() - start) * 1000
+
+        if self.reference is None:
+            reason = "first"
+        elif changed > self.threshold:
+            reason = "changed"
+        elif now - self.reference_time >= self.keyframe_interval:
+            reason = "keyframe"
+        else:
+            self.skipped += 1
+            return False, changed, "static"
+        self.reference = means
+        self.reference_time = now
+        return True, changed, reason
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Which snapshots of a sequence would be uploaded")
+    parser.add_argument("images", nargs="+", help="snapshots, in capture order")
+    parser.add_argument("--threshold", type=float, default=5.0,
+                        help="percent of blocks that must change (default: 5)")
+    parser.add_argument("--delta", type=int, default=BLOCK_DELTA,
+                        help=f"grey levels a block must change by (default: {BLOCK_DELTA})")
+    parser.add_argument("--interval", type=float, default=60.0,
+                        help="seconds between snapshots, for the keyframe timing (default: 60)")
+    parser.add_argument("--keyframe-minutes", type=float, default=KEYFRAME_MINUTES,
+                        help=f"upload at least this often (default: {KEYFRAME_MINUTES})")
+    args = parser.parse_args()
+
+    detector = ChangeDetector(args.threshold / 100, args.keyframe_minutes * 60, args.delta)
+    uploaded = 0
+    for i, path in enumerate(args.images):
+        with open(path, "rb") as f:
+            upload, changed, reason = detector.check(f.read(), i * args.interval)
+        uploaded += upload
+        print(f"{path}: {changed * 100:5.1f}% changed, {reason:8s} ({detector.last_ms:.1f} ms)")
+    print(f"{uploaded}/{len(args.images)} uploaded")
+
+
+if __name__ == "__main__":
+    main()
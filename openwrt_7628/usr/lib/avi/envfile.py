@@ -0,0 +1,76 @@
+import os
+
+DEFAULT_ENV = "/root/.env"
+
+
+def parse_env(text):
+    """Variables of a shell-style .env file as a dict of strings.
+
+    Handles the subset the scripts in /bin rely on when they source the
+    file: KEY=value lines, optional 'export', single or double quotes and
+    trailing comments. Variables are not expanded.
+    """
+    env = {}
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        if line.startswith("export "):
+            line = line[7:].lstrip()
+        key, sep, value = line.partition("=")
+        key = key.strip()
+        if not sep or not key.isidentifier():
+            continue
+
+        value = value.strip()
+        if value[:1] in ("'", '"'):
+            end = value.find(value[0], 1)
+            value = value[1:end] if end > 0 else value[1:]
+        else:
+            # An unquoted '#' starts a comment only after whitespace
+            for i, ch in enumerate(value):
+                if ch == "#" and (i == 0 or value[i - 1].isspace()):
+                    value = value[:i].rstrip()
+                    break
+        env[key] = value
+    return env
+
+
+def load_env(path=DEFAULT_ENV):
+    """Parse the .env file at path; missing file gives an empty dict"""
+    try:
+        with open(path) as f:
+            return parse_env(f.read())
+    except FileNotFoundError:
+        return {}
+
+
+def env_int(env, key, default, minimum=None, maximum=None):
+    """Integer setting with the fallback and clamping u3_service applies"""
+    try:
+        value = int(env.get(key, ""))
+    except ValueError:
+        return default
+    if minimum is not None:
+        value = max(minimum, value)
+    if maximum is not None:
+        value = min(maximum, value)
+    return value
+
+
+def env_bool(env, key, default=False):
+    """Boolean setting; like u3.sh's [ "$X" = "true" ], only the literal
+    lowercase "true" enables it"""
+    value = env.get(key, "")
+    if not value:
+        return default
+    return value == "true"
+
+
+def env_signature(path=DEFAULT_ENV):
+    """(mtime, size, inode) of the .env file, cheap to poll for changes"""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_mtime_ns, st.st_size, st.st_ino
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+import argparse
+import gzip
+import http.client
+import logging
+import threading
+import time
+from collections import deque
+from urllib.parse import urlencode, urlparse
+
+from envfile import DEFAULT_ENV, load_env
+
+CAPACITY = 2000  # points kept while InfluxDB is unreachable
+BATCH_SIZE = 500
+FLUSH_INTERVAL = 30  # seconds
+RETRY_MIN, RETRY_MAX = 30, 600  # seconds between writes after a failure
+
+log = logging.getLogger("influx")
+
+
+def _escape(text, chars):
+    text = str(text).replace("\\", "\\\\")
+    for c in chars:
+        text = text.replace(c, "\\" + c)
+    return text
+
+
+def _field_value(value):
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, int):
+        return f"{value}i"
+    if isinstance(value, float):
+        return repr(value)
+    return '"' + _escape(value, '"') + '"'
+
+
+def line(measurement, fields, tags=None, timestamp_ms=None):
+    """One point in InfluxDB line protocol with millisecond precision;
+    fields that are None are left out"""
+    key = _escape(measurement, ", ")
+    for name, value in sorted((tags or {}).items()):
+        if value != "":
+            key += f",{_escape(name, ',= ')}={_escape(value, ',= ')}"
+    body = ",".join(f"{_escape(name, ',= ')}={_field_value(value)}"
+                    for name, value in fields.items() if value is not None)
+    if timestamp_ms is None:
+        timestamp_ms = int(time.time() * 1000)
+    return f"{key} {body} {timestamp_ms}"
+
+
+class InfluxExporter:
+    """Buffers metric points and writes them to InfluxDB 2 in batches.
+
+    point() only formats a line into a fixed-size ring buffer; a
+    background thread sends up to batch_size lines per gzip-compressed
+    write every flush_interval seconds (sooner once a batch is full)
+    over one kept-alive connection. When the buffer is full the oldest
+    point is dropped and counted. A failed write keeps its points, and
+    the next attempt waits RETRY_MIN seconds, doubling per failure up to
+    RETRY_MAX, so an outage costs one request and log line per retry
+    rather than per point.
+    """
+
+    def __init__(self, host, org, bucket, token, tags=None, capacity=CAPACITY, batch_size=BATCH_SIZE,
+                 flush_interval=FLUSH_INTERVAL, timeout=15):
+        url = host if "://" in host else f"https://{host}"
+        parts = urlparse(url)
+        self._https = parts.scheme == "https"
+        self._host = parts.hostname
+        self._port = parts.port
+        self._path = parts.path.rstrip("/") + "/api/v2/write?" + urlencode(
+            {"org": org, "bucket": bucket, "precision": "ms"})
+        self._headers = {
+            "Authorization": f"Token {token}",
+            "Content-Type": "text/plain; charset=utf-8",
+            "Content-Encoding": "gzip",
+        }
+        self.tags = dict(tags or {})
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.timeout = timeout
+        self._buffer = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+        self._conn = None
+        self.dropped = 0
+        self.sent = 0
+        self.requests = 0
+        self.failures = 0
+        self.bytes_sent = 0
+        self._retry_delay = 0
+        self._retry_at = 0.0  # monotonic time before which no write is tried
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="influx", daemon=True)
+        self._thread.start()
+
+    def point(self, measurement, fields, tags=None, timestamp_ms=None):
+        text = line(measurement, fields, dict(self.tags, **(tags or {})), timestamp_ms)
+        with self._lock:
+            if len(self._buffer) == self._buffer.maxlen:
+                self.dropped += 1
+            self._buffer.append(text)
+            full = len(self._buffer) >= self.batch_size
+        if full and time.monotonic() >= self._retry_at:
+            self._wake.set()
+
+    def _connect(self):
+        if self._https:
+            return http.client.HTTPSConnection(self._host, self._port, timeout=self.timeout)
+        return http.client.HTTPConnection(self._host, self._port, timeout=self.timeout)
+
+    def _write(self, body):
+        """POST one compressed batch, reconnecting once if the kept-alive
+        connection was closed while idle"""
+        for attempt in (0, 1):
+            fresh = self._conn is None
+            if fresh:
+                self._conn = self._connect()
+            try:
+                self._conn.request("POST", self._path, body=body,
+                                   headers=dict(self._headers, **{"Content-Length": str(len(body))}))
+                response = self._conn.getresponse()
+                detail = response.read()[:200]
+            except (OSError, http.client.HTTPException):
+                self._conn.close()
+                self._conn = None
+                if fresh or attempt:
+                    raise
+                continue
+            self.requests += 1
+            if response.will_close:
+                self._conn.close()
+                self._conn = None
+            return response.status, detail
+
+    def flush(self):
+        """Send everything buffered; returns False if a write failed"""
+        while True:
+            with self._lock:
+                batch = [self._buffer.popleft() for _ in range(min(self.batch_size, len(self._buffer)))]
+            if not batch:
+                return True
+            body = gzip.compress("\n".join(batch).encode() + b"\n", compresslevel=6)
+            try:
+                status, detail = self._write(body)
+            except (OSError, http.client.HTTPException) as e:
+                status, detail = None, str(e)
+            if status is not None and status < 300:
+                self._retry_delay = 0
+                self._retry_at = 0.0
+                self.sent += len(batch)
+                self.bytes_sent += len(body)
+                continue
+            self.failures += 1
+            self._retry_delay = min(RETRY_MAX, max(RETRY_MIN, self._retry_delay * 2))
+            self._retry_at = time.monotonic() + self._retry_delay
+            log.warning("InfluxDB write failed (%s): %s; retrying in %ds", status or "no response", detail,
+                        self._retry_delay)
+            if status is not None and 400 <= status < 500 and status != 429:
+                log.warning("Dropping %d points InfluxDB refused", len(batch))
+                self.dropped += len(batch)
+                return False
+            with self._lock:
+                # Put the batch back in front; if newer points filled the
+                # buffer meanwhile, the oldest of the batch are dropped
+                room = self._buffer.maxlen - len(self._buffer)
+                keep = batch[-room:] if room else []
+                self.dropped += len(batch) - len(keep)
+                self._buffer.extendleft(reversed(keep))
+            return False
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(max(self.flush_interval, self._retry_at - time.monotonic()))
+            self._wake.clear()
+            if time.monotonic() >= self._retry_at or self._stop.is_set():
+                self.flush()
+
+    def stop(self, timeout=20.0):
+        self._stop.set()
+        self._wake.set()
+        self._thread.join(timeout)
+        self.flush()
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+def exporter_from_env(env, **kwargs):
+    """An InfluxExporter for the INFLUX_* settings, or None if unset"""
+    host = env.get("INFLUX_HOST", "")
+    if not host:
+        return None
+    return InfluxExporter(host, env.get("INFLUX_ORG", ""), env.get("INFLUX_BUCKET", ""),
+                          env.get("INFLUX_TOKEN", ""), **kwargs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write test points to the InfluxDB of the .env settings")
+    parser.add_argument("--env", default=DEFAULT_ENV,
+                        help=f"settings file (default: {DEFAULT_ENV})")
+    parser.add_argument("--host", default=None,
+                        help="InfluxDB URL instead of INFLUX_HOST, e.g. a local influx_sim.py")
+    parser.add_argument("--points", type=int, default=1000,
+                        help="number of points to send (default: 1000)")
+    args = parser.parse_args()
+
+    env = load_env(args.env)
+    if args.host:
+        env["INFLUX_HOST"] = args.host
+    exporter = exporter_from_env(env, tags={"customer": env.get("CUSTOMER", ""),
+                                             "camera": env.get("CAMNAME", "")})
+    if exporter is None:
+        print("Error: INFLUX_HOST is not set")
+        raise SystemExit(1)
+
+    start = time.monotonic()
+    for i in range(args.points):
+        exporter.point("test", {"value": i, "elapsed": time.monotonic() - start})
+    exporter.stop()
+    print(f"{exporter.sent} points sent in {exporter.requests} requests ({exporter.bytes_sent} bytes), "
+          f"{exporter.dropped} dropped, {exporter.failures} failed writes, {time.monotonic() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
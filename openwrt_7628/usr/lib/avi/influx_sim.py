@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+import argparse
+import gzip
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class InfluxStandIn(ThreadingHTTPServer):
+    """Local stand-in for the InfluxDB 2 write API, for trying out exports.
+
+    Accepts POST /api/v2/write with plain or gzip bodies, keeps the
+    received lines in memory and counts connections and requests.
+    status, if set, is returned instead of 204 (e.g. 503 for an outage).
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address, status=None):
+        super().__init__(address, _Handler)
+        self.status = status
+        self.lines = []
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.requests = 0
+        self.bytes_received = 0
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status):
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        server = self.server
+        with server.lock:
+            server.requests += 1
+            server.bytes_received += len(body)
+        if url.path != "/api/v2/write" or "bucket" not in parse_qs(url.query):
+            self._reply(404)
+            return
+        if server.status:
+            self._reply(server.status)
+            return
+        if self.headers.get("Content-Encoding") == "gzip":
+            body = gzip.decompress(body)
+        with server.lock:
+            server.lines.extend(body.decode().splitlines())
+        self._reply(204)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the InfluxDB write API")
+    parser.add_argument("--port", type=int, default=8086,
+                        help="port to listen on (default: 8086)")
+    parser.add_argument("--print", action="store_true",
+                        help="print every received line at exit")
+    args = parser.parse_args()
+
+    server = InfluxStandIn(("127.0.0.1", args.port))
+    print(f"InfluxDB stand-in at http://127.0.0.1:{args.port}, Ctrl+C to stop")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    if args.print:
+        print("\n".join(server.lines))
+    print(f"{len(server.lines)} lines, {server.requests} requests, "
+          f"{server.connections} connections, {server.bytes_received} bytes received")
+
+
+if __name__ == "__main__":
+    main()
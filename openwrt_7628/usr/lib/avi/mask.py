@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+import argparse
+import struct
+import time
+
+import cv2
+import numpy as np
+
+# IJG standard luminance quantisation table (quality 50), in zigzag order
+# like the DQT segment stores it
+STD_LUMINANCE_QT = (
+    16, 11, 12, 14, 12, 10, 16, 14, 13, 14, 18, 17, 16, 19, 24, 40,
+    26, 24, 22, 22, 24, 49, 35, 37, 29, 40, 58, 51, 61, 60, 57, 51,
+    56, 55, 64, 72, 92, 78, 64, 68, 87, 69, 55, 56, 80, 109, 81, 87,
+    95, 98, 103, 104, 103, 62, 77, 113, 121, 112, 100, 120, 92, 101, 103, 99,
+)
+
+# Re-encode quality when the snapshot's tables are not IJG-scaled
+DEFAULT_QUALITY = 85
+
+MODES = ("exact", "mcu")
+
+
+def parse_polygons(text):
+    """Polygons of a POLYGON value as int32 point arrays.
+
+    One polygon is "x1,y1 x2,y2 x3,y3 ..." as convert -draw takes it;
+    several are separated by ';'. Raises ValueError on malformed input.
+    """
+    polygons = []
+    for part in text.split(";"):
+        points = []
+        for pair in part.split():
+            x, sep, y = pair.partition(",")
+            if not sep:
+                raise ValueError(f"bad point {pair!r}, expected x,y")
+            points.append((int(float(x)), int(float(y))))
+        if not points:
+            continue
+        if len(points) < 3:
+            raise ValueError(f"polygon {part.strip()!r} needs at least 3 points")
+        polygons.append(np.array(points, dtype=np.int32))
+    return polygons
+
+
+def jpeg_info(data):
+    """(width, height, mcu (w, h), quality) from a JPEG's headers.
+
+    The MCU size follows the luma sampling factors (16x16 for 4:2:0,
+    16x8 for 4:2:2, 8x8 for 4:4:4). quality is the IJG quality the luma
+    table was scaled for, or None if it is not a scaled standard table.
+    Returns None if data is not a JPEG with a frame header.
+    """
+    if data[:2] != b"\xff\xd8":
+        return None
+    quality = None
+    pos = 2
+    while pos + 4 <= len(data):
+        if data[pos] != 0xFF:
+            return None
+        marker = data[pos + 1]
+        if marker == 0xFF:  # fill byte
+            pos += 1
+            continue
+        length = struct.unpack_from(">H", data, pos + 2)[0]
+        segment = data[pos + 4:pos + 2 + length]
+        if marker == 0xDB:
+            quality = _dqt_quality(segment) if quality is None else quality
+        elif marker in (0xC0, 0xC1, 0xC2):
+            height, width = struct.unpack_from(">HH", segment, 1)
+            sampling = segment[7] if segment[5] > 1 else 0x11
+            return width, height, (8 * (sampling >> 4), 8 * (sampling & 0x0F)), quality
+        elif marker == 0xDA:
+            return None
+        pos += 2 + length
+    return None
+
+
+def _dqt_quality(segment):
+    """IJG quality of table 0 in a DQT segment, by inverting its scaling"""
+    pos = 0
+    while pos < len(segment):
+        precision, table_id = segment[pos] >> 4, segment[pos] & 0x0F
+        size = 128 if precision else 64
+        if table_id == 0:
+            fmt = ">64H" if precision else "64B"
+            table = struct.unpack_from(fmt, segment, pos + 1)
+            scale = sum(table) * 100.0 / sum(STD_LUMINANCE_QT)
+            if scale <= 0:
+                return None
+            quality = (200 - scale) / 2 if scale <= 100 else 5000 / scale
+            return int(round(min(100, max(1, quality))))
+        pos += 1 + size
+    return None
+
+
+class PolygonMasker:
+    """Blacks out the POLYGON regions of snapshots.
+
+    The polygons are rasterised once per (POLYGON, resolution, MCU grid)
+    into an inverted 3-channel mask, and each frame is then masked with a
+    single bitwise AND. In "mcu" mode the mask is widened to every JPEG
+    MCU the polygons touch, so masked blocks are entirely black (one DC
+    value, no ringing of the hidden content across the polygon edge) and
+    the re-encoded blocks line up with the snapshot's.
+    """
+
+    def __init__(self, polygon, mode="exact"):
+        if mode not in MODES:
+            raise ValueError(f"unknown mask mode {mode!r}")
+        self.polygon = polygon
+        self.polygons = parse_polygons(polygon)
+        self.mode = mode
+        self._keep = {}
+        self.last_timing = {}
+
+    def keep_mask(self, height, width, mcu=(8, 8)):
+        """uint8 HxWx3 mask: 255 where the image is kept, 0 where blacked"""
+        key = (height, width, mcu if self.mode == "mcu" else None)
+        keep = self._keep.get(key)
+        if keep is None:
+            hidden = np.zeros((height, width), np.uint8)
+            cv2.fillPoly(hidden, self.polygons, 255)
+            if self.mode == "mcu":
+                mw, mh = mcu
+                rows, cols = -(-height // mh), -(-width // mw)
+                padded = np.zeros((rows * mh, cols * mw), np.uint8)
+                padded[:height, :width] = hidden
+                touched = padded.reshape(rows, mh, cols, mw).max(axis=(1, 3))
+                hidden = np.repeat(np.repeat(touched, mh, axis=0), mw, axis=1)[:height, :width]
+            keep = cv2.cvtColor(cv2.bitwise_not(hidden), cv2.COLOR_GRAY2BGR)
+            self._keep[key] = keep
+        return keep
+
+    def apply(self, image, mcu=(8, 8)):
+        """Black out the polygons in a BGR image, in place"""
+        keep = self.keep_mask(image.shape[0], image.shape[1], mcu)
+        cv2.bitwise_and(image, keep, dst=image)
+        return image
+
+    def apply_jpeg(self, data, quality=None):
+        """Masked copy of a JPEG snapshot, re-encoded at its own quality.
+
+        Per-stage times in ms are left in last_timing.
+        """
+        start = time.perf_counter()
+        info = jpeg_info(data)
+        image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+        if image is None:
+            raise ValueError("snapshot is not a decodable JPEG")
+        decoded = time.perf_counter()
+
+        mcu = info[2] if info else (16, 16)
+        self.apply(image, mcu)
+        masked = time.perf_counter()
+
+        if quality is None:
+            quality = info[3] if info and info[3] else DEFAULT_QUALITY
+        ok, encoded = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        if not ok:
+            raise ValueError("JPEG encoding failed")
+        done = time.perf_counter()
+
+        self.last_timing = {
+            "decode_ms": (decoded - start) * 1000,
+            "mask_ms": (masked - decoded) * 1000,
+            "encode_ms": (done - masked) * 1000,
+            "total_ms": (done - start) * 1000,
+        }
+        return encoded.tobytes()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Black out POLYGON regions of a JPEG snapshot")
+    parser.add_argument("input", help="JPEG snapshot")
+    parser.add_argument("output", help="masked JPEG to write")
+    parser.add_argument("--polygon", required=True,
+                        help='"x1,y1 x2,y2 x3,y3 ..."; separate several polygons with ";"')
+    parser.add_argument("--mode", choices=MODES, default="exact",
+                        help="exact polygon or whole JPEG MCU blocks (default: exact)")
+    parser.add_argument("--quality", type=int, default=None,
+                        help="JPEG quality (default: that of the input)")
+    parser.add_argument("--repeat", type=int, default=1,
+                        help="mask this many times and report the mean time per frame")
+    args = parser.parse_args()
+
+    with open(args.input, "rb") as f:
+        data = f.read()
+    masker = PolygonMasker(args.polygon, args.mode)
+
+    totals = {}
+    for _ in range(args.repeat):
+        result = masker.apply_jpeg(data, args.quality)
+        for name, ms in masker.last_timing.items():
+            totals[name] = totals.get(name, 0.0) + ms
+    with open(args.output, "wb") as f:
+        f.write(result)
+
+    info = jpeg_info(data)
+    if info:
+        print(f"{info[0]}x{info[1]}, MCU {info[2][0]}x{info[2][1]}, quality {info[3]}")
+    print("Time per frame: " + ", ".join(f"{name[:-3]} {total / args.repeat:.1f} ms"
+                                         for name, total in totals.items()))
+
+
+if __name__ == "__main__":
+    main()
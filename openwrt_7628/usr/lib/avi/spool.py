@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+import argparse
+import itertools
+import json
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+
+SPOOL_DIR = "/tmp/spool"  # tmpfs: survives a network outage, not a reboot
+SPOOL_MAX_MB = 8
+
+# Catch-up uploads: at most DRAIN_WORKERS at once and DRAIN_RATE per second,
+# retried after BACKOFF_MIN doubling up to BACKOFF_MAX while they fail
+DRAIN_WORKERS = 2
+DRAIN_RATE = 1.0
+BACKOFF_MIN = 5.0
+BACKOFF_MAX = 600.0
+
+log = logging.getLogger("spool")
+
+
+class Spool:
+    """Bounded on-disk queue of uploads that could not be sent.
+
+    Each item is one file holding a JSON header line and the payload,
+    written under a temporary name and renamed into place, so a crash
+    never leaves a partial item. Names sort by age; when the spool would
+    exceed max_bytes the oldest items are evicted.
+    """
+
+    def __init__(self, directory=SPOOL_DIR, max_bytes=SPOOL_MAX_MB * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._items = deque()  # (name, size), oldest first
+        self._claimed = set()
+        self._seq = itertools.count()  # keeps names of simultaneous puts apart
+        self.bytes = 0
+        self.spooled = 0
+        self.evicted = 0
+        os.makedirs(directory, exist_ok=True)
+        for name in sorted(os.listdir(directory)):
+            path = os.path.join(directory, name)
+            if name.endswith(".tmp"):
+                os.unlink(path)  # interrupted write
+            elif name.endswith(".item"):
+                size = os.path.getsize(path)
+                self._items.append((name, size))
+                self.bytes += size
+
+    def __len__(self):
+        return len(self._items)
+
+    def put(self, meta, data):
+        """Store data with its meta dict; returns False if it cannot fit"""
+        header = json.dumps(meta).encode() + b"\n"
+        size = len(header) + len(data)
+        if size > self.max_bytes:
+            return False
+        with self._lock:
+            name = f"{time.time_ns():020d}-{next(self._seq):06d}.item"
+        tmp = os.path.join(self.directory, name + ".tmp")
+        try:
+            with open(tmp, "wb") as f:
+                f.write(header)
+                f.write(data)
+            os.replace(tmp, os.path.join(self.directory, name))
+        except OSError as e:
+            log.error("Spool write failed: %s", e)
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            return False
+        with self._lock:
+            self._items.append((name, size))
+            self.bytes += size
+            self.spooled += 1
+            while self.bytes > self.max_bytes and self._evict_oldest():
+                pass
+        return True
+
+    def _evict_oldest(self):
+        """Drop the oldest item not being uploaded; False if there is none"""
+        for i, (name, size) in enumerate(self._items):
+            if name not in self._claimed:
+                del self._items[i]
+                self._remove(name, size)
+                self.evicted += 1
+                log.warning("Spool full, dropped %s", name)
+                return True
+        return False
+
+    def _remove(self, name, size):
+        self.bytes -= size
+        try:
+            os.unlink(os.path.join(self.directory, name))
+        except FileNotFoundError:
+            pass
+
+    def claim(self, count):
+        """Up to count of the oldest unclaimed item names, marked in flight"""
+        with self._lock:
+            names = [name for name, _ in self._items if name not in self._claimed][:count]
+            self._claimed.update(names)
+        return names
+
+    def load(self, name):
+        """(meta, data) of a claimed item, or None if it was evicted"""
+        try:
+            with open(os.path.join(self.directory, name), "rb") as f:
+                header = f.readline()
+                return json.loads(header), f.read()
+        except (OSError, ValueError):
+            return None
+
+    def release(self, name, done):
+        """End a claim; done removes the item, otherwise it stays queued"""
+        with self._lock:
+            self._claimed.discard(name)
+            if not done:
+                return
+            for i, (item, size) in enumerate(self._items):
+                if item == name:
+                    del self._items[i]
+                    self._remove(name, size)
+                    return
+
+
+class SpoolDrainer:
+    """Thread that uploads spooled items once the uplink works again.
+
+    upload(meta, data) sends one item and raises on failure. Nothing is
+    started while busy() is true, so current uploads go first. Batches of
+    up to workers items run concurrently, started no faster than rate per
+    second; a failed batch backs off exponentially with jitter.
+    """
+
+    def __init__(self, spool, upload, busy=lambda: False, workers=DRAIN_WORKERS, rate=DRAIN_RATE,
+                 backoff_min=BACKOFF_MIN, backoff_max=BACKOFF_MAX):
+        self.spool = spool
+        self.upload = upload
+        self.busy = busy
+        self.workers = workers
+        self.rate = rate
+        self.backoff_min = backoff_min
+        self.backoff_max = backoff_max
+        self.backoff = 0.0
+        self._retry_at = 0.0
+        self.drained = 0
+        self.failed = 0
+        self._recent = deque()  # monotonic times of recent drains
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="spool", daemon=True)
+        self._thread.start()
+
+    def wake(self, reset_backoff=False):
+        """Look at the spool now; reset_backoff after a send succeeded"""
+        if reset_backoff:
+            self.backoff = 0.0
+        self._wake.set()
+
+    def drain_rate(self, window=60.0):
+        """Items drained per minute over the last window seconds"""
+        cutoff = time.monotonic() - window
+        while self._recent and self._recent[0] < cutoff:
+            self._recent.popleft()
+        return len(self._recent) * 60.0 / window
+
+    def metrics(self):
+        return {
+            "depth": len(self.spool),
+            "bytes": self.spool.bytes,
+            "spooled": self.spool.spooled,
+            "evicted": self.spool.evicted,
+            "drained": self.drained,
+            "drain_failures": self.failed,
+            "drain_per_min": round(self.drain_rate(), 1),
+            "backoff_s": round(self.backoff, 1),
+        }
+
+    def _send(self, name, results, index):
+        item = self.spool.load(name)
+        if item is None:
+            results[index] = True  # evicted meanwhile, nothing left to send
+            return
+        try:
+            self.upload(*item)
+            results[index] = True
+        except Exception as e:
+            log.warning("Spooled upload failed: %s", e)
+            results[index] = False
+
+    def _run(self):
+        while not self._stop.is_set():
+            delay = self._retry_at - time.monotonic() if self.backoff else 0.0
+            if not len(self.spool) or delay > 0:
+                self._wake.wait(delay if delay > 0 else None)
+                self._wake.clear()
+                continue
+            if self.busy():
+                self._stop.wait(0.5)
+                continue
+
+            names = self.spool.claim(self.workers)
+            started = time.monotonic()
+            results = [False] * len(names)
+            threads = [threading.Thread(target=self._send, args=(name, results, i), name=f"spool-{i}")
+                       for i, name in enumerate(names)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            for name, ok in zip(names, results):
+                self.spool.release(name, ok)
+                if ok:
+                    self.drained += 1
+                    self._recent.append(time.monotonic())
+
+            if not all(results):
+                self.failed += 1
+                self.backoff = min(self.backoff_max, max(self.backoff_min, self.backoff * 2))
+                delay = self.backoff * random.uniform(0.8, 1.2)
+                self._retry_at = time.monotonic() + delay
+                log.warning("Spool: %d items left, retrying in %.0fs", len(self.spool), delay)
+                continue
+            self.backoff = 0.0
+            if not len(self.spool):
+                log.info("Spool drained (%d items sent)", self.drained)
+            self._stop.wait(max(0.0, len(names) / self.rate - (time.monotonic() - started)))
+
+    def stop(self, timeout=20.0):
+        self._stop.set()
+        self._wake.set()
+        self._thread.join(timeout)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show the upload spool")
+    parser.add_argument("--dir", default=SPOOL_DIR,
+                        help=f"spool directory (default: {SPOOL_DIR})")
+    args = parser.parse_args()
+
+    spool = Spool(args.dir)
+    print(f"{len(spool)} items, {spool.bytes / 1024:.0f} KB of {spool.max_bytes // 1024} KB")
+    for name in spool.claim(len(spool)):
+        item = spool.load(name)
+        if item is not None:
+            meta, data = item
+            print(f"  {name}: {meta.get('blob_name')} ({len(data)} bytes)")
+
+
+if __name__ == "__main__":
+    main()
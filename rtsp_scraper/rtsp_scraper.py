@@ -0,0 +1,456 @@
+#!/usr/bin/env python3
+"""Snapshots from many RTSP cameras over persistent sessions.
+
+Each camera is a .env file in the vocabulary of rtsp_snapshot.sh
+(CAMERA_IP, CAMERA_PORT, CAMERA_USERNAME, CAMERA_PASSWORD, CAMERA_STREAM,
+CAMERA_NAME, CUSTOMER, STORAGE_ACCOUNT_NAME, CONTAINER_NAME, SAS_TOKEN),
+laid over the shared settings of --env. Optional per-camera settings:
+
+    SNAPSHOT_INTERVAL  seconds between snapshots (default: --interval)
+    CAMERA_URL         source instead of the rtsp:// URL, e.g. a video
+                       or JPEG file to try things out without a camera
+
+Snapshots are uploaded under the same names as rtsp_snapshot.sh:
+$CUSTOMER/$DATE/$CAMERA_NAME/snapshot_$TIME.jpg and
+$CUSTOMER/latest/$CAMERA_NAME.jpg.
+"""
+import argparse
+import fcntl
+import glob
+import heapq
+import http.client
+import logging
+import os
+import queue
+import random
+import signal
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote, urlparse
+
+# Persistent sessions over TCP, like ffmpeg -rtsp_transport tcp in
+# rtsp_snapshot.sh; must be set before OpenCV opens the first stream
+os.environ.setdefault("OPENCV_FFMPEG_CAPTURE_OPTIONS", "rtsp_transport;tcp")
+
+import cv2  # noqa: E402
+
+LOCKFILE = "/tmp/rtsp_scraper.lock"
+AZURE_API_VERSION = "2023-01-03"  # same as rtsp_snapshot.sh
+DEFAULT_INTERVAL = 60
+JPEG_QUALITY = 90
+RECONNECT_MIN, RECONNECT_MAX = 2.0, 60.0  # seconds between reconnects
+STALE_PERIODS, STALE_MIN = 5, 1.0  # a stream without a grab for this long is stalled
+LOCK_TIMEOUT = 1.0  # seconds snapshot() waits for a grab in progress
+
+log = logging.getLogger("rtsp_scraper")
+
+
+def parse_env(text):
+    """Variables of a shell-style .env file as a dict of strings: KEY=value
+    lines, optional 'export', quotes and trailing comments"""
+    env = {}
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        if line.startswith("export "):
+            line = line[7:].lstrip()
+        key, sep, value = line.partition("=")
+        key = key.strip()
+        if not sep or not key.isidentifier():
+            continue
+        value = value.strip()
+        if value[:1] in ("'", '"'):
+            end = value.find(value[0], 1)
+            value = value[1:end] if end > 0 else value[1:]
+        else:
+            for i, ch in enumerate(value):
+                if ch == "#" and (i == 0 or value[i - 1].isspace()):
+                    value = value[:i].rstrip()
+                    break
+        env[key] = value
+    return env
+
+
+def load_env(path):
+    try:
+        with open(path) as f:
+            return parse_env(f.read())
+    except FileNotFoundError:
+        return {}
+
+
+class Camera:
+    """One camera's settings, resolved like rtsp_snapshot.sh does"""
+
+    def __init__(self, env, default_interval=DEFAULT_INTERVAL):
+        self.env = env
+        ip = env.get("CAMERA_IP", "")
+        # camera_id.sh's readable ID is hostname_IP
+        self.name = env.get("CAMERA_NAME") or f"{socket.gethostname()}_{ip or 'unknown_camera'}"
+        self.url = env.get("CAMERA_URL") or (
+            f"rtsp://{env.get('CAMERA_USERNAME', '')}:{env.get('CAMERA_PASSWORD', '')}"
+            f"@{ip}:{env.get('CAMERA_PORT', '554')}/{env.get('CAMERA_STREAM', '')}")
+        self.customer = env.get("CUSTOMER", "")
+        self.account = env.get("STORAGE_ACCOUNT_NAME", "")
+        self.container = env.get("CONTAINER_NAME", "")
+        self.sas_token = env.get("SAS_TOKEN", "")
+        try:
+            self.interval = max(1.0, float(env.get("SNAPSHOT_INTERVAL", "")))
+        except ValueError:
+            self.interval = float(default_interval)
+
+    def blob_names(self, now=None):
+        """(dated, latest) blob names of a snapshot taken at now"""
+        t = time.gmtime(now)
+        return (f"{self.customer}/{time.strftime('%Y-%m-%d', t)}/{self.name}/"
+                f"snapshot_{time.strftime('%H_%M_%S', t)}.jpg",
+                f"{self.customer}/latest/{self.name}.jpg")
+
+
+def load_cameras(base_path, camera_paths, default_interval=DEFAULT_INTERVAL):
+    """Cameras of camera_paths (files, or directories of *.env files) over
+    the shared settings in base_path; without any, base_path is the only
+    camera, as for rtsp_snapshot.sh"""
+    base = load_env(base_path)
+    files = []
+    for path in camera_paths:
+        files.extend(sorted(glob.glob(os.path.join(path, "*.env"))) if os.path.isdir(path) else [path])
+    if not files:
+        return [Camera(base, default_interval)]
+    cameras = [Camera(dict(base, **load_env(path)), default_interval) for path in files]
+    names = [c.name for c in cameras]
+    duplicates = sorted({n for n in names if names.count(n) > 1})
+    if duplicates:
+        raise ValueError(f"duplicate CAMERA_NAME: {', '.join(duplicates)}")
+    return cameras
+
+
+class CameraSession:
+    """A decode session kept open to one camera.
+
+    A grabber thread pulls every frame off the stream as it arrives, so
+    the decoder never falls behind and no RTSP setup or wait for a
+    keyframe is paid per snapshot. Only the frame that is asked for is
+    converted and encoded: snapshot() retrieves the most recently grabbed
+    frame. A dropped stream is reopened with growing backoff. Files
+    (CAMERA_URL) are read at their own frame rate and looped, to stand in
+    for a live camera.
+    """
+
+    def __init__(self, camera, quality=JPEG_QUALITY):
+        self.camera = camera
+        self.quality = quality
+        self.is_file = os.path.exists(camera.url)
+        self._cap = None
+        self._lock = threading.Lock()  # VideoCapture is not thread-safe
+        self._grabbed = threading.Event()
+        self.frames = 0
+        self.reconnects = 0
+        self.last_frame = None  # monotonic time of the latest grab
+        self.period = 0.04  # seconds between frames, from the stream once opened
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"grab-{camera.name}", daemon=True)
+        self._thread.start()
+
+    def _open(self):
+        cap = cv2.VideoCapture(self.camera.url, cv2.CAP_FFMPEG)
+        if not cap.isOpened():
+            cap.release()
+            # A single JPEG is not a stream for the FFmpeg backend
+            cap = cv2.VideoCapture(self.camera.url)
+        if cap.isOpened():
+            cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+            return cap
+        cap.release()
+        return None
+
+    def _run(self):
+        backoff = RECONNECT_MIN
+        while not self._stop.is_set():
+            cap = self._open()
+            if cap is None:
+                self.reconnects += 1
+                log.warning("%s: cannot open stream, retrying in %.0fs", self.camera.name, backoff)
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, RECONNECT_MAX)
+                continue
+            with self._lock:
+                self._cap = cap
+            fps = cap.get(cv2.CAP_PROP_FPS)
+            self.period = 1.0 / fps if 0 < fps < 1000 else 0.04
+            next_grab = time.monotonic()
+            grabbed = 0
+            while not self._stop.is_set():
+                with self._lock:
+                    ok = cap.grab()
+                if not ok:
+                    break
+                grabbed += 1
+                self.frames += 1
+                self.last_frame = time.monotonic()
+                self._grabbed.set()
+                if self.is_file:
+                    next_grab += self.period
+                    self._stop.wait(max(0.0, next_grab - time.monotonic()))
+            with self._lock:
+                self._cap = None
+                cap.release()
+            if self._stop.is_set():
+                break
+            if self.is_file and grabbed:
+                continue  # end of file: loop
+            self.reconnects += 1
+            self._grabbed.clear()
+            log.warning("%s: stream ended, reconnecting in %.0fs", self.camera.name, backoff)
+            self._stop.wait(backoff)
+            backoff = RECONNECT_MIN if grabbed else min(backoff * 2, RECONNECT_MAX)
+
+    def snapshot(self, timeout=10.0):
+        """JPEG of the latest frame, waiting up to timeout for the first
+        one of a connected stream; None at once while it is down or
+        stalled, so a dead camera does not hold a worker"""
+        if self._cap is None and self.reconnects:
+            return None
+        if not self._grabbed.wait(timeout):
+            return None
+        last = self.last_frame
+        if last is None or time.monotonic() - last > max(STALE_MIN, STALE_PERIODS * self.period):
+            return None
+        # The grabber holds the lock through a grab that blocks on a stall
+        if not self._lock.acquire(timeout=LOCK_TIMEOUT):
+            return None
+        try:
+            if self._cap is None:
+                return None
+            ok, frame = self._cap.retrieve()
+        finally:
+            self._lock.release()
+        if not ok:
+            return None
+        ok, jpeg = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        return jpeg.tobytes() if ok else None
+
+    def stop(self, timeout=5.0):
+        self._stop.set()
+        self._thread.join(timeout)
+
+
+class UploadError(Exception):
+    """An upload was refused or could not be sent"""
+
+
+class BlobUploader:
+    """Put Blob to one storage account over kept-alive connections.
+
+    Connections are pooled, so cameras sharing an account reuse each
+    other's TLS sessions instead of paying a handshake per upload as the
+    curl calls did. endpoint overrides the account URL, e.g. blob_sim.py
+    of the AVI scripts.
+    """
+
+    def __init__(self, account, sas_token, timeout=15, endpoint=None):
+        self.sas_token = sas_token
+        url = (endpoint or f"https://{account}.blob.core.windows.net").rstrip("/")
+        parts = urlparse(url)
+        self._https = parts.scheme == "https"
+        self._host = parts.hostname
+        self._port = parts.port
+        self._prefix = parts.path
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self.connections = 0
+        self.requests = 0
+
+    def _connect(self):
+        with self._lock:
+            self.connections += 1
+        if self._https:
+            return http.client.HTTPSConnection(self._host, self._port, timeout=self.timeout)
+        return http.client.HTTPConnection(self._host, self._port, timeout=self.timeout)
+
+    def put_blob(self, container, blob_name, data, content_type="image/jpeg"):
+        path = f"{self._prefix}/{quote(container)}/{quote(blob_name, safe='/')}{self.sas_token}"
+        headers = {
+            "x-ms-version": AZURE_API_VERSION,
+            "x-ms-date": time.strftime("%a, %d %b %Y %H:%M:%S GMT", time.gmtime()),
+            "x-ms-blob-type": "BlockBlob",
+            "Content-Type": content_type,
+            "Content-Length": str(len(data)),
+        }
+        try:
+            conn, reused = self._idle.get_nowait(), True
+        except queue.Empty:
+            conn, reused = self._connect(), False
+        while True:
+            try:
+                conn.request("PUT", path, body=data, headers=headers)
+                response = conn.getresponse()
+                response.read()
+                break
+            except (OSError, http.client.HTTPException) as e:
+                conn.close()
+                if not reused:
+                    raise UploadError(f"Upload failed: {blob_name}: {e}")
+                # The server may have closed an idle connection
+                conn, reused = self._connect(), False
+        with self._lock:
+            self.requests += 1
+        if response.will_close:
+            conn.close()
+        else:
+            self._idle.put(conn)
+        if response.status >= 300:
+            raise UploadError(f"Upload failed: {blob_name}: HTTP {response.status} {response.reason}")
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class Scraper:
+    """Takes each camera's snapshot every SNAPSHOT_INTERVAL seconds.
+
+    Due times live in a heap keyed on the monotonic clock; the scheduler
+    thread hands due cameras to a thread pool, which encodes and uploads.
+    Cameras start at a random offset within their interval and each
+    snapshot is dispatched up to +-jitter seconds off its slot, so
+    hundreds of cameras do not hit the network at the same moment; the
+    slots themselves stay one interval apart and never drift. A camera whose previous snapshot is
+    still running skips its turn instead of queueing up.
+    """
+
+    def __init__(self, cameras, workers=8, jitter=2.0, endpoint=None, dry_run=False):
+        self.sessions = [CameraSession(c) for c in cameras]
+        self.jitter = jitter
+        self.dry_run = dry_run
+        self._uploaders = {}
+        for c in cameras:
+            key = (c.account, c.sas_token)
+            if key not in self._uploaders:
+                self._uploaders[key] = BlobUploader(c.account, c.sas_token, endpoint=endpoint)
+        self._pool = ThreadPoolExecutor(workers, thread_name_prefix="snapshot")
+        self._busy = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self.taken = 0
+        self.failed = 0
+        self.skipped = 0
+
+    def _take(self, index):
+        session = self.sessions[index]
+        camera = session.camera
+        try:
+            start = time.monotonic()
+            data = session.snapshot()
+            if data is None:
+                raise UploadError("no frame from stream")
+            grabbed = (time.monotonic() - start) * 1000
+            if not self.dry_run:
+                dated, latest = camera.blob_names()
+                uploader = self._uploaders[(camera.account, camera.sas_token)]
+                uploader.put_blob(camera.container, latest, data)
+                uploader.put_blob(camera.container, dated, data)
+            log.info("%s: %d bytes, frame in %.0f ms, done in %.0f ms", camera.name, len(data),
+                     grabbed, (time.monotonic() - start) * 1000)
+            with self._lock:
+                self.taken += 1
+        except Exception as e:
+            log.warning("%s: snapshot failed: %s", camera.name, e)
+            with self._lock:
+                self.failed += 1
+        finally:
+            with self._lock:
+                self._busy.discard(index)
+
+    def run(self, duration=None):
+        now = time.monotonic()
+        end = None if duration is None else now + duration
+        # (dispatch time, base time, camera): the base schedule advances by
+        # exactly one interval per period, jitter only moves the dispatch
+        due = []
+        for i, session in enumerate(self.sessions):
+            base = now + random.uniform(0, session.camera.interval)
+            due.append((base, base, i))
+        heapq.heapify(due)
+        while not self._stop.is_set():
+            when, base, index = due[0]
+            if end is not None and when > end:
+                break
+            if self._stop.wait(max(0.0, when - time.monotonic())):
+                break
+            interval = self.sessions[index].camera.interval
+            base += interval
+            jitter = random.uniform(-self.jitter, self.jitter) if self.jitter else 0.0
+            heapq.heapreplace(due, (base + max(-interval / 2, min(interval / 2, jitter)), base, index))
+            with self._lock:
+                if index in self._busy:
+                    self.skipped += 1
+                    log.warning("%s: previous snapshot still running, skipped", self.sessions[index].camera.name)
+                    continue
+                self._busy.add(index)
+            self._pool.submit(self._take, index)
+
+    def stop(self):
+        self._stop.set()
+
+    def shutdown(self):
+        self._pool.shutdown(wait=True)
+        for session in self.sessions:
+            session.stop()
+        for uploader in self._uploaders.values():
+            uploader.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Snapshots from many RTSP cameras over persistent sessions")
+    parser.add_argument("cameras", nargs="*",
+                        help="camera .env files or directories of them (default: --env is the only camera)")
+    parser.add_argument("--env", default=".env",
+                        help="shared settings under every camera (default: .env)")
+    parser.add_argument("--interval", type=float, default=DEFAULT_INTERVAL,
+                        help=f"seconds between snapshots without SNAPSHOT_INTERVAL (default: {DEFAULT_INTERVAL})")
+    parser.add_argument("--jitter", type=float, default=2.0,
+                        help="random seconds added to or taken from each period (default: 2)")
+    parser.add_argument("--workers", type=int, default=8,
+                        help="snapshots encoded and uploaded at once (default: 8)")
+    parser.add_argument("--duration", type=float, default=None,
+                        help="stop after this many seconds (default: run until stopped)")
+    parser.add_argument("--blob-endpoint", default=None,
+                        help="upload here instead of the storage account, e.g. a local stand-in")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="take snapshots but do not upload them")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    lock = open(LOCKFILE, "w")
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        print("Another instance is already running")
+        raise SystemExit(1)
+
+    try:
+        cameras = load_cameras(args.env, args.cameras, args.interval)
+    except ValueError as e:
+        print(f"Error: {e}")
+        raise SystemExit(1)
+    log.info("Scraping %d cameras with %d workers", len(cameras), args.workers)
+    scraper = Scraper(cameras, args.workers, args.jitter, args.blob_endpoint, args.dry_run)
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *_: scraper.stop())
+    try:
+        scraper.run(args.duration)
+    finally:
+        scraper.shutdown()
+    log.info("%d snapshots, %d failed, %d skipped", scraper.taken, scraper.failed, scraper.skipped)
+
+
+if __name__ == "__main__":
+    main()